@@ -0,0 +1,110 @@
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import random
+import time
+from typing import Callable, Dict, List
+
+import yaml
+
+from stashgen import irbin, pipeline
+from stashgen.corpus import vless_lines
+from stashgen.snapshot import CACHE_DIR
+
+FLAVOUR = "stash_claude_v2"
+SIZES   = [10000, 100000]
+REPEATS = 3
+LOOKUPS = 1000
+OUT_DIR = os.path.join(CACHE_DIR, "bench")
+
+Loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def load_yaml(path: str) -> List[Dict]:
+    # What a downstream tool does today with the generated profile
+    with open(path, "r", encoding="utf-8") as f:
+        return yaml.load(f, Loader=Loader)["proxies"]
+
+
+def load_json(path: str) -> List[Dict]:
+    with open(path, "rb") as f:
+        return json.loads(f.read())["proxies"]
+
+
+def open_binary(path: str) -> irbin.IRFile:
+    return irbin.IRFile.open(path)
+
+
+def best_of(fn: Callable[[str], object], path: str, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        out = fn(path)
+        best = min(best, time.perf_counter() - start)
+        if isinstance(out, irbin.IRFile):
+            out.close()
+    return best
+
+
+def lookups(path: str, count: int, seed: int = 0) -> float:
+    # Mean time of one lazy ir[i] on a freshly opened file
+    with irbin.IRFile.open(path) as ir:
+        rng = random.Random(seed)
+        idx = [rng.randrange(len(ir)) for _ in range(count)]
+        start = time.perf_counter()
+        for i in idx:
+            ir[i]
+        return (time.perf_counter() - start) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare reloading a flavour's proxies from YAML, the JSON IR and the binary IR.",
+    )
+    parser.add_argument("--flavour", default=FLAVOUR, help="flavour module to build the proxies with")
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)), help="comma-separated vless line counts")
+    parser.add_argument("--repeats", type=int, default=REPEATS, help="runs per format, best one counts")
+    parser.add_argument("--out-dir", default=OUT_DIR, help="where the generated files are written")
+    args = parser.parse_args()
+
+    flavour = importlib.import_module(args.flavour)
+    os.makedirs(args.out_dir, exist_ok=True)
+    for size in [int(s) for s in args.sizes.split(",") if s]:
+        with contextlib.redirect_stdout(io.StringIO()):
+            proxies = flavour.prepare_proxies(flavour.parse_proxies(vless_lines(size)))
+            text    = pipeline.render(flavour, pipeline.build(flavour, proxies))
+        base  = os.path.join(args.out_dir, f"ir-{args.flavour}-{size}")
+        paths = {"yaml": base + ".yaml", "json": base + ".ir.json", "binary": base + ".ir.bin"}
+        with open(paths["yaml"], "w", encoding="utf-8") as f:
+            f.write(text)
+        with open(paths["json"], "w", encoding="utf-8") as f:
+            json.dump({"source": "", "proxies": proxies}, f, ensure_ascii=False)
+        start = time.perf_counter()
+        with open(paths["binary"], "wb") as f:
+            f.write(irbin.dump(proxies))
+        written = time.perf_counter() - start
+        assert irbin.load(paths["binary"]) == proxies
+
+        runs = [
+            ("yaml", load_yaml, paths["yaml"]),
+            ("json", load_json, paths["json"]),
+            ("binary", irbin.load, paths["binary"]),
+            ("binary open", open_binary, paths["binary"]),
+        ]
+        base_t = None
+        for name, fn, path in runs:
+            t = best_of(fn, path, args.repeats)
+            base_t = base_t or t
+            mb = os.path.getsize(path) / (1024 * 1024)
+            print(f"{name:12s} {len(proxies):8d} proxies  {mb:7.1f} MB  {t * 1000:9.2f} ms  x{base_t / t:.1f}")
+        print(
+            f"{'binary ir[i]':12s} {len(proxies):8d} proxies  {lookups(paths['binary'], LOOKUPS) * 1e6:17.1f} us"
+            f"  (written in {written * 1000:.0f} ms)"
+        )
+
+
+if __name__ == "__main__":
+    main()
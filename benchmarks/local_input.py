@@ -0,0 +1,102 @@
+import argparse
+import os
+import random
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+from stashgen import local
+from stashgen.corpus import mixed_lines
+from stashgen.snapshot import CACHE_DIR
+
+SIZES   = [100000, 1000000]
+NOISE   = 0.5
+REPEATS = 3
+OUT_DIR = os.path.join(CACHE_DIR, "bench")
+
+OTHER = [
+    "trojan://password@example.com:443?sni=example.com#trojan",
+    "vmess://eyJhZGQiOiJleGFtcGxlLmNvbSIsInBvcnQiOjQ0M30=",
+    "ss://YWVzLTI1Ni1nY206cGFzc3dvcmQ@example.com:8388#ss",
+    "# ---- channel dump ----",
+    "",
+]
+
+
+def write_dump(path: str, size: int, noise: float, seed: int = 0) -> None:
+    # size vless lines from the mixed corpus with other protocols, comments
+    # and blank lines in between, like an archived upstream dump
+    rng = random.Random(seed)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        for line in mixed_lines(size, seed):
+            while rng.random() < noise:
+                f.write(rng.choice(OTHER) + "\n")
+            f.write(line + "\n")
+
+
+def read_splitlines(path: str) -> List[str]:
+    # What the fetch path does with a downloaded list
+    with open(path, "r", encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    return [line for line in lines if line.lstrip().startswith("vless://")]
+
+
+def stream_lines(path: str) -> int:
+    # What --input does: each line is dropped once the parser has it
+    return sum(1 for _ in local.iter_vless_lines(path))
+
+
+READERS: Dict[str, Callable[[str], object]] = {
+    "read+splitlines": read_splitlines,
+    "mmap":            local.read_vless_lines,
+    "mmap, streamed":  stream_lines,
+}
+
+
+def best_of(fn: Callable[[str], object], path: str, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(path)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_heap(fn: Callable[[str], object], path: str) -> int:
+    # Mapped pages are not heap, so this is what a reader really holds
+    tracemalloc.start()
+    try:
+        fn(path)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare reading a large local dump with mmap against read().splitlines().",
+    )
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)), help="comma-separated vless line counts")
+    parser.add_argument("--noise", type=float, default=NOISE, help="chance of a non-vless line before each vless line")
+    parser.add_argument("--repeats", type=int, default=REPEATS, help="runs per reader, best one counts")
+    parser.add_argument("--out-dir", default=OUT_DIR, help="where the generated dumps are written")
+    args = parser.parse_args()
+
+    for size in [int(s) for s in args.sizes.split(",") if s]:
+        path = os.path.join(args.out_dir, f"dump-{size}.txt")
+        write_dump(path, size, args.noise)
+        assert READERS["mmap"](path) == read_splitlines(path)
+        times = {name: best_of(fn, path, args.repeats) for name, fn in READERS.items()}
+        peaks = {name: peak_heap(fn, path) for name, fn in READERS.items()}
+        mb = os.path.getsize(path) / (1024 * 1024)
+        base = times["read+splitlines"]
+        for name, t in times.items():
+            print(
+                f"{name:16s} {size:8d} lines  {mb:7.1f} MB  {t:8.4f} s  {mb / t:8.1f} MB/s  x{base / t:.2f}"
+                f"  peak heap {peaks[name] / (1024 * 1024):7.1f} MB"
+            )
+
+
+if __name__ == "__main__":
+    main()
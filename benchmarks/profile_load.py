@@ -0,0 +1,147 @@
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+import yaml
+
+from stashgen import pipeline
+from stashgen.corpus import vless_lines
+from stashgen.render import STYLES
+from stashgen.snapshot import CACHE_DIR
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+FLAVOURS = [
+    "stash_claude",
+    "stash_claude_v2",
+    "stash_gemini",
+    "stash_gemini_v2",
+    "stash_gpt",
+    "stash_grok",
+    "stash_grok_v2",
+]
+SIZES   = [1000, 10000, 50000]
+LOADERS = {
+    "c":    "CSafeLoader",
+    "pure": "SafeLoader",
+}
+OUT_DIR = os.path.join(CACHE_DIR, "bench")
+
+
+def max_rss_kb() -> Optional[int]:
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def child(path: str, loader: str) -> None:
+    # Runs in a fresh interpreter so peak RSS belongs to this one load
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    before = max_rss_kb()
+    start  = time.perf_counter()
+    yaml.load(text, Loader=getattr(yaml, loader))
+    elapsed = time.perf_counter() - start
+    print(json.dumps({"time_s": round(elapsed, 4), "rss_before_kb": before, "peak_rss_kb": max_rss_kb()}))
+
+
+def measure_load(path: str, loader: str) -> Dict:
+    out = subprocess.run(
+        [sys.executable, "-m", "benchmarks.profile_load", "--child", path, loader],
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout)
+
+
+def synthesize(flavour, lines: List[str], styles) -> Dict:
+    # The same path generate.py takes, minus fetching and writing
+    with contextlib.redirect_stdout(io.StringIO()):
+        start   = time.perf_counter()
+        proxies = flavour.prepare_proxies(flavour.parse_proxies(lines))
+        parsed  = time.perf_counter()
+        text    = pipeline.render(flavour, pipeline.build(flavour, proxies), styles)
+        done    = time.perf_counter()
+    return {
+        "proxies": len(proxies),
+        "parse_s": round(parsed - start, 4),
+        "emit_s":  round(done - parsed, 4),
+        "text":    text,
+    }
+
+
+def run(flavours: List[str], sizes: List[int], loaders: List[str], styles, out_dir: str) -> Dict:
+    os.makedirs(out_dir, exist_ok=True)
+    results = []
+    for size in sizes:
+        lines = vless_lines(size)
+        for name in flavours:
+            flavour = importlib.import_module(name)
+            built   = synthesize(flavour, lines, styles)
+            path    = os.path.join(out_dir, f"{name}-{size}.yaml")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(built.pop("text"))
+            entry = dict(built, flavour=name, size=size, bytes=os.path.getsize(path), loaders={})
+            for loader in loaders:
+                entry["loaders"][loader] = measure_load(path, LOADERS[loader])
+            results.append(entry)
+            loads = "  ".join(
+                f"{k} {v['time_s']:.3f} s / {v['peak_rss_kb'] or 0:,} KB" for k, v in entry["loaders"].items()
+            )
+            print(f"{name:16s} {size:6d}  {entry['bytes'] / 1024:9.1f} KB  emit {entry['emit_s']:.3f} s  {loads}")
+    return {
+        "python":  platform.python_version(),
+        "pyyaml":  yaml.__version__,
+        "libyaml": hasattr(yaml, "CSafeLoader"),
+        "styles":  list(styles),
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure how profile size, load time and peak RSS grow with the proxy count.",
+    )
+    parser.add_argument("--child", nargs=2, metavar=("PATH", "LOADER"), help=argparse.SUPPRESS)
+    parser.add_argument("--flavours", default=",".join(FLAVOURS), help="comma-separated flavour modules")
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)), help="comma-separated proxy counts")
+    parser.add_argument("--loaders", default="c,pure", help="comma-separated loaders: c, pure")
+    parser.add_argument("--style", action="append", choices=STYLES, default=[], help="output style to emit")
+    parser.add_argument("--out-dir", default=OUT_DIR, help="where synthesized profiles are written")
+    parser.add_argument("--json", default=os.path.join(OUT_DIR, "profile_load.json"), help="report path")
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child)
+        return
+
+    loaders = [l for l in args.loaders.split(",") if l]
+    if "c" in loaders and not hasattr(yaml, "CSafeLoader"):
+        print("libyaml is not available; skipping the C loader")
+        loaders.remove("c")
+    report = run(
+        [f for f in args.flavours.split(",") if f],
+        [int(s) for s in args.sizes.split(",") if s],
+        loaders,
+        tuple(sorted(set(args.style))),
+        args.out_dir,
+    )
+    with open(args.json, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
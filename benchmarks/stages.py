@@ -0,0 +1,180 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import time
+import urllib.parse
+from typing import Callable, Dict, List, Tuple
+
+import yaml
+
+from stashgen.corpus import mixed_lines
+
+import stash_claude_v2
+import stash_gemini
+
+SIZES     = [1000, 100000, 1000000]
+TOLERANCE = 0.25
+
+# Committed, and compared against by the daily workflow.
+# Refresh it after an intended speed change with
+#   python -m benchmarks.stages --sizes 1000,10000 --save-baseline
+BASELINE  = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# Enough repeats for a stable best-of at small sizes without making the
+# large ones take minutes.
+TARGET_ITEMS = 300000
+
+
+def _hosts(lines: List[str]) -> List[str]:
+    hosts = []
+    for line in lines:
+        netloc = urllib.parse.urlsplit(line).netloc
+        hosts.append(netloc.rpartition("@")[2].rpartition(":")[0].strip("[]"))
+    return hosts
+
+
+def _parsed(lines: List[str]) -> List[Dict]:
+    return [p for p in map(stash_claude_v2.parse_vless_url, lines) if p]
+
+
+def _unique(lines: List[str]) -> List[Dict]:
+    return stash_claude_v2.dedup_proxies(_parsed(lines))
+
+
+# name -> (setup(lines) -> state, run(state)); only run is timed
+STAGES: Dict[str, Tuple[Callable, Callable]] = {
+    "parse_vless_url": (
+        lambda lines: lines,
+        lambda lines: [stash_claude_v2.parse_vless_url(l) for l in lines],
+    ),
+    "parse_vless_stash": (
+        lambda lines: lines,
+        lambda lines: [stash_gemini.parse_vless_stash(l) for l in lines],
+    ),
+    "is_valid_server": (
+        _hosts,
+        lambda hosts: [stash_claude_v2.is_valid_server(h) for h in hosts],
+    ),
+    "dedup_proxies": (
+        _parsed,
+        stash_claude_v2.dedup_proxies,
+    ),
+    "fix_names": (
+        _unique,
+        # fix_names renames in place, so each run gets fresh copies
+        lambda unique: stash_claude_v2.fix_names([dict(p) for p in unique]),
+    ),
+    "build_proxy_groups": (
+        lambda lines: [p["name"] for p in _unique(lines)],
+        stash_claude_v2.build_proxy_groups,
+    ),
+    "dump": (
+        lambda lines: stash_claude_v2.build_config(stash_claude_v2.prepare_proxies(_parsed(lines))),
+        lambda config: stash_claude_v2.dump_config(config, io.StringIO()),
+    ),
+}
+
+
+def time_stage(name: str, lines: List[str]) -> Dict:
+    setup, fn = STAGES[name]
+    repeats = max(1, min(5, TARGET_ITEMS // max(1, len(lines))))
+    best = float("inf")
+    with contextlib.redirect_stdout(io.StringIO()):
+        state = setup(lines)
+        for _ in range(repeats):
+            start = time.perf_counter()
+            fn(state)
+            best = min(best, time.perf_counter() - start)
+    return {
+        "time_s":   round(best, 6),
+        "ns_per_line": round(best / len(lines) * 1e9, 1),
+        "repeats":  repeats,
+    }
+
+
+def load_baseline(path: str) -> Dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def environment() -> Dict[str, str]:
+    return {
+        "python":  platform.python_version(),
+        "pyyaml":  yaml.__version__,
+        "machine": platform.machine(),
+    }
+
+
+def run(stages: List[str], sizes: List[int], baseline: Dict, tolerance: float) -> Tuple[Dict, List[str]]:
+    results: Dict[str, Dict] = {}
+    regressions: List[str] = []
+    for size in sizes:
+        lines = mixed_lines(size)
+        for name in stages:
+            key = f"{name}@{size}"
+            entry = time_stage(name, lines)
+            results[key] = entry
+            base = baseline.get(key)
+            note = ""
+            if base:
+                change = entry["time_s"] / base["time_s"] - 1 if base["time_s"] else 0.0
+                entry["vs_baseline"] = round(change, 3)
+                note = f"{change:+7.1%}"
+                if change > tolerance:
+                    note += "  REGRESSION"
+                    regressions.append(key)
+            print(f"{name:20s} {size:8d}  {entry['time_s']:9.4f} s  {entry['ns_per_line']:10.1f} ns/line  {note}")
+    return results, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time each parsing and emitting stage on a synthetic corpus against a stored baseline.",
+    )
+    parser.add_argument("--stages", default=",".join(STAGES), help="comma-separated stages")
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)), help="comma-separated line counts")
+    parser.add_argument("--baseline", default=BASELINE, help="baseline JSON to compare with")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="slowdown that counts as a regression")
+    parser.add_argument("--check", action="store_true", help="exit 1 if any stage regressed")
+    args = parser.parse_args()
+
+    stages = [s for s in args.stages.split(",") if s]
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(unknown)}")
+    baseline = load_baseline(args.baseline)
+    recorded = {k: baseline[k] for k in environment() if k in baseline}
+    if recorded and recorded != environment():
+        # Timings from another interpreter or machine are only a rough guide
+        print(f"Baseline recorded with {recorded}, running with {environment()}")
+    results, regressions = run(
+        stages,
+        [int(s) for s in args.sizes.split(",") if s],
+        baseline.get("results", {}),
+        args.tolerance,
+    )
+
+    if args.save_baseline:
+        merged = baseline.get("results", {})
+        merged.update(results)
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(dict(environment(), results=merged), f, indent=2)
+            f.write("\n")
+        print(f"Baseline saved: {args.baseline}")
+    if regressions:
+        print(f"Regressions over {args.tolerance:.0%}: {', '.join(regressions)}")
+        if args.check:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+import argparse
+import importlib
+import sys
+import time
+
+from stashgen import archive, churn, memory, metrics, pipeline, profiling, watch
+from stashgen.render import STYLES, prune_sections
+
+if hasattr(sys.stdout, "reconfigure"):
+    sys.stdout.reconfigure(encoding="utf-8") # type: ignore
+
+FLAVOURS = [
+    "stash_claude",
+    "stash_claude_v2",
+    "stash_gemini",
+    "stash_gemini_v2",
+    "stash_gpt",
+    "stash_grok",
+    "stash_grok_v2",
+]
+
+
+def run_each(flavours, args, styles, instrument) -> bool:
+    # One flavour after another, each running its stages in turn on this
+    # thread the way its own script does
+    ok = True
+    for flavour in flavours:
+        ok = pipeline.run(
+            flavour,
+            force=args.force,
+            styles=styles,
+            short_names=args.short_names,
+            instrument=instrument,
+        ) and ok
+    return ok
+
+
+def write_metrics(stats, path, ok, wall) -> None:
+    # Every run mode writes at least the run_* gauges
+    if stats is None:
+        return
+    metrics.record_run(stats, ok, wall)
+    stats.write(path)
+
+
+def run_traced(flavours, args, styles, budgets) -> bool:
+    # tracemalloc counts every thread, so stages must not overlap
+    tracer = memory.MemoryTracer(budgets)
+    tracer.start()
+    ok = True
+    try:
+        ok = run_each(flavours, args, styles, tracer.stage)
+    finally:
+        tracer.stop()
+    tracer.write(args.memory)
+    print(tracer.summary())
+    print(f"Memory report: {args.memory}")
+    return ok and not tracer.over_budget()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate every Stash flavour from one fetch and parse pass.",
+    )
+    parser.add_argument(
+        "flavours", nargs="*", default=FLAVOURS,
+        help="flavour modules to generate (default: all)",
+    )
+    parser.add_argument(
+        "--force", action="store_true",
+        help="rebuild every flavour even if its proxies and emitter are unchanged",
+    )
+    parser.add_argument(
+        "--emit-processes", type=int, default=None, metavar="N",
+        help="worker processes for serializing flavours (default: one per CPU, 0: use threads)",
+    )
+    parser.add_argument(
+        "--style", action="append", choices=STYLES, default=[],
+        help=(
+            "output style, may be repeated (anchors: write repeated mappings and lists "
+            "once as YAML anchors; compact: one line per proxy, shared settings merged "
+            "in from x-proxy-defaults)"
+        ),
+    )
+    parser.add_argument(
+        "--short-names", action="store_true",
+        help="rename proxies to their country flag plus a short id derived from the endpoint",
+    )
+    parser.add_argument(
+        "--profile", nargs="?", const=profiling.REPORT_FILE, metavar="PATH",
+        help=f"time every stage (wall and CPU) and write a JSON report (default: {profiling.REPORT_FILE})",
+    )
+    parser.add_argument(
+        "--cprofile", action="store_true",
+        help=(
+            "with --profile, also run cProfile per stage and report the top functions; "
+            "flavours run one at a time"
+        ),
+    )
+    parser.add_argument(
+        "--memory", nargs="?", const=memory.REPORT_FILE, metavar="PATH",
+        help=(
+            "trace peak and retained memory per stage with tracemalloc and write a JSON "
+            f"report (default: {memory.REPORT_FILE}); flavours run one at a time"
+        ),
+    )
+    parser.add_argument(
+        "--memory-budget", action="append", default=[], metavar="[STAGE=]MB",
+        help="with --memory, fail when a stage matching the glob peaks above MB (may be repeated)",
+    )
+    parser.add_argument(
+        "--metrics", default=metrics.METRICS_FILE, metavar="PATH",
+        help=f"Prometheus textfile to write run metrics to, '' to disable (default: {metrics.METRICS_FILE})",
+    )
+    parser.add_argument(
+        "--watch", action="store_true",
+        help="keep running: poll the sources and regenerate whenever one changes",
+    )
+    parser.add_argument(
+        "--interval", type=float, default=watch.INTERVAL, metavar="SECONDS",
+        help=f"with --watch, seconds between polls (default: {watch.INTERVAL:g})",
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=watch.JITTER, metavar="FRACTION",
+        help=f"with --watch, randomize each interval by up to this fraction (default: {watch.JITTER:g})",
+    )
+    parser.add_argument(
+        "--polls", type=int, default=None, metavar="N",
+        help="with --watch, stop after N polls (default: run until interrupted)",
+    )
+    parser.add_argument(
+        "--input", metavar="PATH",
+        help="generate from a local dump of vless links instead of fetching the sources",
+    )
+    parser.add_argument(
+        "--replay", metavar="WHEN",
+        help=(
+            "generate from the archived source lists current at WHEN (latest, unix "
+            "seconds or a UTC time like 2026-10-18T06:00) instead of fetching"
+        ),
+    )
+    parser.add_argument(
+        "--prefer-long-lived", action="store_true",
+        help="list the servers seen over the longest span of past runs first (needs numpy)",
+    )
+    args = parser.parse_args()
+    if args.prefer_long_lived and not churn.available():
+        parser.error("--prefer-long-lived needs numpy")
+    if args.input and (args.watch or args.memory or args.profile):
+        parser.error("--input cannot be combined with --watch, --memory or --profile")
+    if args.replay and (args.input or args.watch or args.memory or args.profile):
+        parser.error("--replay cannot be combined with --input, --watch, --memory or --profile")
+    try:
+        when = archive.parse_when(args.replay) if args.replay else None
+    except ValueError as e:
+        parser.error(str(e))
+    if args.watch and (args.memory or args.profile):
+        parser.error("--watch cannot be combined with --memory or --profile")
+    if args.cprofile and not args.profile:
+        parser.error("--cprofile needs --profile")
+    if args.cprofile and args.prefer_long_lived:
+        parser.error("--cprofile cannot be combined with --prefer-long-lived")
+    # Only the default run keeps a churn history and serializes in workers
+    if args.prefer_long_lived and (args.input or args.replay or args.watch or args.memory):
+        parser.error("--prefer-long-lived cannot be combined with --input, --replay, --watch or --memory")
+    if args.emit_processes is not None and (args.input or args.replay or args.watch or args.memory or args.cprofile):
+        parser.error("--emit-processes cannot be combined with --input, --replay, --watch, --memory or --cprofile")
+    if args.memory_budget and not args.memory:
+        parser.error("--memory-budget needs --memory")
+    if args.memory and args.profile:
+        parser.error("--memory and --profile cannot be combined")
+    try:
+        budgets = [memory.parse_budget(b) for b in args.memory_budget]
+    except ValueError as e:
+        parser.error(str(e))
+
+    flavours = [importlib.import_module(name) for name in args.flavours]
+    styles   = tuple(sorted(set(args.style)))
+    stats    = metrics.Metrics() if args.metrics else None
+    if args.watch:
+        watcher = watch.Watcher(flavours, force=args.force, styles=styles, short_names=args.short_names)
+        try:
+            ok = watcher.run(
+                args.interval, args.jitter, args.polls,
+                on_poll=lambda ok, wall: write_metrics(stats, args.metrics, ok, wall),
+            )
+        except KeyboardInterrupt:
+            ok = True
+        sys.exit(0 if ok else 1)
+
+    profiler = profiling.Profiler(cprofile=args.cprofile) if args.profile else None
+    t0 = time.monotonic()
+    ok = False
+    try:
+        if args.memory:
+            ok = run_traced(flavours, args, styles, budgets)
+        elif args.input:
+            ok = pipeline.run_input(flavours, args.input, args.force, styles, args.short_names)
+        elif when is not None:
+            ok = pipeline.run_archived(flavours, when, args.force, styles, args.short_names)
+        elif profiler is not None and profiler.cprofile:
+            # Only one cProfile may be active at a time, so stages cannot overlap
+            ok = run_each(flavours, args, styles, profiler.stage)
+            profiler.wall = time.monotonic() - t0
+            if stats is not None:
+                pipeline.record_stage_times(stats, profiler.stages, flavours)
+        else:
+            ok = pipeline.run_all(
+                flavours,
+                force=args.force,
+                processes=args.emit_processes,
+                styles=styles,
+                short_names=args.short_names,
+                profiler=profiler,
+                stats=stats,
+                prefer_long_lived=args.prefer_long_lived,
+            )
+    finally:
+        write_metrics(stats, args.metrics, ok, time.monotonic() - t0)
+    pruned = prune_sections()
+    if pruned:
+        print(f"Pruned {pruned} unused cached sections")
+    if profiler is not None:
+        profiler.write(args.profile)
+        print(profiler.summary())
+        print(f"Profile report: {args.profile}")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+import argparse
+import sys
+
+from stashgen.serve import CACHE_BYTES, CACHE_ENTRIES, LRUCache, serve
+
+if hasattr(sys.stdout, "reconfigure"):
+    sys.stdout.reconfigure(encoding="utf-8") # type: ignore
+
+FLAVOURS = [
+    "stash_claude",
+    "stash_claude_v2",
+    "stash_gemini",
+    "stash_gemini_v2",
+    "stash_gpt",
+    "stash_grok",
+    "stash_grok_v2",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Serve filtered subscriptions from the last run's proxies, e.g. "
+            "GET /stash_claude_v2?port=443&country=DE,NL&style=compact"
+        ),
+    )
+    parser.add_argument("flavours", nargs="*", default=FLAVOURS, help="flavour modules to serve (default: all)")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8080, help="port to listen on (default: 8080)")
+    parser.add_argument(
+        "--cache-entries", type=int, default=CACHE_ENTRIES,
+        help=f"rendered variants to keep (default: {CACHE_ENTRIES})",
+    )
+    parser.add_argument(
+        "--cache-mb", type=float, default=CACHE_BYTES / (1024 * 1024),
+        help=f"total size of the kept gzipped bodies in MB (default: {CACHE_BYTES // (1024 * 1024)})",
+    )
+    args = parser.parse_args()
+    serve(args.flavours, args.host, args.port, LRUCache(args.cache_entries, int(args.cache_mb * 1024 * 1024)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+import argparse
+import json
+import sys
+
+from stashgen.simulate import format_report, simulate
+
+if hasattr(sys.stdout, "reconfigure"):
+    sys.stdout.reconfigure(encoding="utf-8") # type: ignore
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay a domain/IP trace against a generated profile's rules offline.",
+    )
+    parser.add_argument("profile", help="generated profile, e.g. files/stash_claude_v2.yaml")
+    parser.add_argument(
+        "--trace", default="-",
+        help="trace file, one 'host [port] [tcp|udp] [resolved-ip]' per line (default: stdin)",
+    )
+    parser.add_argument("--geoip", help="CSV of 'network,country' rows for GEOIP rules")
+    parser.add_argument("--repeat", type=int, default=1, help="replay the trace this many times")
+    parser.add_argument("--json", metavar="PATH", help="also write the report as JSON")
+    args = parser.parse_args()
+
+    if args.trace == "-":
+        trace = sys.stdin.read().splitlines()
+    else:
+        with open(args.trace, "r", encoding="utf-8") as f:
+            trace = f.read().splitlines()
+
+    report = simulate(args.profile, trace, args.geoip, args.repeat)
+    print(format_report(report))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,17 @@
-import urllib.request
 import urllib.parse
 import uuid
 import yaml
-from typing import Dict, Optional, List
+from typing import Dict, Iterable, Optional, List
 import sys
 import os
 import ipaddress
 
+from stashgen import pipeline
+from stashgen.rejects import RejectLog, reject
+
 os.makedirs("files", exist_ok=True)
 OUTPUT_FILE = os.path.join("files", "stash_claude_v2.yaml")
+EMITTER_VERSION = "1"
 
 if hasattr(sys.stdout, "reconfigure"):
     sys.stdout.reconfigure(encoding="utf-8") # type: ignore
@@ -81,7 +84,7 @@ def is_valid_server(server: str) -> bool:
     return True
 
 
-def parse_vless_url(line: str) -> Optional[Dict]:
+def parse_vless_url(line: str, rejects: Optional[RejectLog] = None) -> Optional[Dict]:
     line = line.strip()
     if not line.startswith("vless://"):
         return None
@@ -97,25 +100,27 @@ def parse_vless_url(line: str) -> Optional[Dict]:
         parsed  = urllib.parse.urlparse(url_part)
         netloc  = parsed.netloc
         if "@" not in netloc:
-            return None
+            return reject(rejects, "no_at", line)
 
         uuid_val, host_port = netloc.split("@", 1)
         uuid_val = uuid_val.strip()
-        if len(uuid_val) < 32 or ":" not in host_port:
-            return None
+        if len(uuid_val) < 32:
+            return reject(rejects, "short_uuid", line)
+        if ":" not in host_port:
+            return reject(rejects, "no_port", line)
 
         server, port_str = host_port.rsplit(":", 1)
         port = int(port_str)
         if not (1 <= port <= 65535):
-            return None
+            return reject(rejects, "bad_port", line)
 
         server = server.strip("[]")
         if not is_valid_server(server):
-            return None
+            return reject(rejects, "bad_server", line)
 
         params = urllib.parse.parse_qs(parsed.query)
         if params.get("security", [""])[0] != "reality":
-            return None
+            return reject(rejects, "not_reality", line)
 
         pbk  = params.get("pbk",  [None])[0]
         sid  = params.get("sid",  [""])[0]
@@ -123,12 +128,14 @@ def parse_vless_url(line: str) -> Optional[Dict]:
         fp   = params.get("fp",   ["chrome"])[0]
         flow = params.get("flow", [None])[0]
 
-        if not pbk or not sni:
-            return None
+        if not pbk:
+            return reject(rejects, "no_pbk", line)
+        if not sni:
+            return reject(rejects, "no_sni", line)
         if fp not in VALID_FINGERPRINTS:
             fp = "chrome"
         if flow not in VALID_FLOWS:
-            return None
+            return reject(rejects, "bad_flow", line)
 
         return {
             "name":               remark,
@@ -145,8 +152,7 @@ def parse_vless_url(line: str) -> Optional[Dict]:
         }
 
     except Exception as e:
-        print(f"  Parse error: {line[:60]}... -> {e}")
-        return None
+        return reject(rejects, f"error:{type(e).__name__}", line)
 
 
 def build_dns() -> Dict:
@@ -471,33 +477,14 @@ def build_proxy_entry(p: Dict) -> Dict:
     return entry
 
 
-def main():
-    print("=" * 52)
-    print("  Stash Config Generator — Optimized for Iran")
-    print("=" * 52)
-    print("\nDownloading server list...")
-
-    try:
-        req = urllib.request.Request(
-            SOURCE_URL,
-            headers={"User-Agent": "Mozilla/5.0 (Stash/ConfigGen)"},
-        )
-        with urllib.request.urlopen(req, timeout=20) as resp:
-            text = resp.read().decode("utf-8")
-    except Exception as e:
-        print(f"Download failed: {e}")
-        return
-
-    lines = text.splitlines()
-    print(f"  Total lines: {len(lines)}")
-
+def parse_proxies(lines: Iterable[str], rejects: Optional[RejectLog] = None) -> List[Dict]:
     raw: List[Dict] = []
     skipped = 0
     for line in lines:
         line = line.strip()
         if not line:
             continue
-        p = parse_vless_url(line)
+        p = parse_vless_url(line, rejects)
         if p:
             raw.append(p)
         elif line.startswith("vless://"):
@@ -506,57 +493,64 @@ def main():
     print(f"  Valid servers: {len(raw)}")
     if skipped:
         print(f"  Skipped (invalid): {skipped}")
+    return raw
 
-    if not raw:
-        print("No valid servers found.")
-        return
 
+def prepare_proxies(raw: List[Dict]) -> List[Dict]:
     unique = dedup_proxies(raw)
     names  = fix_names(unique)
     print(f"  Final unique proxies: {len(names)}")
+    return unique
 
-    entries = [build_proxy_entry(p) for p in unique]
 
-    config = {
+def build_config(proxies: List[Dict]) -> Dict:
+    names = [p["name"] for p in proxies]
+    return {
         "mode":      MODE,
         "log-level": LOG_LEVEL,
-        "dns": build_dns(),
+        "dns":       build_dns(),
         "script": {
             "shortcuts": {
                 "quic": "network == 'udp' and dst_port == 443",
             }
         },
-        "proxies":        entries,
+        "proxies":        [build_proxy_entry(p) for p in proxies],
         "proxy-groups":   build_proxy_groups(names),
         "rule-providers": build_rule_providers(),
         "rules":          build_rules(),
     }
 
-    try:
-        with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-            yaml.safe_dump(
-                config, f,
-                allow_unicode=True,
-                sort_keys=False,
-                indent=2,
-                default_flow_style=False,
-            )
-        size_kb = os.path.getsize(OUTPUT_FILE) / 1024
-        print(f"\nConfig saved: {OUTPUT_FILE}")
-        print(f"Size: {size_kb:.1f} KB  |  Proxies: {len(entries)}")
-        print("\nLoad in Stash: Profile -> + -> Import from file")
-        print("\nProxy groups:")
-        print("  🚀 Main Proxy    select manually")
-        print("  ♻️ Auto Best     lowest latency (every 3 min)")
-        print("  🔄 Fallback      ordered auto-switch")
-        print("  🇮🇷 Iran Direct  no proxy")
-        print("  ✈️ Telegram      dedicated")
-        print("  🤖 AI services   OpenAI / Claude / Gemini")
-        print("  📺 Media         YouTube / Netflix / Disney+")
-        print("  🚫 Ad Block      REJECT")
-        print("  🌐 Final         catch-all")
-    except Exception as e:
-        print(f"Error saving file: {e}")
+
+def dump_config(config: Dict, f) -> None:
+    yaml.safe_dump(
+        config, f,
+        allow_unicode=True,
+        sort_keys=False,
+        indent=2,
+        default_flow_style=False,
+    )
+
+
+def main():
+    print("=" * 52)
+    print("  Stash Config Generator — Optimized for Iran")
+    print("=" * 52)
+    print("\nDownloading server list...")
+
+    if not pipeline.run(sys.modules[__name__]):
+        return
+
+    print("\nLoad in Stash: Profile -> + -> Import from file")
+    print("\nProxy groups:")
+    print("  🚀 Main Proxy    select manually")
+    print("  ♻️ Auto Best     lowest latency (every 3 min)")
+    print("  🔄 Fallback      ordered auto-switch")
+    print("  🇮🇷 Iran Direct  no proxy")
+    print("  ✈️ Telegram      dedicated")
+    print("  🤖 AI services   OpenAI / Claude / Gemini")
+    print("  📺 Media         YouTube / Netflix / Disney+")
+    print("  🚫 Ad Block      REJECT")
+    print("  🌐 Final         catch-all")
 
 
 if __name__ == "__main__":
@@ -1,10 +1,15 @@
-import requests
 import yaml
 from urllib.parse import urlparse, parse_qs, unquote
 import os
+import sys
+
+from stashgen import pipeline
+from stashgen.rejects import reject
 
 os.makedirs("files", exist_ok=True)
 OUTPUT_FILE = os.path.join("files", "stash_gemini.yaml")
+EMITTER_VERSION = "1"
+FETCH_TIMEOUT = 15
 SOURCE_URL = "https://raw.githubusercontent.com/x45fh56/tgs/refs/heads/main/Servers/Protocols/Categorized_Servers/1_VLESS_REALITY_TCP.txt"
 
 BASE_CONFIG = {
@@ -169,7 +174,7 @@ def build_tls_stash(security, sni, fp, pbk, sid, alpn):
 
     return tls_config
 
-def parse_vless_stash(link):
+def parse_vless_stash(link, rejects=None):
     if not link.startswith("vless://"):
         return None
 
@@ -198,7 +203,7 @@ def parse_vless_stash(link):
         tls_settings = build_tls_stash(security, sni, fp, pbk, sid, alpn)
         
         if security == "reality" and tls_settings is None:
-            return None
+            return reject(rejects, "bad_reality", link)
 
         transport_settings = build_transport_stash(net_type, path, host, service_name, header_type)
 
@@ -225,92 +230,88 @@ def parse_vless_stash(link):
 
         return proxy
 
-    except Exception:
-        return None
-
-if __name__ == "__main__":
-    print(f"Downloading links from: {SOURCE_URL}")
-    try:
-        response = requests.get(SOURCE_URL, timeout=15)
-        response.raise_for_status()
-        links = response.text.splitlines()
     except Exception as e:
-        print(f"Failed to download: {e}")
-        exit(1)
+        return reject(rejects, f"error:{type(e).__name__}", link)
 
+def parse_proxies(links, rejects=None):
     proxies = []
-    name_counter = {}
-
-    print("Processing & Validating links for Stash...")
-    
     for link in links:
         stripped_link = link.strip()
         if stripped_link and not stripped_link.startswith("#"):
-            p = parse_vless_stash(stripped_link)
-            
+            p = parse_vless_stash(stripped_link, rejects)
             if p is not None and is_valid_proxy(p):
-                original_name = p["name"]
-                
-                if original_name in name_counter:
-                    name_counter[original_name] += 1
-                    new_name = f"{original_name} {name_counter[original_name]}"
-                    p["name"] = new_name
-                else:
-                    name_counter[original_name] = 1
-                
                 proxies.append(p)
-
+            elif p is not None:
+                reject(rejects, "invalid_proxy", stripped_link)
     print(f"Valid proxies extracted: {len(proxies)}")
+    return proxies
 
-    if proxies:
-        proxy_names = [p["name"] for p in proxies]
-        
-        proxy_groups = [
-            {
-                "name": "Proxy",
-                "type": "select",
-                "proxies": ["Auto", "Fallback", "DIRECT"] + proxy_names
-            },
-            {
-                "name": "Auto",
-                "type": "url-test",
-                "url": "http://www.gstatic.com/generate_204",
-                "interval": 600,
-                "tolerance": 100,
-                "proxies": proxy_names
-            },
-            {
-                "name": "Fallback",
-                "type": "fallback",
-                "url": "http://www.gstatic.com/generate_204",
-                "interval": 600,
-                "proxies": proxy_names
-            },
-            {
-                "name": "Iran-Direct",
-                "type": "select",
-                "proxies": ["DIRECT", "Proxy"]
-            }
-        ]
-
-        rules = [
-            "RULE-SET,Ads,REJECT",
-            "RULE-SET,Iran_Domains,Iran-Direct",
-            "RULE-SET,Iran_IP,Iran-Direct",
-            "DOMAIN-SUFFIX,ir,Iran-Direct",
-            "GEOIP,IR,Iran-Direct",
-            "GEOIP,PRIVATE,DIRECT",
-            "MATCH,Proxy"
-        ]
+def prepare_proxies(proxies):
+    name_counter = {}
+    for p in proxies:
+        original_name = p["name"]
+        if original_name in name_counter:
+            name_counter[original_name] += 1
+            new_name = f"{original_name} {name_counter[original_name]}"
+            p["name"] = new_name
+        else:
+            name_counter[original_name] = 1
+    return proxies
 
-        final_config = BASE_CONFIG.copy()
-        final_config["proxies"] = proxies
-        final_config["proxy-groups"] = proxy_groups
-        final_config["rules"] = rules
+def build_config(proxies):
+    proxy_names = [p["name"] for p in proxies]
+    
+    proxy_groups = [
+        {
+            "name": "Proxy",
+            "type": "select",
+            "proxies": ["Auto", "Fallback", "DIRECT"] + proxy_names
+        },
+        {
+            "name": "Auto",
+            "type": "url-test",
+            "url": "http://www.gstatic.com/generate_204",
+            "interval": 600,
+            "tolerance": 100,
+            "proxies": proxy_names
+        },
+        {
+            "name": "Fallback",
+            "type": "fallback",
+            "url": "http://www.gstatic.com/generate_204",
+            "interval": 600,
+            "proxies": proxy_names
+        },
+        {
+            "name": "Iran-Direct",
+            "type": "select",
+            "proxies": ["DIRECT", "Proxy"]
+        }
+    ]
+
+    rules = [
+        "RULE-SET,Ads,REJECT",
+        "RULE-SET,Iran_Domains,Iran-Direct",
+        "RULE-SET,Iran_IP,Iran-Direct",
+        "DOMAIN-SUFFIX,ir,Iran-Direct",
+        "GEOIP,IR,Iran-Direct",
+        "GEOIP,PRIVATE,DIRECT",
+        "MATCH,Proxy"
+    ]
+
+    final_config = BASE_CONFIG.copy()
+    final_config["proxies"] = proxies
+    final_config["proxy-groups"] = proxy_groups
+    final_config["rules"] = rules
+    return final_config
+
+def dump_config(config, f):
+    yaml.dump(config, f, allow_unicode=True, sort_keys=False, default_flow_style=False)
 
-        with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-            yaml.dump(final_config, f, allow_unicode=True, sort_keys=False, default_flow_style=False)
-        
-        print(f"[SUCCESS] Stash configuration saved to: {OUTPUT_FILE}")
-    else:
-        print("[ERROR] No valid proxies found after validation.")
\ No newline at end of file
+if __name__ == "__main__":
+    print(f"Downloading links from: {SOURCE_URL}")
+    print("Processing & Validating links for Stash...")
+    if not pipeline.run(sys.modules[__name__]):
+        print("[ERROR] No valid proxies found after validation.")
+        exit(1)
+    print(f"[SUCCESS] Stash configuration saved to: {OUTPUT_FILE}")
\ No newline at end of file
@@ -1,10 +1,15 @@
-import requests
 import yaml
 from urllib.parse import urlparse, parse_qs, unquote
 import os
+import sys
+
+from stashgen import pipeline
+from stashgen.rejects import reject
 
 os.makedirs("files", exist_ok=True)
 OUTPUT_FILE = os.path.join("files", "stash_gemini_v2.yaml")
+EMITTER_VERSION = "1"
+FETCH_TIMEOUT = 15
 SOURCE_URL = "https://raw.githubusercontent.com/x45fh56/tgs/refs/heads/main/Servers/Protocols/Categorized_Servers/1_VLESS_REALITY_TCP.txt"
 
 def get_base_config():
@@ -172,7 +177,7 @@ def build_tls_stash(security, sni, fp, pbk, sid, alpn):
         tls_config["skip-cert-verify"] = True 
     return tls_config
 
-def parse_vless_stash(link):
+def parse_vless_stash(link, rejects=None):
     if not link.startswith("vless://"):
         return None
     try:
@@ -196,7 +201,7 @@ def parse_vless_stash(link):
         alpn = params.get("alpn", [""])[0]
         tls_settings = build_tls_stash(security, sni, fp, pbk, sid, alpn)
         if security == "reality" and tls_settings is None:
-            return None
+            return reject(rejects, "bad_reality", link)
         transport_settings = build_transport_stash(net_type, path, host, service_name, header_type)
         proxy = {
             "name": name,
@@ -216,140 +221,144 @@ def parse_vless_stash(link):
         if transport_settings:
             proxy.update(transport_settings)
         return proxy
-    except Exception:
-        return None
-
-if __name__ == "__main__":
-    try:
-        response = requests.get(SOURCE_URL, timeout=15)
-        response.raise_for_status()
-        links = response.text.splitlines()
-    except Exception:
-        exit(1)
+    except Exception as e:
+        return reject(rejects, f"error:{type(e).__name__}", link)
 
+def parse_proxies(links, rejects=None):
     proxies = []
-    name_counter = {}
-
     for link in links:
         stripped_link = link.strip()
         if stripped_link and not stripped_link.startswith("#"):
-            p = parse_vless_stash(stripped_link)
+            p = parse_vless_stash(stripped_link, rejects)
             if p is not None and is_valid_proxy(p):
-                original_name = p["name"]
-                if original_name in name_counter:
-                    name_counter[original_name] += 1
-                    new_name = f"{original_name} {name_counter[original_name]}"
-                    p["name"] = new_name
-                else:
-                    name_counter[original_name] = 1
                 proxies.append(p)
+            elif p is not None:
+                reject(rejects, "invalid_proxy", stripped_link)
+    return proxies
 
-    if proxies:
-        proxy_names = [p["name"] for p in proxies]
-        
-        # Icons URLs
-        icon_area = "https://cdn.jsdelivr.net/gh/zuluion/Qure/IconSet/Color/Area.png"
-        icon_auto = "https://cdn.jsdelivr.net/gh/zuluion/Qure/IconSet/Color/Auto.png"
-        icon_direct = "https://cdn.jsdelivr.net/gh/zuluion/Qure/IconSet/Color/Direct.png"
-        icon_proxy = "https://cdn.jsdelivr.net/gh/zuluion/Qure/IconSet/Color/Proxy.png"
-        icon_tg = "https://cdn.jsdelivr.net/gh/zuluion/Qure/IconSet/Color/Telegram.png"
-        icon_yt = "https://cdn.jsdelivr.net/gh/zuluion/Qure/IconSet/Color/YouTube.png"
-        icon_nf = "https://cdn.jsdelivr.net/gh/zuluion/Qure/IconSet/Color/Netflix.png"
-        icon_sp = "https://cdn.jsdelivr.net/gh/zuluion/Qure/IconSet/Color/Spotify.png"
-        icon_ai = "https://cdn.jsdelivr.net/gh/zuluion/Qure/IconSet/Color/AI.png"
-        icon_game = "https://cdn.jsdelivr.net/gh/zuluion/Qure/IconSet/Color/Game.png"
+def prepare_proxies(proxies):
+    name_counter = {}
+    for p in proxies:
+        original_name = p["name"]
+        if original_name in name_counter:
+            name_counter[original_name] += 1
+            new_name = f"{original_name} {name_counter[original_name]}"
+            p["name"] = new_name
+        else:
+            name_counter[original_name] = 1
+    return proxies
 
-        proxy_groups = [
-            {
-                "name": "🚀 Proxy",
-                "type": "select",
-                "icon": icon_proxy,
-                "proxies": ["⚡ Auto", "⏳ Fallback", "DIRECT"] + proxy_names
-            },
-            {
-                "name": "⚡ Auto",
-                "type": "url-test",
-                "icon": icon_auto,
-                "url": "http://www.gstatic.com/generate_204",
-                "interval": 300,
-                "tolerance": 50,
-                "proxies": proxy_names
-            },
-            {
-                "name": "⏳ Fallback",
-                "type": "fallback",
-                "icon": icon_auto,
-                "url": "http://www.gstatic.com/generate_204",
-                "interval": 300,
-                "proxies": proxy_names
-            },
-            {
-                "name": "🇮🇷 Iran Direct",
-                "type": "select",
-                "icon": icon_area,
-                "proxies": ["DIRECT", "🚀 Proxy"]
-            },
-            {
-                "name": "Telegram",
-                "type": "select",
-                "icon": icon_tg,
-                "proxies": ["🚀 Proxy", "⚡ Auto", "DIRECT"]
-            },
-            {
-                "name": "YouTube",
-                "type": "select",
-                "icon": icon_yt,
-                "proxies": ["🚀 Proxy", "⚡ Auto"]
-            },
-            {
-                "name": "Netflix",
-                "type": "select",
-                "icon": icon_nf,
-                "proxies": ["🚀 Proxy", "⚡ Auto"]
-            },
-            {
-                "name": "Spotify",
-                "type": "select",
-                "icon": icon_sp,
-                "proxies": ["🚀 Proxy", "⚡ Auto"]
-            },
-            {
-                "name": "OpenAI",
-                "type": "select",
-                "icon": icon_ai,
-                "proxies": ["🚀 Proxy", "⚡ Auto"]
-            },
-            {
-                "name": "Steam",
-                "type": "select",
-                "icon": icon_game,
-                "proxies": ["🚀 Proxy", "⚡ Auto", "DIRECT"]
-            }
-        ]
+def build_config(proxies):
+    proxy_names = [p["name"] for p in proxies]
+    
+    # Icons URLs
+    icon_area = "https://cdn.jsdelivr.net/gh/zuluion/Qure/IconSet/Color/Area.png"
+    icon_auto = "https://cdn.jsdelivr.net/gh/zuluion/Qure/IconSet/Color/Auto.png"
+    icon_direct = "https://cdn.jsdelivr.net/gh/zuluion/Qure/IconSet/Color/Direct.png"
+    icon_proxy = "https://cdn.jsdelivr.net/gh/zuluion/Qure/IconSet/Color/Proxy.png"
+    icon_tg = "https://cdn.jsdelivr.net/gh/zuluion/Qure/IconSet/Color/Telegram.png"
+    icon_yt = "https://cdn.jsdelivr.net/gh/zuluion/Qure/IconSet/Color/YouTube.png"
+    icon_nf = "https://cdn.jsdelivr.net/gh/zuluion/Qure/IconSet/Color/Netflix.png"
+    icon_sp = "https://cdn.jsdelivr.net/gh/zuluion/Qure/IconSet/Color/Spotify.png"
+    icon_ai = "https://cdn.jsdelivr.net/gh/zuluion/Qure/IconSet/Color/AI.png"
+    icon_game = "https://cdn.jsdelivr.net/gh/zuluion/Qure/IconSet/Color/Game.png"
+
+    proxy_groups = [
+        {
+            "name": "🚀 Proxy",
+            "type": "select",
+            "icon": icon_proxy,
+            "proxies": ["⚡ Auto", "⏳ Fallback", "DIRECT"] + proxy_names
+        },
+        {
+            "name": "⚡ Auto",
+            "type": "url-test",
+            "icon": icon_auto,
+            "url": "http://www.gstatic.com/generate_204",
+            "interval": 300,
+            "tolerance": 50,
+            "proxies": proxy_names
+        },
+        {
+            "name": "⏳ Fallback",
+            "type": "fallback",
+            "icon": icon_auto,
+            "url": "http://www.gstatic.com/generate_204",
+            "interval": 300,
+            "proxies": proxy_names
+        },
+        {
+            "name": "🇮🇷 Iran Direct",
+            "type": "select",
+            "icon": icon_area,
+            "proxies": ["DIRECT", "🚀 Proxy"]
+        },
+        {
+            "name": "Telegram",
+            "type": "select",
+            "icon": icon_tg,
+            "proxies": ["🚀 Proxy", "⚡ Auto", "DIRECT"]
+        },
+        {
+            "name": "YouTube",
+            "type": "select",
+            "icon": icon_yt,
+            "proxies": ["🚀 Proxy", "⚡ Auto"]
+        },
+        {
+            "name": "Netflix",
+            "type": "select",
+            "icon": icon_nf,
+            "proxies": ["🚀 Proxy", "⚡ Auto"]
+        },
+        {
+            "name": "Spotify",
+            "type": "select",
+            "icon": icon_sp,
+            "proxies": ["🚀 Proxy", "⚡ Auto"]
+        },
+        {
+            "name": "OpenAI",
+            "type": "select",
+            "icon": icon_ai,
+            "proxies": ["🚀 Proxy", "⚡ Auto"]
+        },
+        {
+            "name": "Steam",
+            "type": "select",
+            "icon": icon_game,
+            "proxies": ["🚀 Proxy", "⚡ Auto", "DIRECT"]
+        }
+    ]
 
-        rules = [
-            "RULE-SET,Ads,REJECT",
-            "RULE-SET,Iran_Domains,🇮🇷 Iran Direct",
-            "RULE-SET,Iran_IP,🇮🇷 Iran Direct",
-            "DOMAIN-SUFFIX,ir,🇮🇷 Iran Direct",
-            "GEOIP,IR,🇮🇷 Iran Direct",
-            "GEOIP,PRIVATE,DIRECT",
-            "RULE-SET,Telegram,Telegram",
-            "RULE-SET,YouTube,YouTube",
-            "RULE-SET,Netflix,Netflix",
-            "RULE-SET,Spotify,Spotify",
-            "RULE-SET,OpenAI,OpenAI",
-            "RULE-SET,Steam,Steam",
-            "RULE-SET,Microsoft,DIRECT",
-            "RULE-SET,Apple,DIRECT",
-            "RULE-SET,Google,🚀 Proxy",
-            "MATCH,🚀 Proxy"
-        ]
+    rules = [
+        "RULE-SET,Ads,REJECT",
+        "RULE-SET,Iran_Domains,🇮🇷 Iran Direct",
+        "RULE-SET,Iran_IP,🇮🇷 Iran Direct",
+        "DOMAIN-SUFFIX,ir,🇮🇷 Iran Direct",
+        "GEOIP,IR,🇮🇷 Iran Direct",
+        "GEOIP,PRIVATE,DIRECT",
+        "RULE-SET,Telegram,Telegram",
+        "RULE-SET,YouTube,YouTube",
+        "RULE-SET,Netflix,Netflix",
+        "RULE-SET,Spotify,Spotify",
+        "RULE-SET,OpenAI,OpenAI",
+        "RULE-SET,Steam,Steam",
+        "RULE-SET,Microsoft,DIRECT",
+        "RULE-SET,Apple,DIRECT",
+        "RULE-SET,Google,🚀 Proxy",
+        "MATCH,🚀 Proxy"
+    ]
 
-        final_config = get_base_config()
-        final_config["proxies"] = proxies
-        final_config["proxy-groups"] = proxy_groups
-        final_config["rules"] = rules
+    final_config = get_base_config()
+    final_config["proxies"] = proxies
+    final_config["proxy-groups"] = proxy_groups
+    final_config["rules"] = rules
+    return final_config
 
-        with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-            yaml.dump(final_config, f, allow_unicode=True, sort_keys=False, default_flow_style=False)
\ No newline at end of file
+def dump_config(config, f):
+    yaml.dump(config, f, allow_unicode=True, sort_keys=False, default_flow_style=False)
+
+if __name__ == "__main__":
+    if not pipeline.run(sys.modules[__name__]):
+        exit(1)
\ No newline at end of file
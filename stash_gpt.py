@@ -1,14 +1,18 @@
 import os
-import requests
+import sys
 import yaml
 from urllib.parse import urlparse, parse_qs, unquote
 
+from stashgen import pipeline
+from stashgen.rejects import reject
+
 SOURCE_URL = "https://raw.githubusercontent.com/x45fh56/tgs/refs/heads/main/Servers/Protocols/Categorized_Servers/1_VLESS_REALITY_TCP.txt"
 
 OUTPUT_FILE = os.path.join("files", "stash_gpt.yaml")
+EMITTER_VERSION = "1"
 
 
-def parse_vless(link, existing_names):
+def parse_vless(link, rejects=None):
     link = link.strip()
     if not link.startswith("vless://"):
         return None
@@ -17,22 +21,27 @@ def parse_vless(link, existing_names):
 
     uuid_value = parsed.username
     server = parsed.hostname
-    port = parsed.port
+    try:
+        port = parsed.port
+    except ValueError:
+        return reject(rejects, "bad_port", link)
 
     if not server or not port or not uuid_value:
-        return None
+        return reject(rejects, "missing_field", link)
 
     params = parse_qs(parsed.query)
 
     security = params.get("security", ["none"])[0]
     if security != "reality":
-        return None
+        return reject(rejects, "not_reality", link)
 
     public_key = params.get("pbk", [None])[0]
     short_id = params.get("sid", [None])[0]
 
-    if not public_key or not short_id:
-        return None
+    if not public_key:
+        return reject(rejects, "no_pbk", link)
+    if not short_id:
+        return reject(rejects, "no_sid", link)
 
     sni = params.get("sni", [server])[0]
     fingerprint = params.get("fp", ["chrome"])[0]
@@ -40,9 +49,6 @@ def parse_vless(link, existing_names):
 
     remark = unquote(parsed.fragment) if parsed.fragment else f"{server}:{port}"
 
-    if remark in existing_names:
-        return None
-
     proxy = {
         "name": remark,
         "type": "vless",
@@ -145,25 +151,32 @@ def build_config(proxies):
     return config
 
 
-def main():
-    response = requests.get(SOURCE_URL, timeout=20)
-    response.raise_for_status()
-
-    lines = response.text.splitlines()
-
+def parse_proxies(lines, rejects=None):
     proxies = []
-    existing_names = set()
-
     for line in lines:
-        proxy = parse_vless(line, existing_names)
+        proxy = parse_vless(line, rejects)
         if proxy:
-            existing_names.add(proxy["name"])
             proxies.append(proxy)
+    return proxies
+
 
-    config = build_config(proxies)
+def prepare_proxies(proxies):
+    unique = []
+    existing_names = set()
+    for proxy in proxies:
+        if proxy["name"] not in existing_names:
+            existing_names.add(proxy["name"])
+            unique.append(proxy)
+    return unique
 
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        yaml.dump(config, f, allow_unicode=True, sort_keys=False)
+
+def dump_config(config, f):
+    yaml.dump(config, f, allow_unicode=True, sort_keys=False)
+
+
+def main():
+    if not pipeline.run(sys.modules[__name__]):
+        sys.exit(1)
 
 
 if __name__ == "__main__":
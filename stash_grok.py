@@ -1,13 +1,16 @@
-import urllib.request
 import urllib.parse
 import uuid
 import yaml
-from typing import Dict, Optional, List
+from typing import Dict, Iterable, Optional, List
 import sys
 import os
 
+from stashgen import pipeline
+from stashgen.rejects import RejectLog, reject
+
 os.makedirs("files", exist_ok=True)
 OUTPUT_FILE = os.path.join("files", "stash_grok.yaml")
+EMITTER_VERSION = "1"
 
 if hasattr(sys.stdout, "reconfigure"):
     sys.stdout.reconfigure(encoding="utf-8") # type: ignore
@@ -19,39 +22,41 @@ ALLOW_LAN = True
 LOG_LEVEL = "info"
 MODE = "rule"
 
-def parse_vless_url(line: str) -> Optional[Dict]:
+def parse_vless_url(line: str, rejects: Optional[RejectLog] = None) -> Optional[Dict]:
     line = line.strip()
-    if not line.startswith("vless://") or "#" not in line:
+    if not line.startswith("vless://"):
         return None
+    if "#" not in line:
+        return reject(rejects, "no_remark", line)
     try:
         url_part, remark_part = line.split("#", 1)
         remark = urllib.parse.unquote(remark_part.strip()) if remark_part.strip() else f"Reality-{uuid.uuid4().hex[:6]}"
         parsed = urllib.parse.urlparse(url_part)
         uuid_and_host = parsed.netloc
         if '@' not in uuid_and_host:
-            return None
+            return reject(rejects, "no_at", line)
         uuid_val, host_port = uuid_and_host.split("@", 1)
         if len(uuid_val) != 36 or '-' not in uuid_val:
-            print(f"Invalid UUID skipped (len={len(uuid_val)}): {uuid_val[:10]}... from {line[:80]}...")
-            return None
+            return reject(rejects, "bad_uuid", line)
         clean_uuid = uuid_val.replace('-', '')
         if len(clean_uuid) != 32 or not all(c in '0123456789abcdefABCDEF' for c in clean_uuid):
-            print(f"Invalid UUID chars skipped: {uuid_val[:10]}...")
-            return None
+            return reject(rejects, "bad_uuid", line)
         server, port_str = host_port.rsplit(":", 1)
         port = int(port_str)
         params = urllib.parse.parse_qs(parsed.query)
         security = params.get("security", [""])[0]
         if security != "reality":
-            return None
+            return reject(rejects, "not_reality", line)
         pbk = params.get("pbk", [None])[0]
         sid = params.get("sid", [""])[0]
         sni = params.get("sni", [""])[0]
         fp = params.get("fp", ["chrome"])[0]
         flow = params.get("flow", [None])[0]
         spx = params.get("spx", [None])[0]
-        if not pbk or not sni:
-            return None
+        if not pbk:
+            return reject(rejects, "no_pbk", line)
+        if not sni:
+            return reject(rejects, "no_sni", line)
         return {
             "name": remark,
             "server": server,
@@ -69,8 +74,7 @@ def parse_vless_url(line: str) -> Optional[Dict]:
             "spiderX": spx if spx else None
         }
     except Exception as e:
-        print(f"Parse error: {line[:60]}... → {e}")
-        return None
+        return reject(rejects, f"error:{type(e).__name__}", line)
 
 def build_dns() -> Dict:
     return {
@@ -123,25 +127,15 @@ def build_dns() -> Dict:
         }
     }
 
-def main():
-    print("Downloading server list...")
-    try:
-        with urllib.request.urlopen(SOURCE_URL) as response:
-            text = response.read().decode("utf-8")
-    except Exception as e:
-        print(f"Download failed: {e}")
-        return
-
+def parse_proxies(lines: Iterable[str], rejects: Optional[RejectLog] = None) -> List[Dict]:
     proxies: List[Dict] = []
-    for line in text.splitlines():
-        proxy = parse_vless_url(line)
+    for line in lines:
+        proxy = parse_vless_url(line, rejects)
         if proxy:
             proxies.append(proxy)
+    return proxies
 
-    if not proxies:
-        print("No valid VLESS Reality servers found.")
-        return
-
+def prepare_proxies(proxies: List[Dict]) -> List[Dict]:
     print(f"Found {len(proxies)} valid servers.")
 
     proxy_names = []
@@ -163,15 +157,39 @@ def main():
         proxy_names.append(new_name)
 
     print(f"Unique proxy names: {len(proxy_names)}")
+    return proxies
+
+def build_proxy_entry(p: Dict) -> Dict:
+    entry = {
+        "name": p["name"],
+        "type": "vless",
+        "server": p["server"],
+        "port": p["port"],
+        "uuid": p["uuid"],
+        "network": "tcp",
+        "tls": True,
+        "servername": p["servername"],
+        "client-fingerprint": p["client-fingerprint"],
+        "reality-opts": p["reality-opts"],
+        "skip-cert-verify": True,
+        "udp": True,
+        "benchmark-url": "http://www.gstatic.com/generate_204",
+        "benchmark-timeout": 6
+    }
+    if p.get("flow"):
+        entry["flow"] = p["flow"]
+    return entry
 
-    config = {
+def build_config(proxies: List[Dict]) -> Dict:
+    proxy_names = [p["name"] for p in proxies]
+    return {
         "mixed-port": MIXED_PORT,
         "allow-lan": ALLOW_LAN,
         "mode": MODE,
         "log-level": LOG_LEVEL,
         "ipv6": False,
         "dns": build_dns(),
-        "proxies": [],
+        "proxies": [build_proxy_entry(p) for p in proxies],
         "proxy-groups": [
             {
                 "name": "Main Select",
@@ -223,34 +241,13 @@ def main():
         ]
     }
 
-    for p in proxies:
-        entry = {
-            "name": p["name"],
-            "type": "vless",
-            "server": p["server"],
-            "port": p["port"],
-            "uuid": p["uuid"],
-            "network": "tcp",
-            "tls": True,
-            "servername": p["servername"],
-            "client-fingerprint": p["client-fingerprint"],
-            "reality-opts": p["reality-opts"],
-            "skip-cert-verify": True,
-            "udp": True,
-            "benchmark-url": "http://www.gstatic.com/generate_204",
-            "benchmark-timeout": 6
-        }
-        if p.get("flow"):
-            entry["flow"] = p["flow"]
-        config["proxies"].append(entry)
+def dump_config(config: Dict, f) -> None:
+    yaml.safe_dump(config, f, allow_unicode=True, sort_keys=False, indent=2, default_flow_style=False)
 
-    try:
-        with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-            yaml.safe_dump(config, f, allow_unicode=True, sort_keys=False, indent=2, default_flow_style=False)
-        print(f"\nConfig saved: {OUTPUT_FILE}")
+def main():
+    print("Downloading server list...")
+    if pipeline.run(sys.modules[__name__]):
         print("Optimized for Iran users")
-    except Exception as e:
-        print(f"Error saving file: {e}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
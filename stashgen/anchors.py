@@ -0,0 +1,39 @@
+import json
+from typing import Dict, Tuple
+
+# Anything shorter than this (as compact JSON) costs more as "&idNNN"/"*idNNN"
+# than it saves, so it is left inline.
+MIN_SIZE = 16
+
+def _intern(value, pool: Dict[str, object]) -> Tuple[object, str]:
+    # Returns the shared copy of value and its canonical key. Keys keep
+    # mapping order and container subclass, since both change how the value
+    # is dumped.
+    if isinstance(value, dict):
+        items, parts = type(value)(), []
+        for k, v in value.items():
+            v, key = _intern(v, pool)
+            items[k] = v
+            parts.append(json.dumps(k, ensure_ascii=False) + ":" + key)
+        key = type(value).__name__ + "{" + ",".join(parts) + "}"
+        value = items
+    elif isinstance(value, list):
+        items, parts = type(value)(), []
+        for v in value:
+            v, key = _intern(v, pool)
+            items.append(v)
+            parts.append(key)
+        key = type(value).__name__ + "[" + ",".join(parts) + "]"
+        value = items
+    else:
+        return value, json.dumps(value, ensure_ascii=False, default=repr)
+    if len(key) < MIN_SIZE:
+        return value, key
+    return pool.setdefault(key, value), key
+
+
+def intern(config: Dict) -> Dict:
+    # PyYAML anchors any mapping or sequence it meets more than once, so
+    # making equal sub-structures the same object is all it takes to have
+    # them written once and aliased afterwards.
+    return _intern(config, {})[0]
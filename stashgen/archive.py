@@ -0,0 +1,235 @@
+import calendar
+import hashlib
+import json
+import os
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple, Union
+
+from stashgen.snapshot import CACHE_DIR, atomic_write, digest_text
+
+ARCHIVE_DIR    = os.path.join(CACHE_DIR, "archive")
+KEYFRAME_EVERY = 32
+ZDICT_SIZE     = 32 * 1024
+LEVEL          = 9
+
+# Preset dictionary for keyframes, which have no previous snapshot to
+# borrow from: the fragments every vless line of the upstream lists repeats
+SHARED_DICT = (
+    "vless://?encryption=none&security=reality&sni=www.speedtest.net&fp=chrome&pbk="
+    "&type=tcp&flow=xtls-rprx-vision&sid=&spx=%2F&headerType=none&type=grpc&serviceName="
+    "&type=ws&host=&path=%2F&security=tls&alpn=h2%2Chttp%2F1.1&fp=firefox&fp=safari&fp=ios"
+    "&fp=random&sni=deepl.com&sni=www.microsoft.com&sni=dl.google.com&sni=www.apple.com"
+    ":443?:8443?:2053?:2083?:2087?:2096?#%F0%9F%87%A9%F0%9F%87%AA#%F0%9F%87%B3%F0%9F%87%B1"
+    "#%F0%9F%87%BA%F0%9F%87%B8#%F0%9F%87%AB%F0%9F%87%AE#%F0%9F%87%AE%F0%9F%87%B7 | @\n"
+    "vless://"
+).encode("utf-8")
+
+# A delta is a list of ops: (start, count) copies lines of the previous
+# snapshot, a list of strings adds new lines
+Op = Union[Tuple[int, int], List[str]]
+
+
+def diff_lines(old: List[str], new: List[str]) -> List[Op]:
+    # Linear in both lists: every line of new that the previous snapshot
+    # also had becomes a copy, consecutive copies merge into one run
+    first: Dict[str, int] = {}
+    for i, line in enumerate(old):
+        first.setdefault(line, i)
+    ops: List[Op] = []
+    run_start, run_end = -1, -1
+    literal: List[str] = []
+    for line in new:
+        if run_start >= 0 and run_end < len(old) and old[run_end] == line:
+            run_end += 1
+            continue
+        at = first.get(line)
+        if run_start >= 0:
+            ops.append((run_start, run_end - run_start))
+            run_start = -1
+        if at is None:
+            literal.append(line)
+            continue
+        if literal:
+            ops.append(literal)
+            literal = []
+        run_start, run_end = at, at + 1
+    if run_start >= 0:
+        ops.append((run_start, run_end - run_start))
+    if literal:
+        ops.append(literal)
+    return ops
+
+
+def apply_ops(old: List[str], ops: List[Op]) -> List[str]:
+    out: List[str] = []
+    for op in ops:
+        if isinstance(op, tuple):
+            out.extend(old[op[0]:op[0] + op[1]])
+        else:
+            out.extend(op)
+    return out
+
+
+def encode_ops(ops: List[Op]) -> bytes:
+    # "=start,count" copies, "+count" is followed by count new lines
+    parts: List[str] = []
+    for op in ops:
+        if isinstance(op, tuple):
+            parts.append(f"={op[0]},{op[1]}")
+        else:
+            parts.append(f"+{len(op)}")
+            parts.extend(op)
+    return "\n".join(parts).encode("utf-8")
+
+
+def decode_ops(data: bytes) -> List[Op]:
+    parts = data.decode("utf-8").split("\n") if data else []
+    ops: List[Op] = []
+    i = 0
+    while i < len(parts):
+        head = parts[i]
+        if head.startswith("="):
+            start, count = head[1:].split(",")
+            ops.append((int(start), int(count)))
+            i += 1
+        else:
+            count = int(head[1:])
+            ops.append(parts[i + 1:i + 1 + count])
+            i += 1 + count
+    return ops
+
+
+def _zdict(previous: Optional[List[str]]) -> bytes:
+    # The tail of the previous snapshot primes the window with the hosts
+    # and parameters the new lines most likely share
+    if previous is None:
+        return SHARED_DICT
+    return "\n".join(previous).encode("utf-8")[-ZDICT_SIZE:]
+
+
+def compress(data: bytes, zdict: bytes) -> bytes:
+    c = zlib.compressobj(LEVEL, zlib.DEFLATED, zlib.MAX_WBITS, 9, zlib.Z_DEFAULT_STRATEGY, zdict)
+    return c.compress(data) + c.flush()
+
+
+def decompress(data: bytes, zdict: bytes) -> bytes:
+    d = zlib.decompressobj(zlib.MAX_WBITS, zdict)
+    return d.decompress(data) + d.flush()
+
+
+def parse_when(value: str) -> float:
+    # "latest", unix seconds or a UTC date/time like 2026-10-18T06:00
+    if value == "latest":
+        return float("inf")
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    for fmt in ("%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M", "%Y-%m-%d"):
+        try:
+            return float(calendar.timegm(time.strptime(value, fmt)))
+        except ValueError:
+            continue
+    raise ValueError(f"bad time {value!r}, expected latest, unix seconds or YYYY-MM-DD[THH:MM[:SS]] (UTC)")
+
+
+class Archive:
+    # Every distinct snapshot of one source list. Entry n is stored as a
+    # zlib-compressed delta against entry n - 1, except every
+    # KEYFRAME_EVERY-th entry, which is stored whole, so rebuilding any
+    # snapshot applies at most KEYFRAME_EVERY - 1 deltas.
+
+    def __init__(self, url: str, root: Optional[str] = None):
+        self.url  = url
+        self.dir  = os.path.join(root or ARCHIVE_DIR, hashlib.sha1(url.encode("utf-8")).hexdigest()[:16])
+        self.entries: List[Dict] = []
+        self._last: Optional[Tuple[int, List[str]]] = None
+        try:
+            with open(os.path.join(self.dir, "index.json"), "r", encoding="utf-8") as f:
+                self.entries = json.load(f)["entries"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def _path(self, seq: int) -> str:
+        return os.path.join(self.dir, f"{seq:06d}.z")
+
+    def lines(self, seq: int) -> List[str]:
+        # Walks forward from the nearest keyframe, or from the last
+        # snapshot rebuilt when it lies on the way
+        key   = seq - seq % KEYFRAME_EVERY
+        start = key
+        lines: Optional[List[str]] = None
+        if self._last is not None and key <= self._last[0] <= seq:
+            start, lines = self._last[0] + 1, self._last[1]
+        for n in range(start, seq + 1):
+            with open(self._path(n), "rb") as f:
+                data = decompress(f.read(), _zdict(lines))
+            lines = apply_ops(lines or [], decode_ops(data))
+        self._last = (seq, lines)
+        return lines
+
+    def text(self, seq: int) -> str:
+        return "\n".join(self.lines(seq))
+
+    def at(self, when: float) -> Optional[Dict]:
+        # The snapshot that was current at when
+        found = None
+        for entry in self.entries:
+            if entry["time"] > when:
+                break
+            found = entry
+        return found
+
+    def record(self, text: str, previous: Optional[str] = None, now: Optional[float] = None) -> Optional[Dict]:
+        # previous, if given, is taken to be the text of the last entry when
+        # its digest matches, which saves rebuilding it. None when text is
+        # the last entry already.
+        digest = digest_text(text)
+        if self.entries and self.entries[-1]["digest"] == digest:
+            return None
+        seq  = len(self.entries)
+        new  = text.split("\n")
+        prev: Optional[List[str]] = None
+        if seq % KEYFRAME_EVERY:
+            last = self.entries[-1]
+            if previous is not None and digest_text(previous) == last["digest"]:
+                prev = previous.split("\n")
+            else:
+                prev = self.lines(seq - 1)
+        ops  = diff_lines(prev, new) if prev is not None else [new]
+        blob = compress(encode_ops(ops), _zdict(prev))
+        atomic_write(self._path(seq), blob)
+        entry = {
+            "seq":    seq,
+            "digest": digest,
+            "time":   int(time.time() if now is None else now),
+            "kind":   "delta" if prev is not None else "key",
+            "lines":  len(new),
+            "bytes":  len(text.encode("utf-8")),
+            "stored": len(blob),
+        }
+        self.entries.append(entry)
+        payload = {"url": self.url, "entries": self.entries}
+        atomic_write(os.path.join(self.dir, "index.json"), json.dumps(payload, indent=1).encode("utf-8"))
+        self._last = (seq, new)
+        return entry
+
+
+def record(url: str, text: str, previous: Optional[str] = None) -> Optional[Dict]:
+    entry = Archive(url).record(text, previous)
+    if entry is not None:
+        print(
+            f"  Archived {url} #{entry['seq']} ({entry['kind']}, "
+            f"{entry['bytes'] / 1024:.1f} KB -> {entry['stored'] / 1024:.1f} KB)"
+        )
+    return entry
+
+
+def reconstruct(url: str, when: float = float("inf")) -> Optional[Tuple[Dict, str]]:
+    # The archived entry current at when and its text
+    arch  = Archive(url)
+    entry = arch.at(when)
+    if entry is None:
+        return None
+    return entry, arch.text(entry["seq"])
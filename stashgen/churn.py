@@ -0,0 +1,135 @@
+import hashlib
+import os
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from stashgen.output import file_mode
+from stashgen.snapshot import CACHE_DIR
+
+try:
+    import numpy as np
+except ImportError:  # churn tracking is optional
+    np = None
+
+CHURN_FILE = os.path.join(CACHE_DIR, "churn.npz")
+RETENTION  = 30 * 24 * 3600
+
+
+def available() -> bool:
+    return np is not None
+
+
+def proxy_key(p: Dict) -> int:
+    # The dedup key (server, port, uuid) folded into 64 bits
+    text   = f"{str(p['server']).lower()}:{p['port']}:{str(p['uuid']).lower()}"
+    digest = hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def keys_of(proxies: List[Dict]) -> "np.ndarray":
+    return np.fromiter((proxy_key(p) for p in proxies), dtype=np.uint64, count=len(proxies))
+
+
+class ChurnStore:
+    # One row per endpoint ever seen, sorted by key: when it was first and
+    # last seen and in how many runs. Kept as parallel arrays in one .npz.
+
+    def __init__(self, path: str = CHURN_FILE):
+        self.path  = path
+        self.keys  = np.zeros(0, dtype=np.uint64)
+        self.first = np.zeros(0, dtype=np.int64)
+        self.last  = np.zeros(0, dtype=np.int64)
+        self.count = np.zeros(0, dtype=np.uint32)
+        self.runs  = 0
+
+    @classmethod
+    def load(cls, path: str = CHURN_FILE) -> "ChurnStore":
+        store = cls(path)
+        try:
+            with np.load(path) as data:
+                store.keys  = data["keys"]
+                store.first = data["first"]
+                store.last  = data["last"]
+                store.count = data["count"]
+                store.runs  = int(data["runs"])
+        except (OSError, KeyError, ValueError):
+            pass
+        return store
+
+    def save(self) -> None:
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        mode = file_mode(self.path)
+        fd, tmp = tempfile.mkstemp(prefix=f".{os.path.basename(self.path)}.", suffix=".tmp", dir=directory)
+        try:
+            os.chmod(tmp, mode)
+            with os.fdopen(fd, "wb") as f:
+                np.savez_compressed(
+                    f,
+                    keys=self.keys, first=self.first, last=self.last, count=self.count,
+                    runs=np.int64(self.runs),
+                )
+            os.replace(tmp, self.path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+    def _find(self, keys: "np.ndarray"):
+        # Row of each key and whether it is there at all
+        idx = np.searchsorted(self.keys, keys)
+        if not len(self.keys):
+            return idx, np.zeros(len(keys), dtype=bool)
+        found = self.keys[np.minimum(idx, len(self.keys) - 1)] == keys
+        return idx, found
+
+    def update(self, proxies: List[Dict], now: Optional[float] = None) -> Dict[str, int]:
+        now  = int(time.time() if now is None else now)
+        seen = np.unique(keys_of(proxies))
+        idx, found = self._find(seen)
+
+        rows = idx[found]
+        self.last[rows]   = now
+        self.count[rows] += 1
+
+        fresh = seen[~found]
+        keys  = np.concatenate([self.keys, fresh])
+        order = np.argsort(keys, kind="stable")
+        self.keys  = keys[order]
+        self.first = np.concatenate([self.first, np.full(len(fresh), now, dtype=np.int64)])[order]
+        self.last  = np.concatenate([self.last, np.full(len(fresh), now, dtype=np.int64)])[order]
+        self.count = np.concatenate([self.count, np.ones(len(fresh), dtype=np.uint32)])[order]
+
+        # Endpoints gone for longer than the retention window are forgotten
+        keep = self.last >= now - RETENTION
+        dropped = int((~keep).sum())
+        if dropped:
+            self.keys, self.first, self.last, self.count = (
+                self.keys[keep], self.first[keep], self.last[keep], self.count[keep],
+            )
+        self.runs += 1
+        return {"seen": len(seen), "new": len(fresh), "known": int(found.sum()), "dropped": dropped}
+
+    def lifetimes(self, proxies: List[Dict]) -> "np.ndarray":
+        # Seconds between first and last sighting; 0 for unknown endpoints
+        idx, found = self._find(keys_of(proxies))
+        out = np.zeros(len(proxies), dtype=np.int64)
+        rows = idx[found]
+        out[found] = self.last[rows] - self.first[rows]
+        return out
+
+    def appearances(self, proxies: List[Dict]) -> "np.ndarray":
+        idx, found = self._find(keys_of(proxies))
+        out = np.zeros(len(proxies), dtype=np.uint32)
+        out[found] = self.count[idx[found]]
+        return out
+
+    def order(self, proxies: List[Dict]) -> List[Dict]:
+        # Longest-lived first; ties keep their order
+        if not proxies or not len(self.keys):
+            return proxies
+        ranks = np.argsort(-self.lifetimes(proxies), kind="stable")
+        return [proxies[i] for i in ranks]
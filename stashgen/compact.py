@@ -0,0 +1,89 @@
+from typing import Dict, List
+
+import yaml
+
+DEFAULTS_KEY = "x-proxy-defaults"
+
+# Keys that identify a proxy stay on its line even if every proxy happens to
+# share them, so a one-server profile still reads naturally.
+KEEP_KEYS = ("name", "server", "port", "uuid")
+
+
+class FlowMap(dict):
+    # A mapping written on one line
+    pass
+
+
+class MergeKey(str):
+    # The "<<" merge key; a plain "<<" string would be quoted
+    pass
+
+
+MERGE = MergeKey("<<")
+
+
+class Dumper(yaml.SafeDumper):
+    # The proxies are dumped apart from the other sections, whose own
+    # anchors start at id001 again; a document may not repeat an anchor.
+    ANCHOR_TEMPLATE = "p%03d"
+
+
+Dumper.add_representer(
+    FlowMap,
+    lambda d, data: d.represent_mapping("tag:yaml.org,2002:map", data, flow_style=True),
+)
+Dumper.add_representer(
+    MergeKey,
+    lambda d, data: d.represent_scalar("tag:yaml.org,2002:merge", data),
+)
+
+
+def dump(config: Dict, f) -> None:
+    yaml.dump(
+        config, f,
+        Dumper=Dumper,
+        allow_unicode=True,
+        sort_keys=False,
+        indent=2,
+        default_flow_style=False,
+        width=float("inf"),
+    )
+
+
+def shared_defaults(proxies: List[Dict]) -> Dict:
+    # Scalar settings every proxy has with the same value
+    if len(proxies) < 2:
+        return {}
+    first = proxies[0]
+    return {
+        k: v for k, v in first.items()
+        if k not in KEEP_KEYS
+        and not isinstance(v, (dict, list))
+        and all(k in p and p[k] == v and type(p[k]) is type(v) for p in proxies)
+    }
+
+
+def hoist(config: Dict) -> Dict:
+    # The defaults go in an anchored top-level mapping that each proxy pulls
+    # in with "<<", which loads to exactly the original entries.
+    proxies  = config.get("proxies") or []
+    defaults = shared_defaults(proxies)
+    out: Dict = {}
+    for key, value in config.items():
+        if key == "proxies":
+            if defaults:
+                out[DEFAULTS_KEY] = defaults
+            value = [
+                FlowMap(([(MERGE, defaults)] if defaults else [])
+                        + [(k, v) for k, v in p.items() if k not in defaults])
+                for p in value
+            ]
+        out[key] = value
+    return out
+
+
+def effective(loaded: Dict) -> Dict:
+    # What a client sees once merge keys are resolved
+    loaded = dict(loaded)
+    loaded.pop(DEFAULTS_KEY, None)
+    return loaded
@@ -0,0 +1,69 @@
+import contextlib
+import sys
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO
+
+
+class GroupedOutput:
+    # Stands in for sys.stdout while the stages of several flavours run at
+    # once. A thread inside group(key) writes to that key's buffer, every
+    # other thread straight through; release() prints the buffers in order.
+
+    def __init__(self, target: TextIO):
+        self.target = target
+        self.buffers: Dict[str, List[str]] = {}
+        self.local = threading.local()
+        self.lock  = threading.Lock()
+
+    def write(self, text: str) -> int:
+        key = getattr(self.local, "key", None)
+        if key is None:
+            return self.target.write(text)
+        with self.lock:
+            self.buffers.setdefault(key, []).append(text)
+        return len(text)
+
+    def flush(self) -> None:
+        self.target.flush()
+
+    def __getattr__(self, name: str):
+        # encoding, isatty() and the rest come from the real stream
+        return getattr(self.target, name)
+
+    @contextlib.contextmanager
+    def group(self, key: str) -> Iterator[None]:
+        outer = getattr(self.local, "key", None)
+        self.local.key = key
+        try:
+            yield
+        finally:
+            self.local.key = outer
+
+    def release(self, keys: Iterable[str]) -> None:
+        for key in keys:
+            with self.lock:
+                text = "".join(self.buffers.pop(key, []))
+            if text:
+                self.target.write(text)
+        self.target.flush()
+
+
+@contextlib.contextmanager
+def grouped() -> Iterator[GroupedOutput]:
+    # Whatever is still buffered when the block ends is printed unordered
+    # rather than lost
+    out = GroupedOutput(sys.stdout)
+    sys.stdout = out
+    try:
+        yield out
+    finally:
+        sys.stdout = out.target
+        out.release(list(out.buffers))
+
+
+def group(key: Optional[str]):
+    # Outside grouped(), or for output that belongs to no group, a no-op
+    out = sys.stdout
+    if key is None or not isinstance(out, GroupedOutput):
+        return contextlib.nullcontext()
+    return out.group(key)
@@ -0,0 +1,112 @@
+import random
+import urllib.parse
+import uuid
+from typing import Dict, List, Optional
+
+FINGERPRINTS = ["chrome", "firefox", "safari", "ios", "edge", "qq", "random"]
+SNIS         = ["www.speedtest.net", "deepl.com", "www.microsoft.com", "dl.google.com", "www.apple.com"]
+FLAGS        = ["🇩🇪", "🇳🇱", "🇫🇮", "🇦🇪", "🇺🇸", "🇹🇷", "🇬🇧", "🇫🇷", "🇨🇦", "🇮🇷"]
+TLDS         = ["com", "net", "org", "ir", "xyz", "online"]
+FLOWS        = ["xtls-rprx-vision", "xtls-rprx-origin", "xtls-rprx-direct", "xtls-rprx-splice", None, ""]
+
+# Relative weights of each kind of line in a mixed corpus
+DEFAULT_MIX = {
+    "valid":          70,
+    "duplicate":       8,
+    "name_collision":  6,
+    "ipv6":            5,
+    "bad_uuid":        4,
+    "no_pbk":          3,
+    "no_sni":          2,
+    "not_reality":     1,
+    "garbage":         1,
+}
+
+
+def _pbk(rng: random.Random) -> str:
+    alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_"
+    return "".join(rng.choice(alphabet) for _ in range(43))
+
+
+def _server(rng: random.Random, i: int) -> str:
+    if rng.random() < 0.6:
+        return f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+    return f"s{i}.{rng.choice(['node', 'edge', 'vpn', 'cdn'])}{rng.randint(1, 999)}.{rng.choice(TLDS)}"
+
+
+def _remark(rng: random.Random, i: int) -> str:
+    return f"{rng.choice(FLAGS)} Node-{i} | @channel_{rng.randint(1, 50)}"
+
+
+def vless_line(
+    rng: random.Random,
+    i: int,
+    flow: Optional[str] = "xtls-rprx-vision",
+    server: Optional[str] = None,
+    user: Optional[str] = None,
+    remark: Optional[str] = None,
+    drop: tuple = (),
+    security: str = "reality",
+) -> str:
+    # A well-formed REALITY link that every flavour accepts, unless told to
+    # drop parameters or change the security.
+    params = {
+        "security": security,
+        "encryption": "none",
+        "pbk":  _pbk(rng),
+        "sid":  "%016x" % rng.getrandbits(64),
+        "sni":  rng.choice(SNIS),
+        "fp":   rng.choice(FINGERPRINTS),
+        "type": "tcp",
+    }
+    if flow:
+        params["flow"] = flow
+    for key in drop:
+        params.pop(key, None)
+    user   = user or str(uuid.UUID(int=rng.getrandbits(128), version=4))
+    server = server or _server(rng, i)
+    port   = rng.choice([443, 8443, 2053, rng.randint(1024, 65535)])
+    remark = remark if remark is not None else _remark(rng, i)
+    return f"vless://{user}@{server}:{port}?{urllib.parse.urlencode(params)}#{urllib.parse.quote(remark)}"
+
+
+def vless_lines(n: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    return [vless_line(rng, i) for i in range(n)]
+
+
+def mixed_lines(n: int, seed: int = 0, mix: Optional[Dict[str, int]] = None) -> List[str]:
+    # Deterministic for a given seed: what upstream lists look like, with
+    # repeats, clashing remarks, IPv6 hosts, every flow value and the usual
+    # broken links.
+    rng   = random.Random(seed)
+    mix   = mix or DEFAULT_MIX
+    kinds = list(mix)
+    weights = [mix[k] for k in kinds]
+    lines: List[str] = []
+    remarks: List[str] = []
+    for i in range(n):
+        kind = rng.choices(kinds, weights)[0]
+        if kind == "duplicate" and lines:
+            lines.append(rng.choice(lines))
+            continue
+        if kind == "name_collision" and remarks:
+            line = vless_line(rng, i, flow=rng.choice(FLOWS), remark=rng.choice(remarks))
+        elif kind == "ipv6":
+            host = ":".join("%x" % rng.getrandbits(16) for _ in range(8))
+            line = vless_line(rng, i, flow=rng.choice(FLOWS), server=f"[{host}]")
+        elif kind == "bad_uuid":
+            line = vless_line(rng, i, user="%x" % rng.getrandbits(rng.choice([32, 64, 96])))
+        elif kind == "no_pbk":
+            line = vless_line(rng, i, drop=("pbk",))
+        elif kind == "no_sni":
+            line = vless_line(rng, i, drop=("sni",))
+        elif kind == "not_reality":
+            line = vless_line(rng, i, security=rng.choice(["tls", "none"]))
+        elif kind == "garbage":
+            line = rng.choice(["vless://", "vless://@:0", "vmess://e30=", "# comment", "vless://x@host:notaport"])
+        else:
+            line = vless_line(rng, i, flow=rng.choice(FLOWS))
+        lines.append(line)
+        remarks.append(urllib.parse.unquote(line.rpartition("#")[2]))
+    return lines
@@ -0,0 +1,267 @@
+import asyncio
+import contextlib
+import multiprocessing
+import os
+import queue
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, ContextManager, Dict, Iterable, List, Optional
+
+QUEUE_SIZE = 4
+
+_DONE = object()
+
+
+class StageSkipped(Exception):
+    pass
+
+
+class Channel:
+    # Bounded hand-off between a producing stage and one consumer.  A full
+    # channel blocks the producer, which is the backpressure.
+
+    def __init__(self, size: int = QUEUE_SIZE):
+        self._q     = queue.Queue(size)
+        self.closed = False
+
+    def put(self, item: Any) -> None:
+        while not self.closed:
+            try:
+                self._q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def __iter__(self):
+        while True:
+            item = self._q.get()
+            if item is _DONE:
+                return
+            yield item
+
+
+class Stage:
+    def __init__(
+        self,
+        name: str,
+        fn: Callable,
+        deps: List[str],
+        stream_from: Optional[str],
+        process: bool = False,
+    ):
+        self.name        = name
+        self.fn          = fn
+        self.deps        = deps
+        self.stream_from = stream_from
+        self.process     = process
+        self.start       = 0.0
+        self.end         = 0.0
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.channel: Optional[Channel] = None
+        self.outputs: List[Channel] = []
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+    @property
+    def status(self) -> str:
+        if self.error is None:
+            return "ok"
+        return "skipped" if isinstance(self.error, StageSkipped) else "failed"
+
+    def predecessors(self) -> List[str]:
+        return self.deps + ([self.stream_from] if self.stream_from else [])
+
+
+class Graph:
+    # Stages are plain callables run on a worker pool from an asyncio loop.
+    # A stage starts when all of its deps have finished and is called with
+    # their results in order.  A stage with stream_from starts as soon as the
+    # producer starts and gets an iterator over the items the producer yields
+    # as its first argument.  Stages added with process=True run on a
+    # process pool instead; their fn and arguments must be picklable and
+    # they cannot take part in streaming.  instrument, if given, is entered
+    # around every thread stage on the thread that runs it.
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        queue_size: int = QUEUE_SIZE,
+        processes: Optional[int] = None,
+        instrument: Optional[Callable[[str], ContextManager]] = None,
+    ):
+        self.stages: Dict[str, Stage] = {}
+        self.workers    = workers
+        self.queue_size = queue_size
+        self.processes  = processes
+        self.instrument = instrument
+        self.wall       = 0.0
+
+    def add(
+        self,
+        name: str,
+        fn: Callable,
+        deps: Iterable[str] = (),
+        stream_from: Optional[str] = None,
+        process: bool = False,
+    ) -> Stage:
+        if name in self.stages:
+            raise ValueError(f"duplicate stage: {name}")
+        stage = Stage(name, fn, list(deps), stream_from, process)
+        for dep in stage.predecessors():
+            if dep not in self.stages:
+                raise ValueError(f"{name}: unknown dependency {dep}")
+        if stream_from and (process or self.stages[stream_from].process):
+            raise ValueError(f"{name}: process stages cannot stream")
+        if stream_from:
+            stage.channel = Channel(self.queue_size)
+            self.stages[stream_from].outputs.append(stage.channel)
+        self.stages[name] = stage
+        return stage
+
+    def run(self) -> Dict[str, Any]:
+        asyncio.run(self._run())
+        return {s.name: s.result for s in self.stages.values()}
+
+    async def _run(self) -> None:
+        loop    = asyncio.get_running_loop()
+        started = {name: asyncio.Event() for name in self.stages}
+        tasks: Dict[str, asyncio.Task] = {}
+        # Streaming stages hold a worker while they wait on their channel, so
+        # the default pool gives every stage its own thread.
+        workers = self.workers or max(4, len(self.stages))
+        procs   = self._process_pool()
+        t0 = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(workers, thread_name_prefix="stage") as pool:
+                for stage in self.stages.values():
+                    tasks[stage.name] = asyncio.create_task(
+                        self._run_stage(stage, tasks, started, procs if stage.process else pool, loop)
+                    )
+                await asyncio.gather(*tasks.values(), return_exceptions=True)
+        finally:
+            if procs is not None:
+                procs.shutdown()
+        self.wall = time.perf_counter() - t0
+
+    def _process_pool(self) -> Optional[ProcessPoolExecutor]:
+        count = sum(1 for s in self.stages.values() if s.process)
+        if not count:
+            return None
+        # spawn: the loop and stage threads are already running, and forking
+        # a threaded process is not safe
+        procs = ProcessPoolExecutor(
+            max_workers=self.processes or min(count, os.cpu_count() or 1),
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        # Start the workers now so interpreter start-up overlaps fetching
+        procs.submit(int)
+        return procs
+
+    async def _run_stage(self, stage: Stage, tasks, started, pool, loop) -> Any:
+        try:
+            if stage.stream_from:
+                await started[stage.stream_from].wait()
+            args = []
+            for dep in stage.deps:
+                try:
+                    args.append(await tasks[dep])
+                except BaseException as e:
+                    raise StageSkipped(f"{dep} did not complete") from e
+        except StageSkipped as e:
+            stage.error = e
+            if stage.channel is not None:
+                stage.channel.closed = True
+            self._close_outputs(stage)
+            started[stage.name].set()
+            raise
+
+        started[stage.name].set()
+        stage.start = time.perf_counter()
+        try:
+            if stage.process:
+                stage.result = await loop.run_in_executor(pool, stage.fn, *args)
+            else:
+                stage.result = await loop.run_in_executor(pool, self._call, stage, args)
+        except BaseException as e:
+            stage.error = e
+            raise
+        finally:
+            stage.end = time.perf_counter()
+        if stage.stream_from:
+            # A consumer only saw a complete stream if its producer succeeded
+            try:
+                await tasks[stage.stream_from]
+            except BaseException as e:
+                stage.error = StageSkipped(f"{stage.stream_from} did not complete")
+                raise stage.error from e
+        return stage.result
+
+    def _call(self, stage: Stage, args: List[Any]) -> Any:
+        instrument = self.instrument(stage.name) if self.instrument else contextlib.nullcontext()
+        with instrument:
+            return self._call_stage(stage, args)
+
+    def _call_stage(self, stage: Stage, args: List[Any]) -> Any:
+        if stage.channel is not None:
+            try:
+                return stage.fn(iter(stage.channel), *args)
+            finally:
+                stage.channel.closed = True
+        if not stage.outputs:
+            return stage.fn(*args)
+        count = 0
+        try:
+            for item in stage.fn(*args):
+                for channel in stage.outputs:
+                    channel.put(item)
+                count += 1
+        finally:
+            self._close_outputs(stage)
+        return count
+
+    @staticmethod
+    def _close_outputs(stage: Stage) -> None:
+        for channel in stage.outputs:
+            channel.put(_DONE)
+
+    def critical_path(self) -> List[Stage]:
+        finished = [s for s in self.stages.values() if s.end]
+        if not finished:
+            return []
+        stage = max(finished, key=lambda s: s.end)
+        path  = [stage]
+        while True:
+            preds = [self.stages[n] for n in stage.predecessors() if self.stages[n].end]
+            if not preds:
+                break
+            stage = max(preds, key=lambda s: s.end)
+            path.append(stage)
+        return path[::-1]
+
+    def report(self) -> str:
+        stages = sorted(
+            (s for s in self.stages.values() if s.start),
+            key=lambda s: s.start,
+        )
+        t0 = min((s.start for s in stages), default=0.0)
+        busy = sum(s.duration for s in stages)
+        width = max((len(s.name) for s in stages), default=5)
+        lines = [f"Stage timings (wall {self.wall:.2f} s, sum of stages {busy:.2f} s):"]
+        for s in stages:
+            lines.append(
+                f"  {s.name:<{width}}  {s.start - t0:7.3f} -> {s.end - t0:7.3f}"
+                f"  {s.duration:7.3f} s  {s.status}"
+            )
+        for s in self.stages.values():
+            if s.error is not None:
+                lines.append(f"  {s.name:<{width}}  {s.status}: {s.error}")
+        path = self.critical_path()
+        if path:
+            lines.append(
+                "Critical path: " + " -> ".join(s.name for s in path)
+                + f"  ({path[-1].end - path[0].start:.2f} s)"
+            )
+        return "\n".join(lines)
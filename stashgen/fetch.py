@@ -0,0 +1,206 @@
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+TIMEOUT      = 20
+HEDGE_DELAY  = 0.5
+CHUNK_SIZE   = 64 * 1024
+RAW_PREFIX   = "https://raw.githubusercontent.com/"
+MAX_PER_HOST = 4
+MAX_HOSTS    = 32
+
+HEADERS = {
+    "User-Agent":      "Mozilla/5.0 (Stash/ConfigGen)",
+    "Accept-Encoding": "gzip",
+}
+
+# Templates for mirrors serving the same file as raw.githubusercontent.com.
+# Override with STASH_MIRRORS="tpl1,tpl2" (empty string disables mirrors).
+MIRROR_TEMPLATES = [
+    "https://cdn.jsdelivr.net/gh/{owner}/{repo}@{branch}/{path}",
+    "https://fastly.jsdelivr.net/gh/{owner}/{repo}@{branch}/{path}",
+]
+
+SESSION = requests.Session()
+
+
+def configure_pool(max_per_host: int = MAX_PER_HOST) -> None:
+    # One keep-alive pool per host; pool_block makes max_per_host a hard cap
+    # on concurrent connections instead of a hint.
+    adapter = HTTPAdapter(
+        pool_connections=MAX_HOSTS,
+        pool_maxsize=max_per_host,
+        pool_block=True,
+    )
+    SESSION.mount("http://", adapter)
+    SESSION.mount("https://", adapter)
+
+
+configure_pool()
+
+
+class FetchCancelled(Exception):
+    pass
+
+
+class ValidatorCache:
+    # ETag / Last-Modified and body of the last 200 per URL, so repeat
+    # fetches in one process are conditional and a 304 reuses the body.
+
+    def __init__(self):
+        self.entries: Dict[str, Tuple[Dict[str, str], bytes]] = {}
+        self.revalidated: Dict[str, bool] = {}
+        self.lock = threading.Lock()
+
+    def conditional(self, url: str) -> Dict[str, str]:
+        with self.lock:
+            entry = self.entries.get(url)
+        return dict(entry[0]) if entry else {}
+
+    def store(self, url: str, resp: requests.Response, body: bytes) -> None:
+        validators = {}
+        if resp.headers.get("ETag"):
+            validators["If-None-Match"] = resp.headers["ETag"]
+        if resp.headers.get("Last-Modified"):
+            validators["If-Modified-Since"] = resp.headers["Last-Modified"]
+        with self.lock:
+            if validators:
+                self.entries[url] = (validators, body)
+            else:
+                self.entries.pop(url, None)
+            self.revalidated[url] = False
+
+    def reuse(self, url: str) -> bytes:
+        with self.lock:
+            self.revalidated[url] = True
+            return self.entries[url][1]
+
+    def not_modified(self, url: str) -> bool:
+        # Whether the last fetch of url was answered with 304
+        with self.lock:
+            return self.revalidated.get(url, False)
+
+
+VALIDATORS = ValidatorCache()
+
+
+def mirror_templates() -> List[str]:
+    env = os.environ.get("STASH_MIRRORS")
+    if env is None:
+        return list(MIRROR_TEMPLATES)
+    return [t.strip() for t in env.split(",") if t.strip()]
+
+
+def mirrors_for(url: str) -> List[str]:
+    if not url.startswith(RAW_PREFIX):
+        return []
+    parts = url[len(RAW_PREFIX):].split("/")
+    if len(parts) < 4:
+        return []
+    owner, repo = parts[0], parts[1]
+    if parts[2:4] == ["refs", "heads"] and len(parts) > 5:
+        branch, path = parts[4], "/".join(parts[5:])
+    else:
+        branch, path = parts[2], "/".join(parts[3:])
+    return [
+        tpl.format(owner=owner, repo=repo, branch=branch, path=path)
+        for tpl in mirror_templates()
+    ]
+
+
+def _download(url: str, timeout: float, cancel: threading.Event) -> Tuple[str, bytes]:
+    deadline = time.monotonic() + timeout
+    chunks: List[bytes] = []
+    validators = VALIDATORS.conditional(url)
+    with SESSION.get(url, headers=dict(HEADERS, **validators), timeout=timeout, stream=True) as resp:
+        if resp.status_code == 304 and validators:
+            return url, VALIDATORS.reuse(url)
+        resp.raise_for_status()
+        # iter_content inflates gzip bodies chunk by chunk as they arrive
+        for chunk in resp.iter_content(CHUNK_SIZE):
+            if cancel.is_set():
+                raise FetchCancelled(url)
+            if time.monotonic() > deadline:
+                raise requests.Timeout(f"{url}: no complete response in {timeout}s")
+            chunks.append(chunk)
+        body = b"".join(chunks)
+        VALIDATORS.store(url, resp, body)
+    return url, body
+
+
+def fetch_first(
+    urls: Sequence[str],
+    timeout: float = TIMEOUT,
+    hedge_delay: float = HEDGE_DELAY,
+) -> Tuple[str, bytes]:
+    # The first URL gets a head start of hedge_delay seconds; after that (or
+    # as soon as it fails) every other URL joins the race.  The first complete
+    # response wins and the remaining downloads are cancelled.
+    if not urls:
+        raise ValueError("no URLs to fetch")
+    cancel = threading.Event()
+    errors: List[str] = []
+    pool = ThreadPoolExecutor(max_workers=len(urls))
+    try:
+        pending = {pool.submit(_download, urls[0], timeout, cancel)}
+        queued  = list(urls[1:])
+        while pending:
+            done, pending = wait(
+                pending,
+                timeout=hedge_delay if queued else None,
+                return_when=FIRST_COMPLETED,
+            )
+            for fut in done:
+                try:
+                    result = fut.result()
+                except Exception as e:
+                    errors.append(str(e))
+                    continue
+                return result
+            if queued:
+                pending |= {pool.submit(_download, u, timeout, cancel) for u in queued}
+                queued = []
+    finally:
+        cancel.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+    raise ConnectionError("all sources failed: " + " | ".join(errors))
+
+
+def fetch_text(
+    url: str,
+    mirrors: Optional[Sequence[str]] = None,
+    timeout: float = TIMEOUT,
+) -> str:
+    if mirrors is None:
+        mirrors = mirrors_for(url)
+    winner, body = fetch_first([url, *mirrors], timeout=timeout)
+    with VALIDATORS.lock:
+        VALIDATORS.revalidated[url] = VALIDATORS.revalidated.get(winner, False)
+    return body.decode("utf-8")
+
+
+def iter_fetch(
+    urls: Sequence[str],
+    timeout: float = TIMEOUT,
+    mirrors: Optional[dict] = None,
+) -> Iterator[Tuple[str, Optional[str], Optional[Exception]]]:
+    # Yields (url, text, None) or (url, None, error) in completion order.
+    mirrors = mirrors or {}
+    if not urls:
+        return
+    with ThreadPoolExecutor(max_workers=len(urls)) as pool:
+        futures = {
+            pool.submit(fetch_text, url, mirrors.get(url), timeout): url
+            for url in urls
+        }
+        for fut in as_completed(futures):
+            url = futures[fut]
+            try:
+                yield url, fut.result(), None
+            except Exception as e:
+                yield url, None, e
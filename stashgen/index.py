@@ -0,0 +1,143 @@
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple, Union
+
+from stashgen.names import flag_of
+
+REGIONAL_A = 0x1F1E6
+SET_CACHE  = 256
+
+
+def country_code(name: str) -> str:
+    # "🇩🇪 Berlin" -> "DE"; "" when the name carries no flag
+    flag = flag_of(name)
+    if len(flag) != 2 or not all(REGIONAL_A <= ord(ch) < REGIONAL_A + 26 for ch in flag):
+        return ""
+    return "".join(chr(ord(ch) - REGIONAL_A + ord("A")) for ch in flag)
+
+
+def _country(value: str) -> str:
+    # Queries may use the code or the flag itself
+    code = country_code(value)
+    return code or value.upper()
+
+
+# Field -> how to read it off a proxy. Flavours name some keys differently,
+# so each reader tries the spellings in use.
+FIELDS: Dict[str, Callable[[Dict], str]] = {
+    "port":        lambda p: str(p.get("port", "")),
+    "country":     lambda p: country_code(str(p.get("name", ""))),
+    "flow":        lambda p: p.get("flow") or "",
+    "fingerprint": lambda p: p.get("client-fingerprint") or "",
+    "network":     lambda p: p.get("network") or "tcp",
+    "sni":         lambda p: str(p.get("sni") or p.get("servername") or "").lower(),
+    "server":      lambda p: str(p.get("server", "")).lower(),
+}
+
+# How a query value is brought to the indexed form
+NORMALIZE: Dict[str, Callable[[str], str]] = {
+    "country": _country,
+    "sni":     str.lower,
+    "server":  str.lower,
+}
+
+Query = Dict[str, Union[str, Iterable[str]]]
+
+
+class ProxyIndex:
+    # Inverted index over one flavour's deduped proxies: field -> value ->
+    # sorted array of proxy ids (positions in the list). A query unions the
+    # arrays of the values asked for within a field and intersects fields,
+    # starting from the smallest, so its cost follows the candidate count
+    # rather than the number of proxies.
+
+    def __init__(
+        self,
+        proxies: List[Dict],
+        fields: Optional[Dict[str, Callable[[Dict], str]]] = None,
+        max_sets: int = SET_CACHE,
+    ):
+        self.proxies = proxies
+        self.fields  = fields or FIELDS
+        self.postings: Dict[str, Dict[str, array]] = {f: {} for f in self.fields}
+        for i, p in enumerate(proxies):
+            for field, read in self.fields.items():
+                postings = self.postings[field]
+                value = read(p)
+                if value not in postings:
+                    postings[value] = array("I")
+                postings[value].append(i)
+        # Least recently used first; every distinct query value adds a set,
+        # so the cache is capped at max_sets
+        self.max_sets = max_sets
+        self._sets: "OrderedDict[tuple, FrozenSet[int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def values(self, field: str) -> Dict[str, int]:
+        # Each indexed value of field with its proxy count
+        return {v: len(ids) for v, ids in self.postings[field].items()}
+
+    def lookup(self, field: str, value: str) -> array:
+        if field not in self.postings:
+            raise KeyError(f"unknown field {field!r}, expected one of {', '.join(self.fields)}")
+        value = NORMALIZE.get(field, str)(value)
+        return self.postings[field].get(value, array("I"))
+
+    def _matches(self, field: str, values: Iterable[str]) -> array:
+        arrays = [self.lookup(field, v) for v in values]
+        if len(arrays) == 1:
+            return arrays[0]
+        return array("I", sorted(set().union(*arrays)))
+
+    def _set(self, field: str, values: tuple, ids: array) -> FrozenSet[int]:
+        key = (field, values)
+        with self._lock:
+            found = self._sets.get(key)
+            if found is not None:
+                self._sets.move_to_end(key)
+                return found
+        found = frozenset(ids)
+        with self._lock:
+            self._sets[key] = found
+            while len(self._sets) > self.max_sets:
+                self._sets.popitem(last=False)
+        return found
+
+    def select(self, query: Query) -> List[int]:
+        if not query:
+            return list(range(len(self.proxies)))
+        terms = []
+        for field, values in query.items():
+            values = (values,) if isinstance(values, str) else tuple(values)
+            terms.append((field, values, self._matches(field, values)))
+        terms.sort(key=lambda t: len(t[2]))
+        field, values, ids = terms[0]
+        others = [self._set(f, v, a) for f, v, a in terms[1:]]
+        return [i for i in ids if all(i in s for s in others)]
+
+    def query(self, query: Query) -> List[Dict]:
+        # Matching proxies in their original order
+        return [self.proxies[i] for i in self.select(query)]
+
+
+def normalize_query(query: Query) -> Tuple[Tuple[str, Tuple[str, ...]], ...]:
+    # A hashable form in which equal queries compare equal whatever the
+    # order or spelling of their terms
+    out = []
+    for field, values in query.items():
+        values = (values,) if isinstance(values, str) else values
+        norm   = NORMALIZE.get(field, str)
+        out.append((field, tuple(sorted({norm(v) for v in values}))))
+    return tuple(sorted(out))
+
+
+def parse_query(terms: Iterable[str]) -> Query:
+    # ["port=443", "country=DE,NL"] -> {"port": "443", "country": ["DE", "NL"]}
+    query: Dict[str, List[str]] = {}
+    for term in terms:
+        field, sep, values = term.partition("=")
+        if not sep or not field or not values:
+            raise ValueError(f"bad filter {term!r}, expected FIELD=VALUE[,VALUE...]")
+        query.setdefault(field.strip(), []).extend(v.strip() for v in values.split(",") if v.strip())
+    return query
@@ -0,0 +1,423 @@
+import gc
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from itertools import accumulate
+from operator import itemgetter
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from stashgen.snapshot import SNAPSHOT_DIR, atomic_write, ir_path
+
+MAGIC   = b"STIR"
+VERSION = 1
+HEADER  = struct.Struct("<4sHHIQQ")  # magic, version, flags, count, meta offset, meta length
+ALIGN   = 8
+LITTLE  = sys.byteorder == "little"
+
+# Column kinds
+INT, BOOL, STR, DICT, JSON = "int", "bool", "str", "dict", "json"
+
+Path = Tuple[str, ...]
+
+
+def bin_path(flavour: str) -> str:
+    return os.path.join(SNAPSHOT_DIR, f"{flavour}.ir.bin")
+
+
+def current_path(flavour: str) -> str:
+    # The binary IR unless it is missing or older than the JSON one
+    path = bin_path(flavour)
+    try:
+        if os.path.getmtime(path) >= os.path.getmtime(ir_path(flavour)):
+            return path
+    except OSError:
+        if os.path.exists(path):
+            return path
+    return ir_path(flavour)
+
+
+def _flatten(p: Dict, prefix: Path = ()) -> List[Tuple[Path, Any]]:
+    # {"reality-opts": {"short-id": ...}} -> [(("reality-opts", "short-id"), ...)]
+    out: List[Tuple[Path, Any]] = []
+    for k, v in p.items():
+        if isinstance(v, dict) and v:
+            out.extend(_flatten(v, prefix + (k,)))
+        else:
+            out.append((prefix + (k,), v))
+    return out
+
+
+def _group(proxies: List[Dict], idx: Iterable[int], key: Callable[[Dict], Tuple]) -> Dict[Tuple, List[int]]:
+    groups: Dict[Tuple, List[int]] = {}
+    for i in idx:
+        groups.setdefault(key(proxies[i]), []).append(i)
+    return groups
+
+
+def _layout(rows: List[Dict]) -> Optional[List[Tuple[Path, List[Any]]]]:
+    # Columns of rows that all have the same keys in the same order, or
+    # None when their nested dicts differ and each needs its own shape
+    out: List[Tuple[Path, List[Any]]] = []
+    for k in rows[0]:
+        values = [p[k] for p in rows]
+        if dict not in set(map(type, values)):
+            out.append(((k,), values))
+            continue
+        if not all(values) or set(map(type, values)) != {dict} or len(set(map(tuple, values))) != 1:
+            return None
+        for k2 in values[0]:
+            inner = [v[k2] for v in values]
+            if dict in set(map(type, inner)):
+                return None
+            out.append(((k, k2), inner))
+    return out
+
+
+def _kind(values: List[Any]) -> str:
+    present = [v for v in values if v is not None] if None in values else values
+    types   = set(map(type, present))
+    if types == {bool}:
+        return BOOL
+    if types == {int} and -2**63 <= min(present) and max(present) < 2**63:
+        return INT
+    if types <= {str}:
+        if "\0" in "".join(present):
+            return JSON
+        # Few distinct values (fingerprints, SNIs, flows) are stored once
+        return DICT if len(set(present)) * 4 <= len(present) else STR
+    return JSON
+
+
+class _Writer:
+
+    def __init__(self):
+        self.out = bytearray(HEADER.size)
+
+    def put(self, data: bytes) -> int:
+        self.out.extend(b"\0" * (-len(self.out) % ALIGN))
+        offset = len(self.out)
+        self.out.extend(data)
+        return offset
+
+    def put_array(self, arr: array) -> int:
+        if not LITTLE:
+            arr = array(arr.typecode, arr)
+            arr.byteswap()
+        return self.put(arr.tobytes())
+
+    def put_strings(self, values: List[str]) -> Dict[str, int]:
+        # NUL-separated, so a whole column decodes with one split; the
+        # offsets give single values without scanning
+        text = "\0".join(values)
+        blob = text.encode("utf-8")
+        if len(blob) >= 2**32:
+            raise ValueError("string column too large for the binary IR")
+        # Byte lengths are character lengths unless something is non-ASCII
+        sizes   = map(len, values) if len(blob) == len(text) else (len(s.encode("utf-8")) for s in values)
+        offsets = array("I", accumulate((size + 1 for size in sizes), initial=0))
+        return {"offsets": self.put_array(offsets), "blob": self.put(blob), "size": len(blob)}
+
+
+def dump(proxies: List[Dict], source: str = "") -> bytes:
+    # Columnar: one column per (nested) key over all records, and per
+    # record the id of its shape, the ordered list of keys it has
+    n = len(proxies)
+    paths: Dict[Path, int] = {}
+    cells: List[List[Any]] = []
+    shapes: Dict[Tuple[int, ...], int] = {}
+    shape_of = array("I", bytes(4 * n))
+
+    def column(path: Path) -> int:
+        c = paths.get(path)
+        if c is None:
+            c = paths[path] = len(cells)
+            cells.append([None] * n)
+        return c
+
+    # Records with the same keys are split into columns together. A group
+    # whose nested dicts disagree is split again by nesting, and records
+    # nested deeper than one level go one by one.
+    pending = [(idx, False) for idx in _group(proxies, range(n), tuple).values()]
+    while pending:
+        idx, regrouped = pending.pop(0)
+        layout = _layout([proxies[i] for i in idx])
+        if layout is None and not regrouped:
+            nested = [k for k in proxies[idx[0]] if any(type(proxies[i][k]) is dict for i in idx)]
+            nesting = lambda p: tuple(tuple(p[k]) if type(p[k]) is dict else None for k in nested)
+            pending.extend((sub, True) for sub in _group(proxies, idx, nesting).values())
+            continue
+        if layout is None:
+            for i in idx:
+                ids = []
+                for path, v in _flatten(proxies[i]):
+                    c = column(path)
+                    cells[c][i] = v
+                    ids.append(c)
+                shape_of[i] = shapes.setdefault(tuple(ids), len(shapes))
+            continue
+        ids = []
+        for path, values in layout:
+            c = column(path)
+            if len(idx) == n:
+                cells[c] = values
+            else:
+                col = cells[c]
+                for i, v in zip(idx, values):
+                    col[i] = v
+            ids.append(c)
+        shape = shapes.setdefault(tuple(ids), len(shapes))
+        for i in idx:
+            shape_of[i] = shape
+
+    w = _Writer()
+    fields = []
+    for path, c in paths.items():
+        values = cells[c]
+        kind   = _kind(values)
+        field: Dict[str, Any] = {"path": list(path), "kind": kind, "nulls": None}
+        if None in values:
+            field["nulls"] = w.put(bytes([v is None for v in values]))
+        if kind == INT:
+            field["data"] = w.put_array(array("q", [v or 0 for v in values] if field["nulls"] else values))
+        elif kind == BOOL:
+            field["data"] = w.put(bytes([bool(v) for v in values] if field["nulls"] else values))
+        elif kind == DICT:
+            table = list(dict.fromkeys(values))
+            codes = {s: k for k, s in enumerate(table)}
+            field["data"]  = w.put_array(array("I", map(codes.__getitem__, values)))
+            field["table"] = dict(w.put_strings(["" if s is None else s for s in table]), count=len(table))
+        elif kind == STR:
+            field.update(w.put_strings(["" if v is None else v for v in values] if field["nulls"] else values))
+        else:
+            field.update(w.put_strings(["" if v is None else json.dumps(v, ensure_ascii=False) for v in values]))
+        fields.append(field)
+
+    meta = {
+        "source":   source,
+        "fields":   fields,
+        "shapes":   [list(ids) for ids in shapes],
+        "shape_of": w.put_array(shape_of),
+    }
+    blob = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+    offset = w.put(blob)
+    HEADER.pack_into(w.out, 0, MAGIC, VERSION, 0, n, offset, len(blob))
+    return bytes(w.out)
+
+
+def save(flavour: str, source: str, proxies: List[Dict]) -> None:
+    atomic_write(bin_path(flavour), dump(proxies, source))
+
+
+class IRFile:
+    # Reader over any buffer holding a binary IR, usually a mapped file.
+    # Opening reads only the header and the column index; ir[i] decodes
+    # one record, proxies() decodes every column once and builds them all.
+
+    def __init__(self, buf: Any, name: str = "<buffer>"):
+        self.buf  = buf
+        self.view = memoryview(buf)
+        self._views: List[memoryview] = [self.view]
+        self._arrays: Dict[Tuple[str, int], Sequence] = {}
+        magic, version, _, self.count, offset, length = HEADER.unpack_from(self.view, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{name}: not a binary IR")
+        if version != VERSION:
+            raise ValueError(f"{name}: binary IR version {version}, expected {VERSION}")
+        meta = json.loads(bytes(self.view[offset:offset + length]))
+        self.source = meta["source"]
+        self.fields = meta["fields"]
+        self.paths  = [tuple(f["path"]) for f in self.fields]
+        self.plans  = [self._plan(ids) for ids in meta["shapes"]]
+        self.shape_of = self._array("I", meta["shape_of"], self.count)
+        self._columns: Dict[int, List[Any]] = {}
+        self._tables: Dict[int, List[str]] = {}
+
+    @classmethod
+    def open(cls, path: str) -> "IRFile":
+        with open(path, "rb") as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return cls(buf, path)
+        except Exception:
+            buf.close()
+            raise
+
+    def close(self) -> None:
+        for v in self._views:
+            v.release()
+        if isinstance(self.buf, mmap.mmap):
+            self.buf.close()
+
+    def __enter__(self) -> "IRFile":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _array(self, typecode: str, offset: int, count: int) -> Sequence:
+        key = (typecode, offset)
+        if key not in self._arrays:
+            self._arrays[key] = self._cast(typecode, offset, count)
+        return self._arrays[key]
+
+    def _cast(self, typecode: str, offset: int, count: int) -> Sequence:
+        size = array(typecode).itemsize
+        raw  = self.view[offset:offset + size * count]
+        if not LITTLE:
+            arr = array(typecode, raw)
+            arr.byteswap()
+            return arr
+        view = raw.cast(typecode)
+        self._views.extend((raw, view))
+        return view
+
+    def _plan(self, ids: List[int]) -> List[Tuple[str, Any]]:
+        # Ordered (key, column id) pairs, with (key, sub-plan) for nested keys
+        plan: List[Tuple[str, Any]] = []
+        for c in ids:
+            level = plan
+            for k in self.paths[c][:-1]:
+                if not (level and level[-1][0] == k and isinstance(level[-1][1], list)):
+                    level.append((k, []))
+                level = level[-1][1]
+            level.append((self.paths[c][-1], c))
+        return plan
+
+    def _strings(self, spec: Dict[str, int], count: int) -> List[str]:
+        if not count:
+            return []
+        blob = self.view[spec["blob"]:spec["blob"] + spec["size"]]
+        return bytes(blob).decode("utf-8").split("\0")
+
+    def _string(self, spec: Dict[str, int], count: int, i: int) -> str:
+        offsets = self._array("I", spec["offsets"], count + 1)
+        start   = spec["blob"] + offsets[i]
+        return bytes(self.view[start:spec["blob"] + offsets[i + 1] - 1]).decode("utf-8")
+
+    def _table(self, c: int) -> List[str]:
+        if c not in self._tables:
+            spec = self.fields[c]["table"]
+            self._tables[c] = self._strings(spec, spec["count"])
+        return self._tables[c]
+
+    def _null(self, c: int, i: int) -> bool:
+        nulls = self.fields[c]["nulls"]
+        return nulls is not None and self.view[nulls + i] == 1
+
+    def value(self, c: int, i: int) -> Any:
+        field = self.fields[c]
+        if self._null(c, i):
+            return None
+        kind = field["kind"]
+        if kind == INT:
+            return self._array("q", field["data"], self.count)[i]
+        if kind == BOOL:
+            return self.view[field["data"] + i] == 1
+        if kind == DICT:
+            return self._table(c)[self._array("I", field["data"], self.count)[i]]
+        text = self._string(field, self.count, i)
+        return text if kind == STR else json.loads(text)
+
+    def column(self, c: int) -> List[Any]:
+        # Every record's value of column c, None where absent
+        if c in self._columns:
+            return self._columns[c]
+        field, n = self.fields[c], self.count
+        kind = field["kind"]
+        if kind == INT:
+            values: List[Any] = self._array("q", field["data"], n).tolist()
+        elif kind == BOOL:
+            values = list(map(bool, bytes(self.view[field["data"]:field["data"] + n])))
+        elif kind == DICT:
+            values = list(map(self._table(c).__getitem__, self._array("I", field["data"], n).tolist()))
+        elif kind == STR:
+            values = self._strings(field, n)
+        else:
+            values = [json.loads(v) if v else None for v in self._strings(field, n)]
+        if field["nulls"] is not None:
+            nulls  = bytes(self.view[field["nulls"]:field["nulls"] + n])
+            values = [None if z else v for v, z in zip(values, nulls)]
+        self._columns[c] = values
+        return values
+
+    def _build(self, plan: List[Tuple[str, Any]], i: int) -> Dict:
+        return {k: self.value(v, i) if isinstance(v, int) else self._build(v, i) for k, v in plan}
+
+    def _rows(self, plan: List[Tuple[str, Any]], idx: Optional[List[int]]) -> List[Dict]:
+        # idx None means every record
+        if not plan:
+            # No columns to zip: records without any key
+            return [{} for _ in range(self.count if idx is None else len(idx))]
+        keys = [k for k, _ in plan]
+        cols = []
+        for _, v in plan:
+            if not isinstance(v, int):
+                cols.append(self._rows(v, idx))
+            elif idx is None:
+                cols.append(self.column(v))
+            else:
+                full = self.column(v)
+                cols.append([full[idx[0]]] if len(idx) == 1 else itemgetter(*idx)(full))
+        return [dict(zip(keys, row)) for row in zip(*cols)]
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, i: int) -> Dict:
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError("record index out of range")
+        return self._build(self.plans[self.shape_of[i]], i)
+
+    def __iter__(self) -> Iterator[Dict]:
+        return iter(self.proxies())
+
+    def field(self, path: str) -> List[Any]:
+        # One field for every record without building them, e.g.
+        # "port" or "reality-opts.short-id"
+        key = tuple(path.split("."))
+        if key not in self.paths:
+            raise KeyError(f"no field {path!r} in this IR")
+        return self.column(self.paths.index(key))
+
+    def proxies(self) -> List[Dict]:
+        # The collector only slows down building this many dicts at once
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return self._proxies()
+        finally:
+            if enabled:
+                gc.enable()
+
+    def _proxies(self) -> List[Dict]:
+        if len(self.plans) == 1:
+            return self._rows(self.plans[0], None) if self.count else []
+        groups: Dict[int, List[int]] = {}
+        for i, s in enumerate(self.shape_of):
+            groups.setdefault(s, []).append(i)
+        out: List[Any] = [None] * self.count
+        for s, idx in groups.items():
+            for i, row in zip(idx, self._rows(self.plans[s], idx)):
+                out[i] = row
+        return out
+
+
+def load(path: str) -> List[Dict]:
+    with IRFile.open(path) as ir:
+        return ir.proxies()
+
+
+def load_ir(flavour: str) -> Optional[List[Dict]]:
+    # The flavour's last proxies from whichever IR is current
+    path = current_path(flavour)
+    if path != bin_path(flavour):
+        return None
+    try:
+        return load(path)
+    except (OSError, ValueError, struct.error):
+        return None
@@ -0,0 +1,46 @@
+import mmap
+from typing import Iterator, List
+
+PREFIX = b"vless://"
+
+
+def iter_vless(buf) -> Iterator[bytes]:
+    # Every line of buf that starts with vless:// (after blanks), as bytes.
+    # Lines are found with find, so the other lines of a dump are never
+    # split or decoded.
+    find = buf.find
+    size = len(buf)
+    pos  = 0
+    while True:
+        i = find(PREFIX, pos)
+        if i < 0:
+            return
+        end = find(b"\n", i)
+        if end < 0:
+            end = size
+        # Mostly at the start of a line; otherwise only blanks may precede it
+        if i == 0 or buf[i - 1] == 0x0A or not buf[buf.rfind(b"\n", 0, i) + 1:i].strip():
+            yield buf[i:end]
+        pos = end
+
+
+def iter_vless_lines(path: str) -> Iterator[str]:
+    # Decodes only the vless lines, one at a time as the caller takes them,
+    # so the file stays mapped until the iteration ends and the lines of a
+    # dump never have to be held at once. A stray bad byte costs that line
+    # a replacement character instead of failing the whole file.
+    with open(path, "rb") as f:
+        try:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped
+            return
+        try:
+            for line in iter_vless(buf):
+                yield line.decode("utf-8", "replace")
+        finally:
+            buf.close()
+
+
+def read_vless_lines(path: str) -> List[str]:
+    return list(iter_vless_lines(path))
@@ -0,0 +1,59 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, List, Tuple
+
+from stashgen.output import file_digest
+from stashgen.render import RENDER_VERSION
+from stashgen.rules import COMPILER_VERSION
+from stashgen.snapshot import CACHE_DIR, atomic_write
+
+STATE_FILE = os.path.join(CACHE_DIR, "emit_state.json")
+
+_lock = threading.Lock()
+
+
+def ir_hash(proxies: List[Dict]) -> str:
+    blob = json.dumps(proxies, ensure_ascii=False, separators=(",", ":"), default=repr)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def emitter_fingerprint(flavour, styles: Tuple[str, ...] = ()) -> str:
+    # The declared EMITTER_VERSION forces a rebuild on demand; the module
+    # source catches edits that forgot to bump it.
+    h = hashlib.sha256()
+    h.update(f"{getattr(flavour, 'EMITTER_VERSION', '0')}\0{RENDER_VERSION}\0{COMPILER_VERSION}\0".encode("utf-8"))
+    if styles:
+        h.update(f"{','.join(sorted(styles))}\0".encode("utf-8"))
+    with open(flavour.__file__, "rb") as f:
+        h.update(f.read())
+    return h.hexdigest()
+
+
+def _load() -> Dict:
+    try:
+        with open(STATE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def is_current(name: str, ir: str, emitter: str, output_file: str) -> bool:
+    with _lock:
+        entry = _load().get(name)
+    if not entry or entry.get("ir") != ir or entry.get("emitter") != emitter:
+        return False
+    # The last write must still be what is on disk
+    return entry.get("output") == file_digest(output_file)
+
+
+def record(name: str, ir: str, emitter: str, output_file: str) -> None:
+    with _lock:
+        state = _load()
+        state[name] = {
+            "ir":      ir,
+            "emitter": emitter,
+            "output":  file_digest(output_file),
+        }
+        atomic_write(STATE_FILE, json.dumps(state, indent=2).encode("utf-8"))
@@ -0,0 +1,146 @@
+import contextlib
+import fnmatch
+import json
+import os
+import tracemalloc
+from typing import Dict, Iterator, List, Tuple
+
+from stashgen.snapshot import CACHE_DIR, atomic_write
+
+REPORT_FILE = os.path.join(CACHE_DIR, "memory.json")
+TOP_N       = 10
+MB          = 1024 * 1024
+
+# Allocations made by the tracer itself or by imports are not the stage's
+IGNORED = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def parse_budget(text: str) -> Tuple[str, float]:
+    # "dump:*=64" -> ("dump:*", 64 MB); a bare number applies to every stage
+    pattern, sep, size = text.rpartition("=")
+    if not sep:
+        pattern = "*"
+    try:
+        mb = float(size)
+    except ValueError:
+        raise ValueError(f"bad memory budget {text!r}, expected [STAGE=]MB") from None
+    return pattern or "*", mb * MB
+
+
+def _site(frame: tracemalloc.Frame) -> str:
+    filename = frame.filename
+    try:
+        filename = os.path.relpath(filename) if os.path.isabs(filename) else filename
+    except ValueError:
+        pass
+    return f"{filename}:{frame.lineno}"
+
+
+def top_sites(before: tracemalloc.Snapshot, after: tracemalloc.Snapshot, limit: int = TOP_N) -> List[Dict]:
+    diff = after.filter_traces(IGNORED).compare_to(before.filter_traces(IGNORED), "lineno")
+    out = []
+    for stat in diff[:limit]:
+        out.append({
+            "site":       _site(stat.traceback[0]),
+            "size_diff":  stat.size_diff,
+            "count_diff": stat.count_diff,
+        })
+    return out
+
+
+class MemoryTracer:
+    # Peak and retained heap per stage from tracemalloc. The traced memory
+    # is process-wide, so stages must run one at a time; a stage entered
+    # inside another is measured on its own and counts towards the outer
+    # stage's peak as well. A stage that runs several times keeps its
+    # highest peak and adds up what it retains.
+
+    def __init__(self, budgets: List[Tuple[str, float]] = (), top: int = TOP_N):
+        self.budgets = list(budgets)
+        self.top     = top
+        self.stages: Dict[str, Dict] = {}
+        self._stack: List[Dict] = []
+
+    def start(self) -> None:
+        tracemalloc.start()
+
+    def stop(self) -> None:
+        tracemalloc.stop()
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        if self._stack:
+            # The outer stage's peak so far, before the counter is reset
+            self._stack[-1]["peak"] = max(self._stack[-1]["peak"], tracemalloc.get_traced_memory()[1])
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        base  = tracemalloc.get_traced_memory()[0]
+        frame = {"peak": 0}
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            current, peak = tracemalloc.get_traced_memory()
+            peak = max(peak, frame["peak"])
+            if self._stack:
+                self._stack[-1]["peak"] = max(self._stack[-1]["peak"], peak)
+            after = tracemalloc.take_snapshot()
+            self._record(name, peak - base, current - base, top_sites(before, after, self.top))
+            del before, after
+
+    def _record(self, name: str, peak: int, retained: int, sites: List[Dict]) -> None:
+        entry = self.stages.get(name)
+        if entry is None:
+            self.stages[name] = {"peak_bytes": peak, "retained_bytes": retained, "calls": 1, "top": sites}
+            return
+        entry["calls"] += 1
+        entry["retained_bytes"] += retained
+        if peak > entry["peak_bytes"]:
+            entry["peak_bytes"], entry["top"] = peak, sites
+
+    def budget_for(self, name: str) -> float:
+        # The last matching budget wins, so specific patterns go after "*"
+        limit = float("inf")
+        for pattern, size in self.budgets:
+            if fnmatch.fnmatchcase(name, pattern):
+                limit = size
+        return limit
+
+    def over_budget(self) -> List[Tuple[str, int, float]]:
+        return [
+            (name, e["peak_bytes"], self.budget_for(name))
+            for name, e in self.stages.items()
+            if e["peak_bytes"] > self.budget_for(name)
+        ]
+
+    def report(self) -> Dict:
+        return {
+            "budgets": {pattern: size for pattern, size in self.budgets},
+            "stages":  self.stages,
+            "over_budget": [
+                {"stage": name, "peak_bytes": peak, "budget_bytes": limit}
+                for name, peak, limit in self.over_budget()
+            ],
+        }
+
+    def write(self, path: str = REPORT_FILE) -> None:
+        atomic_write(path, json.dumps(self.report(), indent=2, ensure_ascii=False).encode("utf-8"))
+
+    def summary(self) -> str:
+        width = max((len(n) for n in self.stages), default=5)
+        lines = ["Stage memory (peak / retained):"]
+        for name, e in self.stages.items():
+            lines.append(
+                f"  {name:<{width}}  {e['peak_bytes'] / MB:8.2f} MB  {e['retained_bytes'] / MB:8.2f} MB"
+            )
+            for site in e["top"][:3]:
+                lines.append(f"  {'':<{width}}    {site['size_diff'] / 1024:+10.1f} KB  {site['site']}")
+        for name, peak, limit in self.over_budget():
+            lines.append(f"Memory budget exceeded: {name} peaked at {peak / MB:.2f} MB (budget {limit / MB:.2f} MB)")
+        return "\n".join(lines)
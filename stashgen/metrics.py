@@ -0,0 +1,61 @@
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from stashgen.snapshot import CACHE_DIR, atomic_write
+
+METRICS_FILE = os.environ.get("STASH_METRICS_FILE", os.path.join(CACHE_DIR, "metrics", "stash.prom"))
+PREFIX       = "stash_"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _number(value: float) -> str:
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+class Metrics:
+    # Samples for one run in the Prometheus text format, for node_exporter's
+    # textfile collector. Every metric is a gauge describing the last run;
+    # setting a sample again replaces it.
+
+    def __init__(self, prefix: str = PREFIX):
+        self.prefix = prefix
+        self.help: Dict[str, str] = {}
+        self.samples: Dict[str, Dict[Tuple[Tuple[str, str], ...], float]] = {}
+
+    def set(self, name: str, value: float, help: str, **labels: str) -> None:
+        name = self.prefix + name
+        self.help.setdefault(name, help)
+        self.samples.setdefault(name, {})[tuple(labels.items())] = value
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for name, samples in self.samples.items():
+            lines.append(f"# HELP {name} {self.help[name]}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in samples.items():
+                lines.append(f"{name}{_labels(dict(labels))} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str = METRICS_FILE) -> None:
+        # The collector may read at any moment, so the file is replaced whole
+        atomic_write(path, self.render().encode("utf-8"))
+
+
+def record_run(m: Metrics, ok: bool, wall: float, now: Optional[float] = None) -> None:
+    m.set("run_success", ok, "1 if the last run generated every flavour.")
+    m.set("run_duration_seconds", wall, "Wall time of the last run.")
+    m.set("run_timestamp_seconds", time.time() if now is None else now, "When the last run finished.")
@@ -0,0 +1,62 @@
+import base64
+import hashlib
+import re
+from collections import Counter
+from typing import Dict, List
+
+ID_LENGTH    = 5
+UNKNOWN_FLAG = "🌐"
+
+# A flag emoji is a pair of regional indicator symbols
+FLAG_RE = re.compile("[\U0001F1E6-\U0001F1FF]{2}")
+
+
+def flag_of(remark: str) -> str:
+    m = FLAG_RE.search(remark or "")
+    return m.group(0) if m else UNKNOWN_FLAG
+
+
+def short_id(p: Dict, length: int = 32) -> str:
+    # Derived from the endpoint, not the remark, so a server keeps its name
+    # when upstream rewrites the ad text around it.
+    key    = f"{str(p['server']).lower()}:{p['port']}:{str(p['uuid']).lower()}"
+    digest = hashlib.sha1(key.encode("utf-8")).digest()
+    return base64.b32encode(digest).decode("ascii").lower()[:length]
+
+
+def shorten(raw: List[Dict]) -> Dict[int, str]:
+    # Renames raw in place to "<flag> <id>" and returns the original remark
+    # of each proxy by id(). Colliding ids of different endpoints are
+    # lengthened; repeats of one endpoint keep one name for dedup to drop.
+    originals: Dict[int, str] = {}
+    taken: Dict[str, str] = {}
+    for p in raw:
+        flag   = flag_of(p["name"])
+        full   = short_id(p, 32)
+        length = ID_LENGTH
+        name   = f"{flag} {full[:length]}"
+        while taken.get(name, full) != full and length < len(full):
+            length += 1
+            name = f"{flag} {full[:length]}"
+        taken[name] = full
+        originals[id(p)] = p["name"]
+        p["name"] = name
+    return originals
+
+
+def references(config: Dict) -> Counter:
+    # How often each name is written: once in proxies, once per group
+    counts: Counter = Counter(p["name"] for p in config.get("proxies") or [])
+    for group in config.get("proxy-groups") or []:
+        counts.update(group.get("proxies") or [])
+    return counts
+
+
+def bytes_saved(config: Dict, proxies: List[Dict], originals: Dict[int, str]) -> int:
+    counts = references(config)
+    saved = 0
+    for p in proxies:
+        old = originals.get(id(p))
+        if old is not None:
+            saved += counts[p["name"]] * (len(old.encode("utf-8")) - len(p["name"].encode("utf-8")))
+    return saved
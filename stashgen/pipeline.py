@@ -0,0 +1,694 @@
+import contextlib
+import functools
+import hashlib
+import importlib
+import os
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from stashgen import archive, churn, console, dag, irbin, local, memo, metrics, names, profiling, providers, rules, snapshot, sources
+from stashgen.fetch import TIMEOUT, VALIDATORS, configure_pool, iter_fetch
+from stashgen.output import write_if_changed
+from stashgen.rejects import RejectLog
+from stashgen.render import render_config
+
+
+def flavour_name(flavour) -> str:
+    return os.path.splitext(os.path.basename(flavour.OUTPUT_FILE))[0]
+
+
+def stage(instrument: Optional[Callable], flavour, name: str):
+    return instrument(f"{name}:{flavour_name(flavour)}") if instrument else contextlib.nullcontext()
+
+
+def render(flavour, config: Dict, styles: Tuple[str, ...] = ()) -> str:
+    return render_config(flavour.dump_config, config, styles=styles)
+
+
+def build(flavour, proxies: List[Dict]) -> Dict:
+    config, stats = rules.compile_config(flavour.build_config(proxies))
+    if stats:
+        print(f"  {flavour_name(flavour)}: {rules.describe(stats)}")
+    return config
+
+
+def subscription(flavour, proxies: List[Dict], styles: Tuple[str, ...] = ()) -> str:
+    # A profile of the flavour over any subset of its proxies; quiet, since
+    # the subscription server calls it from many threads
+    config, _ = rules.compile_config(flavour.build_config(proxies))
+    return render(flavour, config, styles)
+
+
+def write_output(flavour, text: str, count: int) -> bool:
+    try:
+        changed = write_if_changed(flavour.OUTPUT_FILE, text.encode("utf-8"))
+    except Exception as e:
+        print(f"Error saving file: {e}")
+        return False
+    size_kb = os.path.getsize(flavour.OUTPUT_FILE) / 1024
+    print(f"\nConfig {'saved' if changed else 'unchanged'}: {flavour.OUTPUT_FILE}")
+    print(f"Size: {size_kb:.1f} KB  |  Proxies: {count}")
+    return True
+
+
+def memo_key(
+    flavour,
+    proxies: List[Dict],
+    force: bool = False,
+    styles: Tuple[str, ...] = (),
+) -> Tuple[str, str, bool]:
+    ir      = memo.ir_hash(proxies)
+    emitter = memo.emitter_fingerprint(flavour, styles)
+    current = not force and memo.is_current(flavour_name(flavour), ir, emitter, flavour.OUTPUT_FILE)
+    return ir, emitter, current
+
+
+def report_memo(flavour, ir: str, emitter: str, current: bool) -> None:
+    state = "unchanged, skipped" if current else "rebuilt"
+    print(f"  {flavour_name(flavour)}: {state} (ir {ir[:12]}, emitter {emitter[:12]})")
+
+
+def emit(
+    flavour,
+    proxies: List[Dict],
+    force: bool = False,
+    styles: Tuple[str, ...] = (),
+    instrument: Optional[Callable] = None,
+) -> bool:
+    with stage(instrument, flavour, "memo"):
+        ir, emitter, current = memo_key(flavour, proxies, force, styles)
+    report_memo(flavour, ir, emitter, current)
+    if current:
+        return True
+    with stage(instrument, flavour, "build"):
+        config = build(flavour, proxies)
+    with stage(instrument, flavour, "dump"):
+        text = render(flavour, config, styles)
+    del config
+    with stage(instrument, flavour, "write"):
+        if not write_output(flavour, text, len(proxies)):
+            return False
+    memo.record(flavour_name(flavour), ir, emitter, flavour.OUTPUT_FILE)
+    return True
+
+
+class SourceSet:
+    # Raw text and parsed proxies per source URL for one flavour.
+
+    def __init__(self, flavour, srcs: List[Dict], short_names: bool = False):
+        self.flavour     = flavour
+        self.srcs        = srcs
+        self.short_names = short_names
+        self.texts: Dict[str, str]         = {}
+        self.parsed: Dict[str, List[Dict]] = {}
+        self.links: Dict[str, int]         = {}
+        self.rejects: Dict[str, RejectLog] = {}
+
+    def add(self, url: str, text: str) -> None:
+        self.texts[url] = text
+        self.add_lines(url, text.splitlines())
+
+    def add_lines(self, url: str, lines: Iterable[str]) -> None:
+        # lines may be a one-shot iterator: links are counted as the parser
+        # takes them
+        self.links[url]   = 0
+        self.rejects[url] = RejectLog()
+
+        def counted() -> Iterator[str]:
+            for line in lines:
+                if line.lstrip().startswith("vless://"):
+                    self.links[url] += 1
+                yield line
+        self.parsed[url] = self.flavour.parse_proxies(counted(), self.rejects[url])
+
+    def reject_log(self) -> RejectLog:
+        urls = [s["url"] for s in sources.by_priority(self.srcs)]
+        return RejectLog.combine(self.rejects[u] for u in urls if u in self.rejects)
+
+    def counts(self) -> Dict:
+        valid = sum(len(p) for p in self.parsed.values())
+        links = sum(self.links.values())
+        return {
+            "bytes":   sum(len(t.encode("utf-8")) for t in self.texts.values()),
+            "links":   links,
+            "valid":   valid,
+            "skipped": max(0, links - valid),
+            "rejects": dict(self.reject_log().counts),
+        }
+
+    def save_rejects(self) -> None:
+        log = self.reject_log()
+        if log.total():
+            print(f"  {flavour_name(self.flavour)}: rejected {log.total()} ({log.describe()})")
+        log.write(flavour_name(self.flavour))
+
+    def digest(self) -> str:
+        h = hashlib.sha256()
+        if self.short_names:
+            h.update(b"short-names\0")
+        for src in self.srcs:
+            h.update(src["url"].encode("utf-8"))
+            h.update(snapshot.digest_text(self.texts.get(src["url"], "")).encode("ascii"))
+        return h.hexdigest()
+
+    def merge(self) -> List[Dict]:
+        # Highest priority first, and an endpoint a higher-priority list
+        # already has is dropped from the lower ones.
+        # The flavours rename in place, so they get copies: the parsed
+        # dicts are kept for the next merge (the watcher re-merges them).
+        # Only top-level keys are ever rewritten, so shallow copies do.
+        raw: List[Dict] = []
+        taken: Set[Tuple[str, str, str]] = set()
+        for src in sources.by_priority(self.srcs):
+            parsed = sources.drop_taken(self.parsed.get(src["url"], []), taken)
+            raw.extend(dict(p) for p in parsed)
+        if not self.short_names:
+            return self.flavour.prepare_proxies(raw)
+        # Renamed before the flavour's own dedup and name fixing
+        originals = names.shorten(raw)
+        proxies   = self.flavour.prepare_proxies(raw)
+        saved     = names.bytes_saved(self.flavour.build_config(proxies), proxies, originals)
+        print(f"  {flavour_name(self.flavour)}: short names save {saved / 1024:.1f} KB of name text")
+        return proxies
+
+
+def fetch_into(
+    sset: SourceSet,
+    srcs: List[Dict],
+    timeout: float,
+    instrument: Optional[Callable] = None,
+) -> List[Dict]:
+    by_url  = {s["url"]: s for s in srcs}
+    mirrors = sources.mirror_map(srcs)
+    failed: List[Dict] = []
+    # Each list is parsed as soon as it lands while the others download
+    for url, text, error in iter_fetch(list(by_url), timeout, mirrors):
+        if error is not None:
+            print(f"Download failed: {url}: {error}")
+            failed.append(by_url[url])
+        else:
+            with stage(instrument, sset.flavour, "parse"):
+                sset.add(url, text)
+    return failed
+
+
+def save_source(url: str, text: str) -> None:
+    # The outgoing snapshot is handed over so the archive need not rebuild it
+    cached = snapshot.load_source(url)
+    archive.record(url, text, cached[0] if cached else None)
+    snapshot.save_source(url, text)
+
+
+def generate(
+    sset: SourceSet,
+    force: bool = False,
+    styles: Tuple[str, ...] = (),
+    instrument: Optional[Callable] = None,
+    save_sources: bool = True,
+) -> bool:
+    # save_sources False leaves the source snapshots to a caller that
+    # generates several flavours from the same lists
+    flavour = sset.flavour
+    with stage(instrument, flavour, "prepare"):
+        proxies = sset.merge()
+    sset.save_rejects()
+    if not proxies:
+        print("No valid servers found.")
+        return False
+    with stage(instrument, flavour, "snapshot"):
+        if save_sources:
+            for url, text in sset.texts.items():
+                save_source(url, text)
+        snapshot.save_ir(flavour_name(flavour), sset.digest(), proxies)
+        irbin.save(flavour_name(flavour), sset.digest(), proxies)
+    return emit(flavour, proxies, force, styles, instrument)
+
+
+def run_from_snapshot(
+    sset: SourceSet,
+    failed: List[Dict],
+    timeout: float,
+    force: bool = False,
+    styles: Tuple[str, ...] = (),
+    instrument: Optional[Callable] = None,
+) -> bool:
+    flavour = sset.flavour
+    stale: Dict[str, str] = {}
+    for src in failed:
+        cached = snapshot.load_source(src["url"])
+        if cached is None:
+            print(f"No snapshot to fall back on for {src['url']}")
+            continue
+        text, _, age = cached
+        print(f"  Using snapshot of {src['url']} ({age / 3600:.1f} h old)")
+        stale[src["url"]] = text
+    if not stale and not sset.texts:
+        return False
+
+    # Start retrying before emitting so the stale output goes out right away
+    def refetch(remaining: float) -> Dict[str, str]:
+        retry = SourceSet(flavour, failed)
+        if fetch_into(retry, failed, min(timeout, remaining)):
+            raise ConnectionError("some sources are still unreachable")
+        return retry.texts
+
+    revalidator = snapshot.Revalidator(refetch)
+    print("  Emitting from snapshot while retrying")
+
+    proxies: Optional[List[Dict]] = None
+    if not sset.texts:
+        sset.texts.update(stale)
+        proxies = snapshot.load_ir(flavour_name(flavour), sset.digest())
+    if proxies is None:
+        for url, text in stale.items():
+            sset.add(url, text)
+        proxies = sset.merge()
+    emitted = bool(proxies) and emit(flavour, proxies, force, styles, instrument)
+
+    fresh = revalidator.wait()
+    if fresh is None:
+        print("  Sources still unreachable; keeping snapshot output")
+        return emitted
+    print("  Fresh sources fetched; regenerating")
+    for url, text in fresh.items():
+        sset.add(url, text)
+    return generate(sset, force, styles, instrument)
+
+
+def run(
+    flavour,
+    force: bool = False,
+    styles: Tuple[str, ...] = (),
+    short_names: bool = False,
+    instrument: Optional[Callable] = None,
+) -> bool:
+    # instrument, if given, is entered around each stage in turn
+    timeout = getattr(flavour, "FETCH_TIMEOUT", TIMEOUT)
+    srcs, max_per_host = sources.load_sources(flavour.SOURCE_URL)
+    configure_pool(max_per_host)
+
+    sset = SourceSet(flavour, srcs, short_names)
+    with stage(instrument, flavour, "fetch"):
+        failed = fetch_into(sset, srcs, timeout, instrument)
+    if not failed:
+        return generate(sset, force, styles, instrument)
+    return run_from_snapshot(sset, failed, timeout, force, styles, instrument)
+
+
+def run_input(
+    flavours: List,
+    path: str,
+    force: bool = False,
+    styles: Tuple[str, ...] = (),
+    short_names: bool = False,
+) -> bool:
+    # A local dump instead of the sources, never saved as a snapshot of the
+    # live lists. Each flavour streams the lines straight from the mapped
+    # file rather than sharing a decoded copy of the whole dump.
+    ok = True
+    for fl in flavours:
+        sset = SourceSet(fl, [{"url": path, "priority": 0, "mirrors": None}], short_names)
+        sset.add_lines(path, local.iter_vless_lines(path))
+        print(f"  {flavour_name(fl)}: read {sset.links[path]} vless lines from {path}")
+        proxies = sset.merge()
+        sset.save_rejects()
+        if not proxies:
+            print(f"  {flavour_name(fl)}: no valid servers found")
+            ok = False
+            continue
+        ok = emit(fl, proxies, force, styles) and ok
+    return ok
+
+
+def run_archived(
+    flavours: List,
+    when: float,
+    force: bool = False,
+    styles: Tuple[str, ...] = (),
+    short_names: bool = False,
+) -> bool:
+    # Each source as it was archived at when, through the normal parse and
+    # emit stages; like --input, nothing is saved as a live snapshot
+    srcs, _ = sources.load_sources(flavours[0].SOURCE_URL)
+    texts: Dict[str, str] = {}
+    for src in srcs:
+        found = archive.reconstruct(src["url"], when)
+        if found is None:
+            print(f"Nothing archived for {src['url']} at that time")
+            continue
+        entry, text = found
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(entry["time"]))
+        print(f"Replaying {src['url']} #{entry['seq']} from {stamp} UTC ({entry['lines']} lines)")
+        texts[src["url"]] = text
+    if not texts:
+        return False
+    ok = True
+    for fl in flavours:
+        sset = parse_stream(fl, srcs, texts.items(), short_names)
+        proxies = sset.merge()
+        sset.save_rejects()
+        if not proxies:
+            print(f"  {flavour_name(fl)}: no valid servers found")
+            ok = False
+            continue
+        ok = emit(fl, proxies, force, styles) and ok
+    return ok
+
+
+def fetch_stream(
+    srcs: List[Dict],
+    timeout: float,
+    failed: List[Dict],
+) -> Iterator[Tuple[str, str]]:
+    # Like fetch_into, but a failed source is replaced by its snapshot (and
+    # remembered in failed) so the rest of the graph never waits on it.
+    by_url  = {s["url"]: s for s in srcs}
+    mirrors = sources.mirror_map(srcs)
+    for url, text, error in iter_fetch(list(by_url), timeout, mirrors):
+        if error is None:
+            yield url, text
+            continue
+        print(f"Download failed: {url}: {error}")
+        failed.append(by_url[url])
+        cached = snapshot.load_source(url)
+        if cached is None:
+            print(f"No snapshot to fall back on for {url}")
+            continue
+        print(f"  Using snapshot of {url} ({cached[2] / 3600:.1f} h old)")
+        yield url, cached[0]
+
+
+def parse_stream(
+    flavour,
+    srcs: List[Dict],
+    items: Iterable[Tuple[str, str]],
+    short_names: bool = False,
+) -> SourceSet:
+    sset = SourceSet(flavour, srcs, short_names)
+    for url, text in items:
+        sset.add(url, text)
+    return sset
+
+
+def prepare_stage(sset: SourceSet) -> List[Dict]:
+    proxies = sset.merge()
+    sset.save_rejects()
+    if proxies:
+        snapshot.save_ir(flavour_name(sset.flavour), sset.digest(), proxies)
+        irbin.save(flavour_name(sset.flavour), sset.digest(), proxies)
+    return proxies
+
+
+def memo_stage(flavour, proxies: List[Dict], force: bool, styles: Tuple[str, ...]) -> Tuple[str, str, bool]:
+    key = memo_key(flavour, proxies, force, styles)
+    report_memo(flavour, *key)
+    return key
+
+
+def build_stage(flavour, proxies: List[Dict], key: Tuple[str, str, bool]) -> Optional[Dict]:
+    if not proxies:
+        raise ValueError("no valid servers found")
+    if key[2]:
+        return None
+    return build(flavour, proxies)
+
+
+def dump_stage(module: str, styles: Tuple[str, ...], config: Optional[Dict]) -> Optional[str]:
+    # Runs in a worker process, so it gets the flavour by module name
+    if config is None:
+        return None
+    return render(importlib.import_module(module), config, styles)
+
+
+def write_stage(flavour, text: Optional[str], proxies: List[Dict], key: Tuple[str, str, bool]) -> bool:
+    if text is None:
+        return False
+    if not write_output(flavour, text, len(proxies)):
+        raise OSError(f"could not write {flavour.OUTPUT_FILE}")
+    memo.record(flavour_name(flavour), key[0], key[1], flavour.OUTPUT_FILE)
+    return True
+
+
+def save_sources_stage(failed: List[Dict], sset: SourceSet, *prepared: List[Dict]) -> int:
+    # Only lists that produced proxies for some flavour count as "last good"
+    if not any(prepared):
+        return 0
+    stale = {s["url"] for s in failed}
+    fresh = {u: t for u, t in sset.texts.items() if u not in stale}
+    for url, text in fresh.items():
+        save_source(url, text)
+    return len(fresh)
+
+
+def churn_stage(history: churn.ChurnStore, failed: List[Dict], *prepared: List[Dict]) -> Dict[str, int]:
+    # Every flavour's proxies count as one sighting per run, but only when
+    # every list was fetched fresh: proxies from a snapshot fallback were
+    # not seen now. The retry after a failure records them instead.
+    if failed:
+        print(f"  churn: not recorded, {len(failed)} sources were not fetched")
+        return {}
+    stats = history.update([p for proxies in prepared for p in proxies or []])
+    history.save()
+    print(
+        f"  churn: {stats['seen']} endpoints seen, {stats['new']} new, "
+        f"{stats['dropped']} forgotten, {len(history.keys)} tracked over {history.runs} runs"
+    )
+    return stats
+
+
+def grouped_stage(flavours: List, instrument: Optional[Callable] = None) -> Callable:
+    # Each flavour's stages print into that flavour's group, so run_graph
+    # can print one flavour after another instead of interleaved lines
+    names = {flavour_name(fl) for fl in flavours}
+
+    @contextlib.contextmanager
+    def enter(stage_name: str) -> Iterator[None]:
+        flavour = stage_name.rpartition(":")[2]
+        with console.group(flavour if flavour in names else None):
+            if instrument is None:
+                yield
+            else:
+                with instrument(stage_name):
+                    yield
+    return enter
+
+
+def build_graph(
+    flavours: List,
+    srcs: List[Dict],
+    stream: Iterator,
+    failed: List[Dict],
+    prefetch_rules: bool = True,
+    force: bool = False,
+    processes: Optional[int] = None,
+    styles: Tuple[str, ...] = (),
+    short_names: bool = False,
+    instrument: Optional[Callable] = None,
+    history: Optional[churn.ChurnStore] = None,
+    prefer_long_lived: bool = False,
+) -> dag.Graph:
+    # Dumping is pure-Python CPU work, so flavours are serialized on a
+    # process pool unless processes == 0.  Ordering by lifetime uses the
+    # history from before this run, so no flavour waits on the others.
+    graph = dag.Graph(processes=processes, instrument=grouped_stage(flavours, instrument))
+    prepare = prepare_stage
+    if history is not None and prefer_long_lived:
+        prepare = lambda sset: history.order(prepare_stage(sset))
+    graph.add("fetch", lambda: stream)
+    if prefetch_rules:
+        graph.add("rules:prefetch", lambda: providers.prefetch(providers.provider_urls(flavours)))
+    prepares: List[str] = []
+    for fl in flavours:
+        name = flavour_name(fl)
+        graph.add(f"parse:{name}", lambda items, fl=fl: parse_stream(fl, srcs, items, short_names), stream_from="fetch")
+        graph.add(f"prepare:{name}", prepare, deps=[f"parse:{name}"])
+        graph.add(f"memo:{name}", lambda p, fl=fl: memo_stage(fl, p, force, styles), deps=[f"prepare:{name}"])
+        graph.add(f"build:{name}", lambda p, k, fl=fl: build_stage(fl, p, k), deps=[f"prepare:{name}", f"memo:{name}"])
+        graph.add(
+            f"dump:{name}",
+            functools.partial(dump_stage, fl.__name__, styles),
+            deps=[f"build:{name}"],
+            process=processes != 0,
+        )
+        graph.add(
+            f"write:{name}",
+            lambda text, p, k, fl=fl: write_stage(fl, text, p, k),
+            deps=[f"dump:{name}", f"prepare:{name}", f"memo:{name}"],
+        )
+        prepares.append(f"prepare:{name}")
+    graph.add(
+        "snapshot",
+        lambda _, sset, *prepared: save_sources_stage(failed, sset, *prepared),
+        deps=["fetch", f"parse:{flavour_name(flavours[0])}", *prepares],
+    )
+    if history is not None:
+        graph.add("churn", functools.partial(churn_stage, history, failed), deps=prepares)
+    return graph
+
+
+def graph_counts(graph: dag.Graph, flavours: List) -> Dict[str, Dict]:
+    # What each flavour's stages saw: links, valid, skipped, duplicates
+    counts: Dict[str, Dict] = {}
+    for fl in flavours:
+        name    = flavour_name(fl)
+        sset    = graph.stages[f"parse:{name}"].result
+        proxies = graph.stages[f"prepare:{name}"].result
+        entry   = sset.counts() if sset is not None else {}
+        entry["proxies"] = len(proxies) if proxies is not None else 0
+        if "valid" in entry:
+            entry["duplicates"] = max(0, entry["valid"] - entry["proxies"])
+        entry["written"] = bool(graph.stages[f"write:{name}"].result)
+        counts[name] = entry
+    return counts
+
+
+def stage_labels(name: str, flavours: List) -> Dict[str, str]:
+    kind, _, flavour = name.rpartition(":")
+    if flavour in {flavour_name(fl) for fl in flavours}:
+        return {"stage": kind, "flavour": flavour}
+    return {"stage": name}
+
+
+def record_stage_times(m: metrics.Metrics, stages: Dict[str, Dict], flavours: List) -> None:
+    # From a Profiler's stages, for runs that go through run() per flavour
+    for name, entry in stages.items():
+        m.set("stage_duration_seconds", entry["wall_s"], "Wall time of each pipeline stage.",
+              **stage_labels(name, flavours))
+
+
+def record_metrics(m: metrics.Metrics, graph: dag.Graph, flavours: List, srcs: List[Dict], failed: List[Dict]) -> None:
+    for stage in graph.stages.values():
+        if not stage.start:
+            continue
+        labels = stage_labels(stage.name, flavours)
+        m.set("stage_duration_seconds", stage.duration, "Wall time of each pipeline stage.", **labels)
+        m.set("stage_success", stage.status == "ok", "1 if the stage completed.", **labels)
+
+    first = graph.stages[f"parse:{flavour_name(flavours[0])}"].result
+    texts = first.texts if first is not None else {}
+    stale = {s["url"] for s in failed}
+    for src in srcs:
+        url  = src["url"]
+        text = texts.get(url)
+        m.set("fetch_bytes", len(text.encode("utf-8")) if text is not None else 0,
+              "Bytes of source text used, fetched or from snapshot.", url=url)
+        m.set("fetch_cache_hit", (url in stale and text is not None) or VALIDATORS.not_modified(url),
+              "1 if the source was a 304 or served from the local snapshot.", url=url)
+        m.set("fetch_success", url not in stale, "1 if the source downloaded.", url=url)
+
+    for name, c in graph_counts(graph, flavours).items():
+        if "links" in c:
+            m.set("lines_parsed", c["links"], "vless:// lines seen across all sources.", flavour=name)
+            m.set("proxies_valid", c["valid"], "Lines that parsed to a valid proxy.", flavour=name)
+            for reason, count in c["rejects"].items():
+                m.set("proxies_rejected", count, "Lines rejected by the parser, by reason.", flavour=name, reason=reason)
+            m.set("proxies_duplicate", c["duplicates"], "Valid proxies dropped as duplicates.", flavour=name)
+        m.set("proxies", c["proxies"], "Proxies written to the profile.", flavour=name)
+        m.set("output_written", c["written"], "1 if the profile was rewritten this run.", flavour=name)
+    for fl in flavours:
+        if os.path.exists(fl.OUTPUT_FILE):
+            m.set("output_bytes", os.path.getsize(fl.OUTPUT_FILE), "Size of the generated profile.",
+                  flavour=flavour_name(fl), file=fl.OUTPUT_FILE)
+
+
+def run_graph(graph: dag.Graph, flavours: List) -> bool:
+    with console.grouped() as out:
+        graph.run()
+        out.release(flavour_name(fl) for fl in flavours)
+    print()
+    print(graph.report())
+    rebuilt, skipped, failed = [], [], []
+    for fl in flavours:
+        name  = flavour_name(fl)
+        write = graph.stages[f"write:{name}"]
+        if write.status != "ok":
+            failed.append(name)
+        elif write.result:
+            rebuilt.append(name)
+        else:
+            skipped.append(name)
+    print(f"Rebuilt: {', '.join(rebuilt) or '-'}")
+    print(f"Skipped (unchanged): {', '.join(skipped) or '-'}")
+    if failed:
+        print(f"Failed: {', '.join(failed)}")
+    return not failed
+
+
+def start_retry(failed: List[Dict], timeout: float) -> Optional[snapshot.Revalidator]:
+    # Runs once the fetch is done, so the retries overlap parsing and
+    # emitting from the snapshots instead of following them
+    if not failed:
+        return None
+    print("  Retrying failed sources in the background")
+
+    def refetch(remaining: float) -> Dict[str, str]:
+        texts: Dict[str, str] = {}
+        urls = [s["url"] for s in failed]
+        for url, text, error in iter_fetch(urls, min(timeout, remaining), sources.mirror_map(failed)):
+            if error is not None:
+                raise ConnectionError(f"{url}: {error}")
+            texts[url] = text
+        return texts
+
+    return snapshot.Revalidator(refetch)
+
+
+def run_all(
+    flavours: List,
+    timeout: float = TIMEOUT,
+    force: bool = False,
+    processes: Optional[int] = None,
+    styles: Tuple[str, ...] = (),
+    short_names: bool = False,
+    profiler: Optional[profiling.Profiler] = None,
+    stats: Optional[metrics.Metrics] = None,
+    prefer_long_lived: bool = False,
+) -> bool:
+    srcs, max_per_host = sources.load_sources(flavours[0].SOURCE_URL)
+    configure_pool(max_per_host)
+    history = churn.ChurnStore.load() if churn.available() else None
+
+    instrument = None
+    if profiler is not None:
+        # Process stages cannot be timed from here, so dumps stay on threads
+        instrument, processes = profiler.stage, 0
+
+    failed: List[Dict] = []
+    graph = build_graph(
+        flavours, srcs, fetch_stream(srcs, timeout, failed), failed,
+        force=force, processes=processes, styles=styles,
+        short_names=short_names, instrument=instrument,
+        history=history, prefer_long_lived=prefer_long_lived,
+    )
+    graph.add("retry", lambda _: start_retry(failed, timeout), deps=["fetch"])
+    ok = run_graph(graph, flavours)
+    if profiler is not None:
+        profiler.counts.update(graph_counts(graph, flavours))
+        profiler.wall = graph.wall
+    if stats is not None:
+        record_metrics(stats, graph, flavours, srcs, failed)
+    revalidator = graph.stages["retry"].result
+    if revalidator is None:
+        return ok
+
+    fresh = revalidator.wait()
+    if fresh is None:
+        print("  Sources still unreachable; keeping snapshot output")
+        return ok
+    print("  Fresh sources fetched; regenerating")
+    first = graph.stages[f"parse:{flavour_name(flavours[0])}"].result
+    texts = dict(first.texts) if first else {}
+    texts.update(fresh)
+    graph = build_graph(
+        flavours, srcs, iter(texts.items()), [],
+        prefetch_rules=False, force=force, processes=processes, styles=styles,
+        short_names=short_names, instrument=instrument,
+        history=history, prefer_long_lived=prefer_long_lived,
+    )
+    ok = run_graph(graph, flavours)
+    if profiler is not None:
+        profiler.counts.update(graph_counts(graph, flavours))
+        profiler.wall += graph.wall
+    if stats is not None:
+        record_metrics(stats, graph, flavours, srcs, [])
+    return ok
@@ -0,0 +1,103 @@
+import contextlib
+import cProfile
+import json
+import os
+import pstats
+import threading
+import time
+from typing import Dict, Iterator, List
+
+from stashgen.snapshot import CACHE_DIR, atomic_write
+
+REPORT_FILE = os.path.join(CACHE_DIR, "profile.json")
+TOP_N       = 15
+
+
+def _where(filename: str, line: int, func: str) -> str:
+    if filename == "~":
+        # Built-in functions have no source location
+        return func
+    try:
+        filename = os.path.relpath(filename)
+    except ValueError:
+        pass
+    return f"{filename}:{line}({func})"
+
+
+def top_functions(prof: cProfile.Profile, limit: int = TOP_N) -> List[Dict]:
+    stats = pstats.Stats(prof).stats  # type: ignore[attr-defined]
+    rows = sorted(stats.items(), key=lambda kv: kv[1][2], reverse=True)[:limit]
+    out = []
+    for (filename, line, func), (cc, nc, tt, ct, _) in rows:
+        out.append({
+            "function": _where(filename, line, func),
+            "ncalls":   nc,
+            "tottime":  round(tt, 6),
+            "cumtime":  round(ct, 6),
+        })
+    return out
+
+
+class Profiler:
+    # Per-stage wall and CPU time, optionally with a cProfile of the stage.
+    # Stages run on their own threads, so thread CPU time belongs to that
+    # stage alone. Only one cProfile may be active per process (enforced
+    # from Python 3.12 on), so with cprofile the stages must run one at a
+    # time on one thread; a nested stage pauses the outer one's profile.
+    # A stage entered more than once adds up.
+
+    def __init__(self, cprofile: bool = False, top: int = TOP_N):
+        self.cprofile = cprofile
+        self.top      = top
+        self.stages: Dict[str, Dict] = {}
+        self.counts: Dict[str, Dict] = {}
+        self.wall     = 0.0
+        self._lock    = threading.Lock()
+        self._profiles: Dict[str, cProfile.Profile] = {}
+        self._active: List[cProfile.Profile] = []
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        prof = None
+        if self.cprofile:
+            prof = self._profiles.setdefault(name, cProfile.Profile())
+            if self._active:
+                self._active[-1].disable()
+            self._active.append(prof)
+            prof.enable()
+        wall0 = time.perf_counter()
+        cpu0  = time.thread_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall0
+            cpu  = time.thread_time() - cpu0
+            if prof is not None:
+                prof.disable()
+                self._active.pop()
+                if self._active:
+                    self._active[-1].enable()
+            with self._lock:
+                entry = self.stages.setdefault(name, {"wall_s": 0.0, "cpu_s": 0.0})
+                entry["wall_s"] = round(entry["wall_s"] + wall, 6)
+                entry["cpu_s"]  = round(entry["cpu_s"] + cpu, 6)
+                if prof is not None:
+                    entry["top"] = top_functions(prof, self.top)
+
+    def report(self) -> Dict:
+        return {
+            "wall_s":   round(self.wall, 6),
+            "cprofile": self.cprofile,
+            "stages":   self.stages,
+            "counts":   self.counts,
+        }
+
+    def write(self, path: str = REPORT_FILE) -> None:
+        atomic_write(path, json.dumps(self.report(), indent=2, ensure_ascii=False).encode("utf-8"))
+
+    def summary(self) -> str:
+        width = max((len(n) for n in self.stages), default=5)
+        lines = ["Stage CPU (wall / cpu):"]
+        for name, e in sorted(self.stages.items(), key=lambda kv: kv[1]["cpu_s"], reverse=True):
+            lines.append(f"  {name:<{width}}  {e['wall_s']:8.3f} s  {e['cpu_s']:8.3f} s")
+        return "\n".join(lines)
@@ -0,0 +1,38 @@
+import hashlib
+import os
+from typing import Dict, Iterable, List
+
+from stashgen.fetch import iter_fetch
+from stashgen.snapshot import CACHE_DIR, atomic_write
+
+PROVIDER_DIR = os.path.join(CACHE_DIR, "rule-providers")
+
+
+def provider_path(url: str) -> str:
+    key = hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+    ext = os.path.splitext(url)[1] or ".txt"
+    return os.path.join(PROVIDER_DIR, key + ext)
+
+
+def provider_urls(flavours: Iterable) -> List[str]:
+    urls: List[str] = []
+    for flavour in flavours:
+        # Rule providers never depend on the proxy list
+        providers = flavour.build_config([]).get("rule-providers") or {}
+        for provider in providers.values():
+            url = provider.get("url")
+            if url and url not in urls:
+                urls.append(url)
+    return urls
+
+
+def prefetch(urls: List[str]) -> Dict[str, str]:
+    saved: Dict[str, str] = {}
+    for url, text, error in iter_fetch(urls):
+        if error is not None:
+            print(f"  Rule provider fetch failed: {url}: {error}")
+            continue
+        path = provider_path(url)
+        atomic_write(path, text.encode("utf-8"))
+        saved[url] = path
+    return saved
@@ -0,0 +1,68 @@
+import json
+import os
+import random
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+from stashgen.snapshot import CACHE_DIR, atomic_write
+
+REJECTS_DIR = os.path.join(CACHE_DIR, "rejects")
+SAMPLE_SIZE = 5
+LINE_LIMIT  = 200
+
+
+class RejectLog:
+    # Why vless lines were rejected: a count per reason and a uniform
+    # sample of up to SAMPLE_SIZE offending lines per reason (reservoir
+    # sampling, so memory stays bounded however many lines are rejected).
+
+    def __init__(self, sample_size: int = SAMPLE_SIZE, seed: int = 0):
+        self.sample_size = sample_size
+        self.counts: Counter = Counter()
+        self.samples: Dict[str, List[str]] = {}
+        self._rng = random.Random(seed)
+
+    def add(self, reason: str, line: str) -> None:
+        self.counts[reason] += 1
+        sample = self.samples.setdefault(reason, [])
+        if len(sample) < self.sample_size:
+            sample.append(line[:LINE_LIMIT])
+            return
+        j = self._rng.randrange(self.counts[reason])
+        if j < self.sample_size:
+            sample[j] = line[:LINE_LIMIT]
+
+    @classmethod
+    def combine(cls, logs: Iterable["RejectLog"], sample_size: int = SAMPLE_SIZE) -> "RejectLog":
+        out = cls(sample_size)
+        for log in logs:
+            out.counts.update(log.counts)
+            for reason, lines in log.samples.items():
+                sample = out.samples.setdefault(reason, [])
+                sample.extend(lines[:sample_size - len(sample)])
+        return out
+
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+    def to_dict(self) -> Dict:
+        return {
+            reason: {"count": count, "sample": self.samples.get(reason, [])}
+            for reason, count in self.counts.most_common()
+        }
+
+    def describe(self) -> str:
+        return ", ".join(f"{reason} {count}" for reason, count in self.counts.most_common())
+
+    def write(self, flavour: str) -> str:
+        path = os.path.join(REJECTS_DIR, f"{flavour}.json")
+        atomic_write(path, json.dumps(self.to_dict(), indent=2, ensure_ascii=False).encode("utf-8"))
+        return path
+
+
+def reject(log: Optional[RejectLog], reason: str, line: str) -> None:
+    # Parsers write "return reject(log, reason, line)" where they used to
+    # "return None"; without a log it costs one call.
+    if log is not None:
+        log.add(reason, line)
+    return None
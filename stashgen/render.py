@@ -0,0 +1,115 @@
+import hashlib
+import inspect
+import io
+import json
+import os
+import time
+from typing import Callable, Dict, Iterable, Tuple
+
+import yaml
+
+from stashgen import anchors, compact
+from stashgen.snapshot import CACHE_DIR, atomic_write
+
+RENDER_VERSION   = 1
+SECTION_DIR      = os.path.join(CACHE_DIR, "sections")
+SECTION_MAX_AGE  = 7 * 24 * 3600
+DYNAMIC_SECTIONS = ("proxies", "proxy-groups")
+STYLES           = ("anchors", "compact")
+
+_sections: Dict[str, str] = {}
+
+
+def dump_fragment(dump: Callable, fragment: Dict) -> str:
+    buf = io.StringIO()
+    dump(fragment, buf)
+    return buf.getvalue()
+
+
+def section_key(dump: Callable, key: str, value) -> str:
+    # Hashing the built value covers both the builder's inputs and its code;
+    # the dumper's source and the PyYAML version cover how it is serialized.
+    h = hashlib.sha256()
+    h.update(f"{RENDER_VERSION}\0{yaml.__version__}\0{key}\0".encode("utf-8"))
+    h.update(inspect.getsource(dump).encode("utf-8"))
+    h.update(json.dumps(value, ensure_ascii=False, default=repr).encode("utf-8"))
+    return h.hexdigest()
+
+
+def cached_section(dump: Callable, key: str, value) -> str:
+    digest = section_key(dump, key, value)
+    text = _sections.get(digest)
+    if text is not None:
+        return text
+    path = os.path.join(SECTION_DIR, f"{digest[:32]}.yaml")
+    try:
+        with open(path, "rb") as f:
+            text = f.read().decode("utf-8")
+        # mtime is the last use, which is what prune_sections goes by
+        os.utime(path)
+    except OSError:
+        text = dump_fragment(dump, {key: value})
+        atomic_write(path, text.encode("utf-8"))
+    _sections[digest] = text
+    return text
+
+
+def prune_sections(max_age: float = SECTION_MAX_AGE) -> int:
+    # Drops the sections no run has used for max_age seconds, which covers
+    # everything an older builder, dumper or PyYAML version left behind
+    cutoff  = time.time() - max_age
+    removed = 0
+    try:
+        names = os.listdir(SECTION_DIR)
+    except OSError:
+        return 0
+    for name in names:
+        path = os.path.join(SECTION_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            continue
+    return removed
+
+
+def render_config(
+    dump: Callable,
+    config: Dict,
+    dynamic: Iterable[str] = DYNAMIC_SECTIONS,
+    styles: Tuple[str, ...] = (),
+) -> str:
+    if "compact" in styles:
+        config = compact.hoist(config)
+    if "anchors" in styles:
+        # Aliases may point into any section, and PyYAML numbers anchors per
+        # dump, so the document is written in one piece.
+        whole = compact.dump if "compact" in styles else dump
+        text  = dump_fragment(whole, anchors.intern(config))
+    else:
+        text = render_sections(dump, config, dynamic, "compact" in styles)
+    return text
+
+
+def render_sections(
+    dump: Callable,
+    config: Dict,
+    dynamic: Iterable[str],
+    compact_proxies: bool = False,
+) -> str:
+    # Top-level keys are block mappings, so each section can be dumped on its
+    # own and the pieces concatenated in order.
+    parts = []
+    for key, value in config.items():
+        if key == compact.DEFAULTS_KEY:
+            # Written together with the proxies that alias it
+            continue
+        if key == "proxies" and compact_proxies:
+            fragment = {k: config[k] for k in (compact.DEFAULTS_KEY, key) if k in config}
+            parts.append(dump_fragment(compact.dump, fragment))
+        elif key in dynamic:
+            parts.append(dump_fragment(dump, {key: value}))
+        else:
+            parts.append(cached_section(dump, key, value))
+    return "".join(parts)
@@ -0,0 +1,195 @@
+import ast
+import ipaddress
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+COMPILER_VERSION = 1
+
+LOGICAL = ("AND", "OR", "NOT")
+CIDR    = ("IP-CIDR", "IP-CIDR6")
+
+# Script fields with a native matcher, and how their values are written
+SCRIPT_FIELDS = {
+    "network":  ("NETWORK",  lambda v: str(v).upper()),
+    "dst_port": ("DST-PORT", str),
+    "src_port": ("SRC-PORT", str),
+    "host":     ("DOMAIN",   str),
+}
+
+
+class Rule:
+
+    def __init__(self, kind: str, payload: Optional[str], target: str, options: List[str]):
+        self.kind    = kind
+        self.payload = payload
+        self.target  = target
+        self.options = options
+
+    @classmethod
+    def parse(cls, text: str) -> "Rule":
+        kind, _, rest = text.partition(",")
+        if kind == "MATCH":
+            parts = rest.split(",")
+            return cls(kind, None, parts[0], parts[1:])
+        if kind in LOGICAL:
+            # The payload is one parenthesized group that contains commas
+            depth = 0
+            for i, ch in enumerate(rest):
+                depth += {"(": 1, ")": -1}.get(ch, 0)
+                if depth == 0:
+                    break
+            payload, rest = rest[:i + 1], rest[i + 2:]
+            parts = rest.split(",")
+            return cls(kind, payload, parts[0], parts[1:])
+        parts = rest.split(",")
+        return cls(kind, parts[0], parts[1], parts[2:])
+
+    def __str__(self) -> str:
+        head = [self.kind] if self.payload is None else [self.kind, self.payload]
+        return ",".join(head + [self.target] + self.options)
+
+    @property
+    def no_resolve(self) -> bool:
+        return "no-resolve" in self.options
+
+
+def lower_script(expr: str) -> Optional[List[Tuple[str, str]]]:
+    # "network == 'udp' and dst_port == 443" -> [("NETWORK", "UDP"), ("DST-PORT", "443")];
+    # None for anything that is not a conjunction of supported equalities.
+    try:
+        tree = ast.parse(expr, mode="eval").body
+    except SyntaxError:
+        return None
+    terms = tree.values if isinstance(tree, ast.BoolOp) and isinstance(tree.op, ast.And) else [tree]
+    out: List[Tuple[str, str]] = []
+    for term in terms:
+        if not (
+            isinstance(term, ast.Compare)
+            and len(term.ops) == 1 and isinstance(term.ops[0], ast.Eq)
+            and isinstance(term.left, ast.Name) and term.left.id in SCRIPT_FIELDS
+            and isinstance(term.comparators[0], ast.Constant)
+        ):
+            return None
+        kind, fmt = SCRIPT_FIELDS[term.left.id]
+        out.append((kind, fmt(term.comparators[0].value)))
+    return out
+
+
+def native_rule(rule: Rule, matchers: List[Tuple[str, str]]) -> Rule:
+    if len(matchers) == 1:
+        kind, payload = matchers[0]
+        return Rule(kind, payload, rule.target, rule.options)
+    payload = "(" + ",".join(f"({k},{v})" for k, v in matchers) + ")"
+    return Rule("AND", payload, rule.target, rule.options)
+
+
+def _covers(earlier: Rule, later: Rule) -> bool:
+    # True when every connection later could match is taken by earlier first
+    if earlier.kind == "MATCH":
+        return True
+    # A no-resolve rule skips domain requests the later one would resolve
+    if earlier.no_resolve and not later.no_resolve:
+        return False
+    if earlier.kind == "DOMAIN-SUFFIX" and later.kind in ("DOMAIN", "DOMAIN-SUFFIX"):
+        a, b = earlier.payload.lower(), later.payload.lower()
+        return b == a or b.endswith("." + a)
+    if earlier.kind in CIDR and later.kind in CIDR:
+        try:
+            a = ipaddress.ip_network(earlier.payload, strict=False)
+            b = ipaddress.ip_network(later.payload, strict=False)
+        except ValueError:
+            return False
+        return a.version == b.version and b.subnet_of(a)
+    return (earlier.kind, earlier.payload) == (later.kind, later.payload)
+
+
+def drop_shadowed(rules: List[Rule], stats: Counter) -> List[Rule]:
+    kept: List[Rule] = []
+    for rule in rules:
+        if any(_covers(k, rule) for k in kept):
+            stats["shadowed"] += 1
+            continue
+        kept.append(rule)
+    return kept
+
+
+def collapse_cidrs(rules: List[Rule], stats: Counter) -> List[Rule]:
+    # Adjacent CIDR rules with the same target and options can be reordered
+    # freely, so their networks are merged into the fewest equivalent ones.
+    out: List[Rule] = []
+    i = 0
+    while i < len(rules):
+        rule = rules[i]
+        j = i + 1
+        if rule.kind in CIDR:
+            while (
+                j < len(rules) and rules[j].kind in CIDR
+                and (rules[j].target, rules[j].options) == (rule.target, rule.options)
+            ):
+                j += 1
+        run = rules[i:j]
+        if len(run) > 1:
+            try:
+                nets = [ipaddress.ip_network(r.payload, strict=False) for r in run]
+                merged = [
+                    n for version in (4, 6)
+                    for n in ipaddress.collapse_addresses(x for x in nets if x.version == version)
+                ]
+            except ValueError:
+                merged = None
+            if merged is not None and len(merged) < len(run):
+                stats["collapsed"] += len(run) - len(merged)
+                run = [
+                    Rule("IP-CIDR" if n.version == 4 else "IP-CIDR6", str(n), rule.target, rule.options)
+                    for n in merged
+                ]
+        out.extend(run)
+        i = j
+    return out
+
+
+def compile_rules(rules: List[str], shortcuts: Dict[str, str]) -> Tuple[List[str], Counter]:
+    stats: Counter = Counter()
+    parsed: List[Rule] = []
+    for text in rules:
+        rule = Rule.parse(text)
+        if rule.kind == "SCRIPT" and rule.payload in shortcuts:
+            matchers = lower_script(shortcuts[rule.payload])
+            if matchers:
+                rule = native_rule(rule, matchers)
+                stats["lowered"] += 1
+        parsed.append(rule)
+    parsed = drop_shadowed(parsed, stats)
+    parsed = collapse_cidrs(parsed, stats)
+    return [str(r) for r in parsed], stats
+
+
+def compile_config(config: Dict) -> Tuple[Dict, Counter]:
+    # Rewrites config["rules"] into the cheapest equivalent list and drops
+    # script shortcuts no rule refers to any more.
+    if not config.get("rules"):
+        return config, Counter()
+    script    = config.get("script") or {}
+    shortcuts = script.get("shortcuts") or {}
+    rules, stats = compile_rules(config["rules"], shortcuts)
+    out = dict(config, rules=rules)
+    used = {Rule.parse(r).payload for r in rules if r.startswith("SCRIPT,")}
+    if shortcuts and not used.issuperset(shortcuts):
+        kept = {k: v for k, v in shortcuts.items() if k in used}
+        rest = {k: v for k, v in script.items() if k != "shortcuts"}
+        if kept:
+            rest["shortcuts"] = kept
+        if rest:
+            out["script"] = rest
+        else:
+            del out["script"]
+    stats["before"] = len(config["rules"])
+    stats["after"]  = len(rules)
+    return out, stats
+
+
+def describe(stats: Counter) -> str:
+    return (
+        f"rules {stats['before']} -> {stats['after']} "
+        f"({stats['lowered']} lowered, {stats['shadowed']} shadowed, {stats['collapsed']} collapsed)"
+    )
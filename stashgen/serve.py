@@ -0,0 +1,294 @@
+import gzip
+import hashlib
+import importlib
+import json
+import os
+import struct
+import threading
+import traceback
+import urllib.parse
+from collections import OrderedDict
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+from stashgen import irbin, pipeline
+from stashgen.index import FIELDS, ProxyIndex, normalize_query
+from stashgen.render import STYLES
+
+CACHE_ENTRIES = 256
+CACHE_BYTES   = 64 * 1024 * 1024
+GZIP_LEVEL    = 6
+
+
+class NotFound(Exception):
+    pass
+
+
+class UnknownFlavour(NotFound):
+    pass
+
+
+class BadQuery(ValueError):
+    pass
+
+
+def accepts_gzip(header: str) -> bool:
+    # Accept-Encoding tokens with their q-values: "gzip;q=0" refuses gzip,
+    # and "*" stands for it only when gzip is not listed itself
+    q_of: Dict[str, float] = {}
+    for part in header.split(","):
+        coding, _, params = part.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        q_of[coding] = q
+    for coding in ("gzip", "x-gzip"):
+        if coding in q_of:
+            return q_of[coding] > 0
+    return q_of.get("*", 0.0) > 0
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    tags = [t.strip() for t in header.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+class LRUCache:
+    # Bounded by entry count and by the total size of the cached bodies
+
+    def __init__(self, max_entries: int = CACHE_ENTRIES, max_bytes: int = CACHE_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes   = max_bytes
+        self.entries: "OrderedDict[Hashable, bytes]" = OrderedDict()
+        self.size   = 0
+        self.hits   = 0
+        self.misses = 0
+        self.lock   = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: bytes) -> None:
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            if len(value) > self.max_bytes:
+                return
+            self.entries[key] = value
+            self.size += len(value)
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def drop(self, match: Callable[[Hashable], bool]) -> int:
+        with self.lock:
+            stale = [k for k in self.entries if match(k)]
+            for k in stale:
+                self.size -= len(self.entries.pop(k))
+        return len(stale)
+
+
+class SingleFlight:
+    # Concurrent calls with the same key share one execution of fn
+
+    def __init__(self):
+        self.calls: Dict[Hashable, Future] = {}
+        self.lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], bytes]) -> bytes:
+        with self.lock:
+            fut = self.calls.get(key)
+            leader = fut is None
+            if leader:
+                fut = self.calls[key] = Future()
+        if not leader:
+            return fut.result()
+        try:
+            fut.set_result(fn())
+        except BaseException as e:
+            fut.set_exception(e)
+        finally:
+            with self.lock:
+                del self.calls[key]
+        return fut.result()
+
+
+class Catalog:
+    # Each flavour's last IR snapshot and its index, reloaded when the file
+    # changes. The version is the IR's content digest, so a rewrite with
+    # the same proxies keeps every cached body valid. The binary IR is
+    # preferred; the JSON one serves trees written before it existed.
+
+    def __init__(self, on_change: Optional[Callable[[str, str], None]] = None):
+        self.on_change = on_change
+        self.loaded: Dict[str, Tuple[Tuple[int, int], str, ProxyIndex]] = {}
+        self.lock = threading.Lock()
+
+    def get(self, name: str) -> Optional[Tuple[str, ProxyIndex]]:
+        path = irbin.current_path(name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        stamp = (st.st_mtime_ns, st.st_size)
+        with self.lock:
+            entry = self.loaded.get(name)
+            if entry is not None and entry[0] == stamp:
+                return entry[1], entry[2]
+            try:
+                with open(path, "rb") as f:
+                    blob = f.read()
+                if path == irbin.bin_path(name):
+                    with irbin.IRFile(blob, path) as ir:
+                        proxies = ir.proxies()
+                else:
+                    proxies = json.loads(blob)["proxies"]
+            except (OSError, ValueError, KeyError, struct.error):
+                return None
+            version = hashlib.sha256(blob).hexdigest()[:16]
+            old = entry[1] if entry is not None else None
+            self.loaded[name] = (stamp, version, ProxyIndex(proxies))
+        if old is not None and old != version and self.on_change is not None:
+            self.on_change(name, old)
+        return version, self.loaded[name][2]
+
+
+class SubscriptionService:
+    # GET /<flavour>?field=value,...&style=... -> the flavour's profile over
+    # the matching proxies. Bodies are kept gzipped in an LRU keyed by
+    # (flavour, normalized query, styles, IR version).
+
+    def __init__(self, flavours: List[str], cache: Optional[LRUCache] = None):
+        self.flavours = {pipeline.flavour_name(m): m for m in map(importlib.import_module, flavours)}
+        self.cache    = cache or LRUCache()
+        self.flight   = SingleFlight()
+        self.catalog  = Catalog(on_change=self.invalidate)
+        self.renders  = 0
+
+    def invalidate(self, name: str, version: str) -> None:
+        dropped = self.cache.drop(lambda k: k[0] == name and k[3] == version)
+        print(f"  {name}: IR changed, dropped {dropped} cached bodies")
+
+    def key(self, name: str, params: Dict[str, List[str]], version: str) -> Tuple:
+        styles = tuple(sorted({s for v in params.get("style", []) for s in v.split(",") if s}))
+        bad = [s for s in styles if s not in STYLES]
+        if bad:
+            raise BadQuery(f"unknown style: {', '.join(bad)}")
+        query = {f: [v for vs in values for v in vs.split(",") if v] for f, values in params.items() if f != "style"}
+        unknown = [f for f in query if f not in FIELDS]
+        if unknown:
+            raise BadQuery(f"unknown fields: {', '.join(unknown)}")
+        return (name, normalize_query(query), styles, version)
+
+    def render(self, key: Tuple, index: ProxyIndex) -> bytes:
+        name, query, styles, _ = key
+        proxies = index.query(dict(query))
+        if not proxies:
+            raise NotFound("no proxies match")
+        text = pipeline.subscription(self.flavours[name], proxies, styles)
+        self.renders += 1
+        return gzip.compress(text.encode("utf-8"), GZIP_LEVEL, mtime=0)
+
+    def body(self, name: str, params: Dict[str, List[str]]) -> Tuple[Tuple, bytes]:
+        # The gzipped body and the key it was cached under
+        if name not in self.flavours:
+            raise UnknownFlavour(f"unknown flavour {name!r}")
+        loaded = self.catalog.get(name)
+        if loaded is None:
+            raise NotFound(f"no IR for {name} yet")
+        version, index = loaded
+        key = self.key(name, params, version)
+        body = self.cache.get(key)
+        if body is None:
+            body = self.flight.do(key, lambda: self._render_and_store(key, index))
+        return key, body
+
+    def _render_and_store(self, key: Tuple, index: ProxyIndex) -> bytes:
+        # A caller that missed just before the leader stored the body
+        # finds it here instead of rendering again
+        body = self.cache.get(key)
+        if body is None:
+            body = self.render(key, index)
+            self.cache.put(key, body)
+        return body
+
+
+def make_handler(service: SubscriptionService):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            url    = urllib.parse.urlsplit(self.path)
+            name   = url.path.strip("/")
+            params = urllib.parse.parse_qs(url.query)
+            try:
+                key, body = service.body(name, params)
+            except BadQuery as e:
+                return self._send(400, f"{e}\n".encode("utf-8"))
+            except NotFound as e:
+                return self._send(404, f"{e}\n".encode("utf-8"))
+            except Exception:
+                # Anything else is a bug here, not in the request
+                traceback.print_exc()
+                return self._send(500, b"internal error\n")
+            # The gzipped and the plain body are different representations,
+            # so each gets its own ETag
+            gzipped = accepts_gzip(self.headers.get("Accept-Encoding", ""))
+            tag     = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:20]
+            etag    = f'"{tag}-gz"' if gzipped else f'"{tag}"'
+            vary    = {"ETag": etag, "Vary": "Accept-Encoding"}
+            if etag_matches(self.headers.get("If-None-Match"), etag):
+                return self._send(304, b"", vary)
+            headers = dict(vary, **{"Content-Type": "text/yaml; charset=utf-8"})
+            if gzipped:
+                headers["Content-Encoding"] = "gzip"
+            else:
+                body = gzip.decompress(body)
+            self._send(200, body, headers)
+
+        def _send(self, status: int, body: bytes, headers: Optional[Dict[str, str]] = None) -> None:
+            self.send_response(status)
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            if status != 304:
+                self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if status != 304:
+                self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(flavours: List[str], host: str, port: int, cache: Optional[LRUCache] = None) -> None:
+    service = SubscriptionService(flavours, cache)
+    server  = ThreadingHTTPServer((host, port), make_handler(service))
+    print(f"Serving {', '.join(service.flavours)} on http://{host}:{port}/<flavour>")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,420 @@
+import csv
+import ipaddress
+import os
+import time
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import yaml
+
+from stashgen import providers
+from stashgen.rules import LOGICAL, Rule, lower_script
+
+Loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+EXACT, SUFFIX, SUB = 1, 2, 4
+MARK = ""
+
+PRIVATE_NETS = [
+    "10.0.0.0/8", "100.64.0.0/10", "127.0.0.0/8", "169.254.0.0/16",
+    "172.16.0.0/12", "192.168.0.0/16", "fc00::/7", "fe80::/10", "::1/128",
+]
+
+DEFAULT_PORT    = 443
+DEFAULT_NETWORK = "tcp"
+
+
+class DomainTrie:
+    # Labels are stored right to left, so one walk answers exact, suffix
+    # ("+.a.com"), subdomain-only (".a.com") and one-label wildcard patterns.
+
+    def __init__(self):
+        self.root: Dict = {}
+        self.size = 0
+
+    def add(self, pattern: str, mark: Optional[int] = None) -> None:
+        pattern = pattern.strip().lower().rstrip(".")
+        if mark is None:
+            if pattern.startswith("+."):
+                pattern, mark = pattern[2:], SUFFIX
+            elif pattern.startswith("."):
+                pattern, mark = pattern[1:], SUB
+            else:
+                mark = EXACT
+        if not pattern:
+            return
+        node = self.root
+        for label in reversed(pattern.split(".")):
+            node = node.setdefault(label, {})
+        node[MARK] = node.get(MARK, 0) | mark
+        self.size += 1
+
+    def match(self, domain: str) -> bool:
+        labels = domain.lower().rstrip(".").split(".")
+        labels.reverse()
+        return self._match(self.root, labels, 0)
+
+    def _match(self, node: Dict, labels: List[str], i: int) -> bool:
+        mark = node.get(MARK, 0)
+        if i == len(labels):
+            return bool(mark & (EXACT | SUFFIX))
+        if i and mark & (SUFFIX | SUB):
+            return True
+        for key in (labels[i], "*"):
+            child = node.get(key)
+            if child is not None and self._match(child, labels, i + 1):
+                return True
+        return False
+
+
+class CidrTree:
+    # Binary radix tree per address family; lookup is a longest-prefix match.
+
+    def __init__(self):
+        self.roots = {4: [None, None, None], 6: [None, None, None]}
+        self.size  = 0
+
+    def add(self, cidr: str, value=True) -> None:
+        net  = ipaddress.ip_network(cidr.strip(), strict=False)
+        bits = int(net.network_address)
+        width = net.max_prefixlen
+        node = self.roots[net.version]
+        for i in range(net.prefixlen):
+            b = (bits >> (width - 1 - i)) & 1
+            if node[b] is None:
+                node[b] = [None, None, None]
+            node = node[b]
+        node[2] = value
+        self.size += 1
+
+    def lookup(self, ip: str):
+        addr  = ipaddress.ip_address(ip)
+        bits  = int(addr)
+        width = addr.max_prefixlen
+        node  = self.roots[addr.version]
+        found = node[2]
+        for i in range(width):
+            node = node[(bits >> (width - 1 - i)) & 1]
+            if node is None:
+                break
+            if node[2] is not None:
+                found = node[2]
+        return found
+
+
+class Lookup:
+    # One trace entry. A domain only gets an IP when an IP rule without
+    # no-resolve needs one, the way a client resolves lazily.
+
+    def __init__(self, host: str, port: int, network: str, resolved: Optional[str]):
+        self.port     = port
+        self.network  = network
+        self.resolved = resolved
+        self.did_resolve = False
+        try:
+            ipaddress.ip_address(host)
+            self.domain, self.ip = None, host
+        except ValueError:
+            self.domain, self.ip = host.lower(), None
+
+    def ip_for(self, no_resolve: bool) -> Optional[str]:
+        if self.ip is not None or no_resolve or self.resolved is None:
+            return self.ip
+        self.ip, self.did_resolve = self.resolved, True
+        return self.ip
+
+
+Matcher = Callable[[Lookup, bool], bool]
+
+
+class ProviderSet:
+    # The contents of one rule provider, compiled for its behaviour
+
+    def __init__(self, name: str, behavior: str):
+        self.name     = name
+        self.behavior = behavior
+        self.domains  = DomainTrie()
+        self.cidrs    = CidrTree()
+        self.keywords: List[str] = []
+        self.others: List[Tuple[Rule, Matcher]] = []
+        self.missing  = False
+
+    @property
+    def size(self) -> int:
+        return self.domains.size + self.cidrs.size + len(self.keywords) + len(self.others)
+
+    def add(self, entry: str, engine: "Engine") -> None:
+        entry = entry.strip().strip("'\"")
+        if not entry or entry.startswith("#"):
+            return
+        if self.behavior == "domain":
+            self.domains.add(entry)
+        elif self.behavior == "ipcidr":
+            self.cidrs.add(entry)
+        else:
+            rule = payload_rule(entry)
+            if rule.kind == "DOMAIN":
+                self.domains.add(rule.payload, EXACT)
+            elif rule.kind == "DOMAIN-SUFFIX":
+                self.domains.add(rule.payload, SUFFIX)
+            elif rule.kind == "DOMAIN-KEYWORD":
+                self.keywords.append(rule.payload.lower())
+            elif rule.kind in ("IP-CIDR", "IP-CIDR6"):
+                self.cidrs.add(rule.payload)
+            else:
+                self.others.append((rule, engine.matcher(rule)))
+
+    def match(self, lk: Lookup, no_resolve: bool) -> bool:
+        if lk.domain is not None:
+            if self.domains.size and self.domains.match(lk.domain):
+                return True
+            if any(k in lk.domain for k in self.keywords):
+                return True
+        if self.cidrs.size:
+            ip = lk.ip_for(no_resolve)
+            if ip is not None and self.cidrs.lookup(ip):
+                return True
+        return any(m(lk, no_resolve or r.no_resolve) for r, m in self.others)
+
+
+def load_provider(name: str, spec: Dict, engine: "Engine") -> ProviderSet:
+    pset = ProviderSet(name, spec.get("behavior", "classical"))
+    path = spec.get("path") if spec.get("type") == "file" else providers.provider_path(spec.get("url", ""))
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+    except (OSError, TypeError):
+        pset.missing = True
+        return pset
+    if spec.get("format") == "text" or not text.lstrip().startswith("payload"):
+        entries: Iterable[str] = text.splitlines()
+    else:
+        entries = (yaml.load(text, Loader=Loader) or {}).get("payload") or []
+    for entry in entries:
+        try:
+            pset.add(str(entry), engine)
+        except (ValueError, IndexError):
+            continue
+    return pset
+
+
+def load_geoip(path: Optional[str]) -> CidrTree:
+    # A CSV of "network,country" rows, e.g. "2.144.0.0/14,IR"
+    tree = CidrTree()
+    for net in PRIVATE_NETS:
+        tree.add(net, "PRIVATE")
+    if path:
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            for row in csv.reader(f):
+                if len(row) < 2 or row[0].startswith("#"):
+                    continue
+                try:
+                    tree.add(row[0], row[1].strip().upper())
+                except ValueError:
+                    continue
+    return tree
+
+
+class Engine:
+
+    def __init__(self, profile: Dict, geoip: Optional[str] = None):
+        self.geoip     = load_geoip(geoip)
+        self.shortcuts = (profile.get("script") or {}).get("shortcuts") or {}
+        self.providers: Dict[str, ProviderSet] = {}
+        for name, spec in (profile.get("rule-providers") or {}).items():
+            self.providers[name] = load_provider(name, spec, self)
+        self.rules: List[Tuple[Rule, Matcher]] = []
+        for text in profile.get("rules") or []:
+            rule = Rule.parse(text)
+            self.rules.append((rule, self.matcher(rule)))
+
+    def matcher(self, rule: Rule) -> Matcher:
+        kind, payload = rule.kind, rule.payload
+        if kind == "MATCH":
+            return lambda lk, nr: True
+        if kind == "DOMAIN":
+            p = payload.lower()
+            return lambda lk, nr: lk.domain == p
+        if kind == "DOMAIN-SUFFIX":
+            p = payload.lower()
+            return lambda lk, nr: lk.domain is not None and (lk.domain == p or lk.domain.endswith("." + p))
+        if kind == "DOMAIN-KEYWORD":
+            p = payload.lower()
+            return lambda lk, nr: lk.domain is not None and p in lk.domain
+        if kind in ("IP-CIDR", "IP-CIDR6"):
+            net = ipaddress.ip_network(payload, strict=False)
+
+            def cidr(lk: Lookup, nr: bool) -> bool:
+                ip = lk.ip_for(nr)
+                return ip is not None and ipaddress.ip_address(ip) in net
+            return cidr
+        if kind == "GEOIP":
+            code = payload.upper()
+
+            def geoip(lk: Lookup, nr: bool) -> bool:
+                ip = lk.ip_for(nr)
+                return ip is not None and self.geoip.lookup(ip) == code
+            return geoip
+        if kind == "NETWORK":
+            p = payload.lower()
+            return lambda lk, nr: lk.network == p
+        if kind in ("DST-PORT", "SRC-PORT"):
+            ports = set()
+            for part in payload.split("/"):
+                lo, _, hi = part.partition("-")
+                ports.update(range(int(lo), int(hi or lo) + 1))
+            # Trace entries carry no source port
+            return lambda lk, nr: kind == "DST-PORT" and lk.port in ports
+        if kind == "RULE-SET":
+            pset = self.providers.get(payload)
+            if pset is None:
+                return lambda lk, nr: False
+            return pset.match
+        if kind == "SCRIPT":
+            matchers = lower_script(self.shortcuts.get(payload, ""))
+            if not matchers:
+                return lambda lk, nr: False
+            return self.matcher(Rule("AND", "(" + ",".join(f"({k},{v})" for k, v in matchers) + ")", "_", []))
+        if kind in LOGICAL:
+            subs = [self.matcher(payload_rule(s)) for s in split_logical(payload)]
+            if kind == "AND":
+                return lambda lk, nr: all(m(lk, nr) for m in subs)
+            if kind == "OR":
+                return lambda lk, nr: any(m(lk, nr) for m in subs)
+            return lambda lk, nr: not subs[0](lk, nr)
+        return lambda lk, nr: False
+
+    def evaluate(self, lk: Lookup) -> Tuple[str, int]:
+        # Returns the policy and the index of the rule that chose it
+        for i, (rule, match) in enumerate(self.rules):
+            if match(lk, rule.no_resolve):
+                return rule.target, i
+        return "DIRECT", len(self.rules)
+
+
+def payload_rule(text: str) -> Rule:
+    # A rule without a target, as in classical providers and logical rules
+    kind, _, rest = text.partition(",")
+    if kind in LOGICAL:
+        return Rule.parse(text + ",_")
+    payload, _, options = rest.partition(",")
+    return Rule(kind, payload, "_", options.split(",") if options else [])
+
+
+def split_logical(payload: str) -> List[str]:
+    # "((NETWORK,UDP),(DST-PORT,443))" -> ["NETWORK,UDP", "DST-PORT,443"]
+    inner = payload[1:-1]
+    parts, depth, start = [], 0, 0
+    for i, ch in enumerate(inner):
+        if ch == "(":
+            if depth == 0:
+                start = i + 1
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+            if depth == 0:
+                parts.append(inner[start:i])
+    return parts
+
+
+def parse_trace(lines: Iterable[str]) -> List[Tuple[str, int, str, Optional[str]]]:
+    # "host [port] [tcp|udp] [resolved-ip]", fields after the host in any order
+    entries = []
+    for line in lines:
+        fields = line.split("#", 1)[0].split()
+        if not fields:
+            continue
+        host, port, network, resolved = fields[0], DEFAULT_PORT, DEFAULT_NETWORK, None
+        for field in fields[1:]:
+            if field.isdigit():
+                port = int(field)
+            elif field.lower() in ("tcp", "udp"):
+                network = field.lower()
+            else:
+                resolved = field
+        entries.append((host, port, network, resolved))
+    return entries
+
+
+def percentile(values: List[int], q: float) -> int:
+    if not values:
+        return 0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def replay(engine: Engine, trace: List[Tuple], repeat: int = 1) -> Dict:
+    policies: Counter = Counter()
+    hits: Counter = Counter()
+    evaluated: List[int] = []
+    resolutions = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for entry in trace:
+            lk = Lookup(*entry)
+            target, index = engine.evaluate(lk)
+            policies[target] += 1
+            hits[index] += 1
+            evaluated.append(index + 1)
+            resolutions += lk.did_resolve
+    elapsed = time.perf_counter() - start
+    lookups = len(trace) * repeat
+    return {
+        "lookups":         lookups,
+        "elapsed":         round(elapsed, 6),
+        "lookups_per_sec": round(lookups / elapsed, 1) if elapsed else None,
+        "rules_evaluated": {
+            "mean": round(sum(evaluated) / len(evaluated), 2) if evaluated else 0,
+            "p50":  percentile(evaluated, 0.50),
+            "p95":  percentile(evaluated, 0.95),
+            "max":  max(evaluated, default=0),
+        },
+        "resolutions": resolutions,
+        "policies":    dict(policies.most_common()),
+        "rule_hits": [
+            {"index": i, "rule": str(engine.rules[i][0]), "hits": n}
+            for i, n in sorted(hits.items()) if i < len(engine.rules)
+        ],
+    }
+
+
+def simulate(
+    profile_path: str,
+    trace_lines: Iterable[str],
+    geoip: Optional[str] = None,
+    repeat: int = 1,
+) -> Dict:
+    start = time.perf_counter()
+    with open(profile_path, "r", encoding="utf-8") as f:
+        profile = yaml.load(f, Loader=Loader)
+    engine = Engine(profile, geoip)
+    load_time = time.perf_counter() - start
+    report = replay(engine, parse_trace(trace_lines), repeat)
+    report.update({
+        "profile":   os.path.basename(profile_path),
+        "rules":     len(engine.rules),
+        "load_time": round(load_time, 6),
+        "geoip":     geoip,
+        "providers": {
+            name: {"behavior": p.behavior, "entries": p.size, "missing": p.missing}
+            for name, p in engine.providers.items()
+        },
+    })
+    return report
+
+
+def format_report(report: Dict) -> str:
+    ev = report["rules_evaluated"]
+    lines = [
+        f"{report['profile']}: {report['rules']} rules, loaded in {report['load_time']:.3f} s",
+        f"  {report['lookups']} lookups in {report['elapsed']:.3f} s ({report['lookups_per_sec']} /s)",
+        f"  rules evaluated per lookup: mean {ev['mean']}, p50 {ev['p50']}, p95 {ev['p95']}, max {ev['max']}",
+        f"  DNS resolutions: {report['resolutions']}",
+    ]
+    missing = [n for n, p in report["providers"].items() if p["missing"]]
+    if missing:
+        lines.append(f"  providers not cached (never match): {', '.join(missing)}")
+    lines.append("  matches per policy:")
+    for policy, n in report["policies"].items():
+        lines.append(f"    {n:8d}  {policy}")
+    return "\n".join(lines)
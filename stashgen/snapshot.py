@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from stashgen.output import file_mode
+
+CACHE_DIR    = os.environ.get("STASH_CACHE_DIR", ".cache")
+SNAPSHOT_DIR = os.path.join(CACHE_DIR, "snapshots")
+
+RETRY_INITIAL       = 2.0
+RETRY_MAX           = 30.0
+REVALIDATE_DEADLINE = float(os.environ.get("STASH_REVALIDATE_DEADLINE", "120"))
+
+
+def digest_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def atomic_write(path: str, data: bytes) -> None:
+    # A fresh temp name per call, so threads writing the same path never
+    # share one; other users (a textfile collector, say) can read the result
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    mode = file_mode(path)
+    fd, tmp = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        os.chmod(tmp, mode)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def _source_path(url: str) -> str:
+    key = hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(SNAPSHOT_DIR, f"{key}.txt")
+
+
+def ir_path(flavour: str) -> str:
+    return os.path.join(SNAPSHOT_DIR, f"{flavour}.ir.json")
+
+
+def save_source(url: str, text: str) -> str:
+    atomic_write(_source_path(url), text.encode("utf-8"))
+    return digest_text(text)
+
+
+def load_source(url: str) -> Optional[Tuple[str, str, float]]:
+    path = _source_path(url)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        age = time.time() - os.path.getmtime(path)
+    except OSError:
+        return None
+    return text, digest_text(text), age
+
+
+def save_ir(flavour: str, source_digest: str, proxies: List[Dict]) -> None:
+    payload = {"source": source_digest, "proxies": proxies}
+    atomic_write(ir_path(flavour), json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+
+
+def load_ir(flavour: str, source_digest: Optional[str]) -> Optional[List[Dict]]:
+    # source_digest None takes the last IR whatever it was built from
+    try:
+        with open(ir_path(flavour), "r", encoding="utf-8") as f:
+            payload = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if source_digest is not None and payload.get("source") != source_digest:
+        return None
+    return payload.get("proxies")
+
+
+class Revalidator:
+    # Retries fetch(timeout) on a daemon thread with capped exponential
+    # backoff until it succeeds or the deadline passes.
+
+    def __init__(self, fetch: Callable[[float], Any], deadline: float = REVALIDATE_DEADLINE):
+        self._fetch    = fetch
+        self._deadline = time.monotonic() + deadline
+        self._result: Any  = None
+        self._done     = threading.Event()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _remaining(self) -> float:
+        return self._deadline - time.monotonic()
+
+    def _run(self) -> None:
+        delay = RETRY_INITIAL
+        while self._remaining() > 0:
+            try:
+                self._result = self._fetch(self._remaining())
+                break
+            except Exception as e:
+                print(f"  Retry failed: {e}")
+            time.sleep(max(0.0, min(delay, self._remaining())))
+            delay = min(delay * 2, RETRY_MAX)
+        self._done.set()
+
+    def wait(self) -> Any:
+        self._done.wait(max(0.0, self._remaining()))
+        return self._result
@@ -0,0 +1,54 @@
+import os
+from typing import Dict, List, Set, Tuple
+
+import yaml
+
+from stashgen.fetch import MAX_PER_HOST
+
+SOURCES_FILE     = os.environ.get("STASH_SOURCES", "sources.yaml")
+DEFAULT_PRIORITY = 0
+
+
+def load_sources(default_url: str) -> Tuple[List[Dict], int]:
+    try:
+        with open(SOURCES_FILE, "r", encoding="utf-8") as f:
+            data = yaml.safe_load(f) or {}
+    except FileNotFoundError:
+        data = {}
+
+    sources: List[Dict] = []
+    for entry in data.get("sources") or [{"url": default_url}]:
+        if isinstance(entry, str):
+            entry = {"url": entry}
+        sources.append({
+            "url":      entry["url"],
+            "priority": int(entry.get("priority", DEFAULT_PRIORITY)),
+            "mirrors":  entry.get("mirrors"),
+        })
+    return sources, int(data.get("max-per-host", MAX_PER_HOST))
+
+
+def by_priority(sources: List[Dict]) -> List[Dict]:
+    # Stable, so equal priorities keep their order in the config
+    return sorted(sources, key=lambda s: -s["priority"])
+
+
+def endpoint(proxy: Dict) -> Tuple[str, str, str]:
+    # What decides that two lists carry the same server
+    return (
+        str(proxy.get("server", "")).lower(),
+        str(proxy.get("port", "")),
+        str(proxy.get("uuid", "")).lower(),
+    )
+
+
+def drop_taken(proxies: List[Dict], taken: Set[Tuple[str, str, str]]) -> List[Dict]:
+    # The proxies whose endpoint no earlier list had; repeats within the
+    # list itself are left to the flavour's own dedup
+    kept = [p for p in proxies if endpoint(p) not in taken]
+    taken.update(endpoint(p) for p in proxies)
+    return kept
+
+
+def mirror_map(sources: List[Dict]) -> Dict[str, List[str]]:
+    return {s["url"]: s["mirrors"] for s in sources if s["mirrors"] is not None}
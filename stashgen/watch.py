@@ -0,0 +1,116 @@
+import random
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from stashgen import pipeline, snapshot, sources
+from stashgen.fetch import TIMEOUT, VALIDATORS, configure_pool, iter_fetch
+
+INTERVAL = 600.0
+JITTER   = 0.1
+
+
+def next_delay(interval: float, jitter: float, rng: random.Random) -> float:
+    # Spread polls by +-jitter of the interval so many instances do not
+    # hit upstream in lockstep
+    return max(0.0, interval * (1 + rng.uniform(-jitter, jitter)))
+
+
+class Watcher:
+    # Keeps every flavour's SourceSet between polls. A poll fetches each
+    # source conditionally and re-parses only the sources whose text
+    # changed; when none did, nothing is regenerated.
+
+    def __init__(
+        self,
+        flavours: List,
+        timeout: float = TIMEOUT,
+        force: bool = False,
+        styles: Tuple[str, ...] = (),
+        short_names: bool = False,
+    ):
+        self.flavours = flavours
+        self.timeout  = timeout
+        self.force    = force
+        self.styles   = styles
+        self.srcs, max_per_host = sources.load_sources(flavours[0].SOURCE_URL)
+        configure_pool(max_per_host)
+        self.sets = [pipeline.SourceSet(fl, self.srcs, short_names) for fl in flavours]
+        self.digests: Dict[str, str] = {}
+        # Sources whose text in memory came from the snapshot, not upstream
+        self.stale: Set[str] = set()
+
+    def fetch_changed(self) -> Dict[str, str]:
+        changed: Dict[str, str] = {}
+        mirrors = sources.mirror_map(self.srcs)
+        urls    = [s["url"] for s in self.srcs]
+        for url, text, error in iter_fetch(urls, self.timeout, mirrors):
+            if error is not None:
+                print(f"Download failed: {url}: {error}")
+                if url in self.digests:
+                    continue
+                # Nothing in memory yet: start from the last good snapshot
+                cached = snapshot.load_source(url)
+                if cached is None:
+                    continue
+                print(f"  Using snapshot of {url} ({cached[2] / 3600:.1f} h old)")
+                text = cached[0]
+                self.stale.add(url)
+            elif VALIDATORS.not_modified(url) and url in self.digests:
+                continue
+            else:
+                self.stale.discard(url)
+            digest = snapshot.digest_text(text)
+            if self.digests.get(url) != digest:
+                self.digests[url] = digest
+                changed[url] = text
+        return changed
+
+    def poll(self) -> Optional[bool]:
+        # None when no source changed, else whether every flavour generated
+        changed = self.fetch_changed()
+        if not changed:
+            return None
+        print(f"Changed sources: {len(changed)} of {len(self.srcs)}")
+        for sset in self.sets:
+            for url, text in changed.items():
+                sset.add(url, text)
+        # Once per poll rather than once per flavour, and only lists that
+        # were fetched and parse to something for some flavour
+        for url, text in changed.items():
+            if url not in self.stale and any(sset.parsed.get(url) for sset in self.sets):
+                pipeline.save_source(url, text)
+        ok = True
+        for sset in self.sets:
+            ok = pipeline.generate(sset, self.force, self.styles, save_sources=False) and ok
+        # Only the first pass is forced; later ones rely on the memo
+        self.force = False
+        return ok
+
+    def run(
+        self,
+        interval: float = INTERVAL,
+        jitter: float = JITTER,
+        polls: Optional[int] = None,
+        seed: Optional[int] = None,
+        on_poll: Optional[Callable[[bool, float], None]] = None,
+    ) -> bool:
+        # on_poll, if given, gets the state of the outputs and the poll's
+        # duration after every poll
+        rng = random.Random(seed)
+        ok  = True
+        count = 0
+        while True:
+            t0 = time.monotonic()
+            result = self.poll()
+            if result is None:
+                print(f"[{time.strftime('%H:%M:%S')}] No source changed")
+            else:
+                ok = result
+                state = "regenerated" if result else "regeneration failed"
+                print(f"[{time.strftime('%H:%M:%S')}] Sources changed, {state} in {time.monotonic() - t0:.1f} s")
+            if on_poll is not None:
+                on_poll(ok, time.monotonic() - t0)
+            count += 1
+            if polls is not None and count >= polls:
+                return ok
+            time.sleep(next_delay(interval, jitter, rng))
@@ -0,0 +1,76 @@
+import argparse
+import contextlib
+import importlib
+import sys
+
+from stashgen import irbin, local, pipeline, snapshot
+from stashgen.index import FIELDS, ProxyIndex, parse_query
+from stashgen.render import STYLES
+
+if hasattr(sys.stdout, "reconfigure"):
+    sys.stdout.reconfigure(encoding="utf-8") # type: ignore
+
+
+def load_proxies(flavour, input_path):
+    if input_path is None:
+        # The deduped proxies of the flavour's last run
+        name = pipeline.flavour_name(flavour)
+        return irbin.load_ir(name) or snapshot.load_ir(name, None)
+    sset = pipeline.SourceSet(flavour, [{"url": input_path, "priority": 0, "mirrors": None}])
+    sset.add_lines(input_path, local.iter_vless_lines(input_path))
+    return sset.merge()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write a flavour's profile over the proxies matching a filter.",
+    )
+    parser.add_argument("flavour", help="flavour module, e.g. stash_claude_v2")
+    parser.add_argument(
+        "--where", action="append", default=[], metavar="FIELD=VALUE[,VALUE...]",
+        help=(
+            f"keep proxies whose FIELD is one of the values; repeated fields must all match "
+            f"(fields: {', '.join(FIELDS)}; country takes a code like DE or a flag)"
+        ),
+    )
+    parser.add_argument("--input", metavar="PATH", help="build from a local dump instead of the last run's proxies")
+    parser.add_argument("--style", action="append", choices=STYLES, default=[], help="output style, may be repeated")
+    parser.add_argument("--list", metavar="FIELD", choices=list(FIELDS), help="print the values of FIELD with counts and exit")
+    parser.add_argument("-o", "--output", metavar="PATH", help="write the profile here (default: stdout)")
+    args = parser.parse_args()
+
+    try:
+        query = parse_query(args.where)
+    except ValueError as e:
+        parser.error(str(e))
+    unknown = [f for f in query if f not in FIELDS]
+    if unknown:
+        parser.error(f"unknown fields: {', '.join(unknown)}")
+
+    flavour = importlib.import_module(args.flavour)
+    # Parser and emitter progress goes to stderr so stdout stays the profile
+    with contextlib.redirect_stdout(sys.stderr):
+        proxies = load_proxies(flavour, args.input)
+    if not proxies:
+        sys.exit(f"No proxies for {args.flavour}; run generate.py first or pass --input")
+
+    index = ProxyIndex(proxies)
+    if args.list:
+        for value, count in sorted(index.values(args.list).items(), key=lambda kv: -kv[1]):
+            print(f"{count:6d}  {value or '-'}")
+        return
+
+    selected = index.query(query)
+    print(f"{len(selected)} of {len(proxies)} proxies match", file=sys.stderr)
+    if not selected:
+        sys.exit(1)
+    text = pipeline.subscription(flavour, selected, tuple(sorted(set(args.style))))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import calendar
+import random
+
+import pytest
+
+from stashgen import archive
+
+CASES = [
+    ([], []),
+    ([], ["a", "b"]),
+    (["a", "b"], []),
+    (["a", "b", "c"], ["a", "b", "c"]),
+    (["a", "b", "c", "d"], ["c", "d", "a", "b"]),
+    (["a", "b", "c"], ["a", "x", "c", "c", "y"]),
+    (["a", "a", "b"], ["b", "a", "a", "a"]),
+    (["", "=1,2", "+3"], ["+3", "", "new", "=1,2", ""]),
+]
+
+
+@pytest.mark.parametrize("old, new", CASES)
+def test_delta_round_trip(old, new):
+    ops = archive.diff_lines(old, new)
+    assert archive.apply_ops(old, ops) == new
+    assert archive.decode_ops(archive.encode_ops(ops)) == ops
+    assert archive.apply_ops(old, archive.decode_ops(archive.encode_ops(ops))) == new
+
+
+def test_delta_round_trip_random():
+    rng  = random.Random(7)
+    pool = [f"vless://{i}@h:443" for i in range(40)]
+    for _ in range(200):
+        old = rng.choices(pool, k=rng.randrange(30))
+        new = rng.choices(pool + ["fresh", ""], k=rng.randrange(30))
+        ops = archive.diff_lines(old, new)
+        assert archive.apply_ops(old, archive.decode_ops(archive.encode_ops(ops))) == new
+
+
+def test_unchanged_runs_become_one_copy():
+    old = [f"line {i}" for i in range(10)]
+    assert archive.diff_lines(old, old[2:8] + ["x"]) == [(2, 6), ["x"]]
+
+
+def texts(n):
+    # Each snapshot drops the oldest line and adds a new one
+    return ["\n".join(f"vless://{j}@h:443" for j in range(i, i + 5)) for i in range(n)]
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", str(tmp_path))
+    monkeypatch.setattr(archive, "KEYFRAME_EVERY", 3)
+    return tmp_path
+
+
+def test_record_and_rebuild_every_entry(store):
+    url  = "https://example.test/list.txt"
+    arch = archive.Archive(url)
+    for i, text in enumerate(texts(7)):
+        assert arch.record(text, now=100 * (i + 1))["seq"] == i
+    assert [e["kind"] for e in arch.entries] == ["key", "delta", "delta", "key", "delta", "delta", "key"]
+
+    # Rebuilt by a fresh instance, so every delta chain is read from disk
+    fresh = archive.Archive(url)
+    for i, text in reversed(list(enumerate(texts(7)))):
+        assert fresh.text(i) == text
+
+
+def test_unchanged_text_is_not_recorded(store):
+    arch = archive.Archive("https://example.test/list.txt")
+    assert arch.record("a\nb", now=100) is not None
+    assert arch.record("a\nb", now=200) is None
+    assert len(arch.entries) == 1
+
+
+def test_previous_text_is_trusted_only_when_its_digest_matches(store):
+    arch = archive.Archive("https://example.test/list.txt")
+    arch.record("a\nb", now=100)
+    arch.record("b\nc", previous="not the last entry", now=200)
+    assert archive.Archive(arch.url).text(1) == "b\nc"
+
+
+def test_reconstruct_at_and_between_timestamps(store):
+    url = "https://example.test/list.txt"
+    arch = archive.Archive(url)
+    for i, text in enumerate(texts(4)):
+        arch.record(text, now=100 * (i + 1))
+
+    assert archive.reconstruct(url, 99) is None
+    assert archive.reconstruct(url, 100)[1] == texts(4)[0]
+    assert archive.reconstruct(url, 250)[1] == texts(4)[1]
+    entry, text = archive.reconstruct(url, 300)
+    assert (entry["seq"], text) == (2, texts(4)[2])
+    assert archive.reconstruct(url)[1] == texts(4)[3]
+    assert archive.reconstruct("https://example.test/other.txt") is None
+
+
+def test_parse_when():
+    day = calendar.timegm((2026, 10, 18, 0, 0, 0))
+    assert archive.parse_when("latest") == float("inf")
+    assert archive.parse_when("1760745600") == 1760745600.0
+    assert archive.parse_when("1.5") == 1.5
+    assert archive.parse_when("2026-10-18") == day
+    assert archive.parse_when("2026-10-18T06:00") == day + 6 * 3600
+    assert archive.parse_when("2026-10-18T06:00:30") == day + 6 * 3600 + 30
+
+
+@pytest.mark.parametrize("value", ["", "yesterday", "2026-13-01", "2026-10-18 06:00", "Latest"])
+def test_parse_when_rejects(value):
+    with pytest.raises(ValueError, match="bad time"):
+        archive.parse_when(value)
@@ -0,0 +1,73 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from stashgen import churn
+
+
+def proxy(server, port=443, uuid="u"):
+    return {"server": server, "port": port, "uuid": uuid}
+
+
+A, B, C, D = proxy("a"), proxy("b"), proxy("c"), proxy("d")
+
+
+def row(store, p):
+    i = int(np.searchsorted(store.keys, churn.proxy_key(p)))
+    assert store.keys[i] == churn.proxy_key(p)
+    return int(store.first[i]), int(store.last[i]), int(store.count[i])
+
+
+def test_first_and_last_seen_and_count(tmp_path):
+    store = churn.ChurnStore(str(tmp_path / "c.npz"))
+    assert store.update([A, B, A], now=100) == {"seen": 2, "new": 2, "known": 0, "dropped": 0}
+    assert store.update([A, C], now=200) == {"seen": 2, "new": 1, "known": 1, "dropped": 0}
+
+    assert row(store, A) == (100, 200, 2)
+    assert row(store, B) == (100, 100, 1)
+    assert row(store, C) == (200, 200, 1)
+    assert list(store.keys) == sorted(store.keys)
+    assert store.runs == 2
+    assert list(store.lifetimes([A, B, D])) == [100, 0, 0]
+    assert list(store.appearances([A, B, D])) == [2, 1, 0]
+
+
+def test_endpoint_key_ignores_case_and_other_fields():
+    assert churn.proxy_key(dict(proxy("A.example"), name="x")) == churn.proxy_key(proxy("a.example"))
+    assert churn.proxy_key(proxy("a", port=8443)) != churn.proxy_key(proxy("a"))
+
+
+def test_endpoints_past_retention_are_forgotten(tmp_path):
+    store = churn.ChurnStore(str(tmp_path / "c.npz"))
+    store.update([A, B], now=100)
+    store.update([A, C], now=200)
+    stats = store.update([A], now=200 + churn.RETENTION)
+    assert stats["dropped"] == 1
+    assert row(store, C) == (200, 200, 1)
+    assert churn.proxy_key(B) not in store.keys
+
+
+def test_order_longest_lived_first_ties_keep_their_order(tmp_path):
+    store = churn.ChurnStore(str(tmp_path / "c.npz"))
+    store.update([A, B, C], now=100)
+    store.update([B, C], now=300)
+    store.update([A], now=200)
+    # Lifetimes: A 100, B 200, C 200, D unknown (0)
+    assert store.order([D, A, C, B]) == [C, B, A, D]
+    assert store.order([D, A, B, C]) == [B, C, A, D]
+
+
+def test_order_without_history_is_unchanged(tmp_path):
+    store = churn.ChurnStore(str(tmp_path / "c.npz"))
+    assert store.order([B, A]) == [B, A]
+
+
+def test_save_and_load(tmp_path):
+    path  = str(tmp_path / "c.npz")
+    store = churn.ChurnStore(path)
+    store.update([A, B], now=100)
+    store.save()
+    loaded = churn.ChurnStore.load(path)
+    assert loaded.runs == 1
+    assert row(loaded, B) == (100, 100, 1)
+    assert churn.ChurnStore.load(str(tmp_path / "missing.npz")).runs == 0
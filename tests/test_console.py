@@ -0,0 +1,34 @@
+import threading
+
+from stashgen import console
+
+
+def test_groups_print_in_order_whatever_the_interleaving(capsys):
+    steps = [threading.Event() for _ in range(4)]
+
+    def flavour(key, waits, sets):
+        with console.group(key):
+            for wait, done in zip(waits, sets):
+                wait.wait(5)
+                print(f"{key} line")
+                done.set()
+
+    start = threading.Event()
+    with console.grouped() as out:
+        b = threading.Thread(target=flavour, args=("b", [start, steps[1]], [steps[0], steps[2]]))
+        a = threading.Thread(target=flavour, args=("a", [steps[0], steps[2]], [steps[1], steps[3]]))
+        b.start()
+        a.start()
+        print("shared line")
+        start.set()
+        a.join()
+        b.join()
+        out.release(["a", "b"])
+
+    assert capsys.readouterr().out == "shared line\na line\na line\nb line\nb line\n"
+
+
+def test_group_outside_grouped_writes_through(capsys):
+    with console.group("a"):
+        print("direct")
+    assert capsys.readouterr().out == "direct\n"
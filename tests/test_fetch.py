@@ -0,0 +1,162 @@
+import gzip
+import hashlib
+import importlib
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from stashgen import fetch, pipeline, snapshot
+from stashgen.corpus import vless_lines
+
+BODY = "\n".join(vless_lines(5)).encode("utf-8")
+ETAG = '"' + hashlib.sha1(BODY).hexdigest() + '"'
+PIECE = 4096
+
+
+class Stub:
+    # A local list server; status is what the next requests get, hits
+    # records the If-None-Match each request carried. With pace, the body
+    # goes out in PIECE-sized writes pace seconds apart; aborted is set when
+    # the client hangs up before the end.
+    def __init__(self, body=BODY, pace=0.0, gzipped=False):
+        self.status   = 200
+        self.hits     = []
+        self.aborted  = threading.Event()
+        self.finished = threading.Event()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                match = self.headers.get("If-None-Match")
+                stub.hits.append(match)
+                if stub.status != 200:
+                    self.send_error(stub.status)
+                    return
+                if match == ETAG:
+                    self.send_response(304)
+                    self.send_header("ETag", ETAG)
+                    self.end_headers()
+                    return
+                data = gzip.compress(body) if gzipped else body
+                self.send_response(200)
+                self.send_header("ETag", ETAG)
+                if gzipped:
+                    self.send_header("Content-Encoding", "gzip")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                try:
+                    for i in range(0, len(data), PIECE if pace else len(data)):
+                        self.wfile.write(data[i:i + PIECE] if pace else data)
+                        self.wfile.flush()
+                        time.sleep(pace)
+                except OSError:
+                    stub.aborted.set()
+                    return
+                stub.finished.set()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/list.txt"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stubs(monkeypatch, tmp_path):
+    # Starts Stub(**kwargs) servers on demand and stops them afterwards
+    monkeypatch.setattr(fetch, "VALIDATORS", fetch.ValidatorCache())
+    monkeypatch.setattr(snapshot, "SNAPSHOT_DIR", str(tmp_path))
+    started = []
+
+    def start(**kwargs):
+        started.append(Stub(**kwargs))
+        return started[-1]
+    yield start
+    for server in started:
+        server.close()
+
+
+@pytest.fixture
+def stub(stubs):
+    return stubs()
+
+
+def source(url):
+    return {"url": url, "priority": 0, "mirrors": []}
+
+
+def test_fetched_list_is_parsed(stub, capsys):
+    flavour = importlib.import_module("stash_claude_v2")
+    sset    = pipeline.SourceSet(flavour, [source(stub.url)])
+    assert pipeline.fetch_into(sset, [source(stub.url)], timeout=5) == []
+    assert sset.texts[stub.url] == BODY.decode("utf-8")
+    assert len(sset.merge()) == 5
+
+
+def test_unchanged_list_is_revalidated_with_etag(stub):
+    assert fetch.fetch_text(stub.url, mirrors=[], timeout=5) == BODY.decode("utf-8")
+    assert not fetch.VALIDATORS.not_modified(stub.url)
+
+    # The second fetch is conditional and the 304 reuses the stored body
+    assert fetch.fetch_text(stub.url, mirrors=[], timeout=5) == BODY.decode("utf-8")
+    assert stub.hits == [None, ETAG]
+    assert fetch.VALIDATORS.not_modified(stub.url)
+
+
+def test_failed_list_falls_back_to_snapshot(stub, capsys):
+    snapshot.save_source(stub.url, "vless://from-snapshot")
+    stub.status = 500
+
+    failed = []
+    items  = list(pipeline.fetch_stream([source(stub.url)], timeout=5, failed=failed))
+    assert items == [(stub.url, "vless://from-snapshot")]
+    assert failed == [source(stub.url)]
+    assert "Using snapshot of" in capsys.readouterr().out
+
+
+def test_failed_list_without_snapshot_is_dropped(stub, capsys):
+    stub.status = 500
+
+    failed = []
+    assert list(pipeline.fetch_stream([source(stub.url)], timeout=5, failed=failed)) == []
+    assert failed == [source(stub.url)]
+    assert "No snapshot to fall back on" in capsys.readouterr().out
+
+
+def test_fast_mirror_wins_and_slow_primary_is_abandoned(stubs):
+    # 64 pieces 50 ms apart: the primary alone would take over 3 s
+    big     = BODY * (64 * PIECE // len(BODY) + 1)
+    primary = stubs(body=big, pace=0.05)
+    mirror  = stubs(body=big)
+
+    start = time.monotonic()
+    winner, body = fetch.fetch_first([primary.url, mirror.url], timeout=10, hedge_delay=0.1)
+    assert winner == mirror.url
+    assert body == big
+    assert time.monotonic() - start < 2
+
+    # The primary's download is cancelled at its next chunk and hangs up
+    assert primary.aborted.wait(5)
+    assert not primary.finished.is_set()
+
+
+def test_gzip_body_is_decoded(stubs):
+    server = stubs(gzipped=True)
+    assert fetch.fetch_text(server.url, mirrors=[], timeout=5) == BODY.decode("utf-8")
+
+
+def test_every_source_failing_raises(stubs):
+    servers = [stubs(), stubs()]
+    for server in servers:
+        server.status = 500
+
+    with pytest.raises(ConnectionError, match="all sources failed"):
+        fetch.fetch_first([s.url for s in servers], timeout=5, hedge_delay=0.05)
+    assert all(s.hits for s in servers)
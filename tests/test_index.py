@@ -0,0 +1,22 @@
+from stashgen.index import ProxyIndex
+
+
+def proxies(n):
+    return [{"name": f"p{i}", "server": f"s{i % 7}", "port": 443 + i % 5} for i in range(n)]
+
+
+def test_set_cache_stays_bounded():
+    idx = ProxyIndex(proxies(100), max_sets=4)
+    for port in range(443, 448):
+        for server in range(7):
+            got = idx.select({"server": f"s{server}", "port": str(port)})
+            assert got == [i for i in range(100) if i % 7 == server and i % 5 == port - 443]
+    assert len(idx._sets) == 4
+
+
+def test_recently_used_set_survives_eviction():
+    idx = ProxyIndex(proxies(100), max_sets=2)
+    # Each port matches more proxies than s0, so its set is the one cached
+    for port in ["443", "444", "443", "445"]:
+        idx.select({"server": "s0", "port": port})
+    assert list(idx._sets) == [("port", ("443",)), ("port", ("445",))]
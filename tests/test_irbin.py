@@ -0,0 +1,128 @@
+import importlib
+
+import pytest
+
+from stashgen import irbin
+from stashgen.corpus import mixed_lines
+
+
+def items(proxies):
+    # Compares key order and exact types too: True == 1 and {"a", "b"}
+    # in any order compare equal otherwise
+    def walk(v):
+        if isinstance(v, dict):
+            return [(k, walk(x)) for k, x in v.items()]
+        if isinstance(v, list):
+            return [walk(x) for x in v]
+        return (type(v).__name__, v)
+    return [walk(p) for p in proxies]
+
+
+def round_trip(proxies):
+    # Through proxies(), ir[i] and the column readers alike
+    with irbin.IRFile(irbin.dump(proxies, "digest")) as ir:
+        assert ir.source == "digest"
+        assert len(ir) == len(proxies)
+        assert items(ir.proxies()) == items(proxies)
+        assert items([ir[i] for i in range(len(ir))]) == items(proxies)
+        if proxies:
+            assert items([ir[-1]]) == items(proxies[-1:])
+
+
+@pytest.mark.parametrize("name", ["stash_claude_v2", "stash_gemini", "stash_gpt", "stash_grok"])
+def test_flavour_proxies(name, capsys):
+    flavour = importlib.import_module(name)
+    round_trip(flavour.prepare_proxies(flavour.parse_proxies(mixed_lines(300))))
+
+
+def test_empty():
+    round_trip([])
+
+
+def test_none_in_every_kind_of_column():
+    round_trip([
+        {"i": 1,    "b": True, "s": "x",  "d": "tcp", "j": [1]},
+        {"i": None, "b": None, "s": None, "d": None,  "j": None},
+        {"i": -5,   "b": False, "s": "",  "d": "tcp", "j": {"k": 1}},
+        {"i": 0,    "b": True, "s": "y",  "d": "tcp", "j": None},
+        {"i": 2,    "b": True, "s": "z",  "d": "tcp", "j": "s"},
+    ])
+
+
+def test_all_none_column():
+    round_trip([{"a": None}, {"a": None}])
+
+
+def test_mixed_type_columns():
+    round_trip([
+        {"port": 443, "v": 1.5, "big": 2**70},
+        {"port": "443", "v": 2, "big": -2**63 - 1},
+        {"port": [443], "v": None, "big": 1},
+    ])
+
+
+def test_bools_and_ints_keep_their_types():
+    round_trip([{"a": True, "b": 1}, {"a": 1, "b": 0}, {"a": False, "b": True}])
+
+
+def test_strings_with_nul_and_non_bmp_characters():
+    round_trip([
+        {"name": "a\0b", "flag": "\U0001F1E9\U0001F1EA Berlin", "m": "\U0001D518"},
+        {"name": "\0", "flag": "\U0001F1F3\U0001F1F1", "m": ""},
+        {"name": "plain", "flag": "été", "m": "\U0001F600" * 3},
+    ])
+
+
+def test_repeated_strings_stored_once_round_trip():
+    values = ["chrome", "firefox", None, "chrome", "\U0001F1E9\U0001F1EA"] * 10
+    round_trip([{"fp": v} for v in values])
+
+
+def test_nested_and_empty_containers():
+    round_trip([
+        {"name": "a", "opts": {"x": 1, "y": "s"}, "l": [], "e": {}},
+        {"name": "b", "opts": {"y": "t", "x": 2}, "l": [1, [2]], "e": {}},
+        {"name": "c", "opts": {}, "l": [{}], "e": {"k": None}},
+        {"name": "d", "opts": {"deep": {"er": {"est": True}}}, "l": None, "e": {"k": {}}},
+        {"name": "e", "opts": "not a dict", "l": [], "e": []},
+    ])
+
+
+def test_records_without_keys():
+    round_trip([{}, {}])
+
+
+def test_records_with_other_keys_or_key_order():
+    round_trip([
+        {"a": 1, "b": 2},
+        {"b": 2, "a": 1},
+        {"a": 1},
+        {},
+        {"c": {"d": 1}, "a": 3},
+    ])
+
+
+def test_ir_file_access_and_close(tmp_path):
+    proxies = [{"name": f"p{i}", "port": 443 + i, "opts": {"sid": f"{i:x}"}} for i in range(5)]
+    path = tmp_path / "f.ir.bin"
+    path.write_bytes(irbin.dump(proxies))
+
+    ir = irbin.IRFile.open(str(path))
+    assert len(ir) == 5
+    assert ir[2] == proxies[2]
+    assert ir.field("opts.sid") == ["0", "1", "2", "3", "4"]
+    with pytest.raises(IndexError):
+        ir[5]
+    with pytest.raises(KeyError):
+        ir.field("missing")
+    ir.close()
+    assert ir.buf.closed
+    with pytest.raises(ValueError):
+        ir[0]
+
+    assert irbin.load(str(path)) == proxies
+
+
+def test_rejects_other_files():
+    with pytest.raises(ValueError, match="not a binary IR"):
+        irbin.IRFile(b"\0" * irbin.HEADER.size)
@@ -0,0 +1,42 @@
+import importlib
+
+from stashgen import local, pipeline
+
+DUMP = (
+    b"# channel dump\n"
+    b"vless://a@h:443?type=tcp#one\n"
+    b"trojan://p@h:443#skip\n"
+    b"   vless://b@h:443#indented\n"
+    b"x vless://c@h:443#mid-line\n"
+    b"vless://d@h:443#bad-\xff-byte"
+)
+
+
+def test_only_vless_lines_are_yielded(tmp_path):
+    path = tmp_path / "dump.txt"
+    path.write_bytes(DUMP)
+    assert list(local.iter_vless_lines(str(path))) == [
+        "vless://a@h:443?type=tcp#one",
+        "vless://b@h:443#indented",
+        "vless://d@h:443#bad-�-byte",
+    ]
+    assert local.read_vless_lines(str(path)) == list(local.iter_vless_lines(str(path)))
+
+
+def test_empty_file(tmp_path):
+    path = tmp_path / "empty.txt"
+    path.write_bytes(b"")
+    assert list(local.iter_vless_lines(str(path))) == []
+
+
+def test_lines_are_streamed_into_the_parser(tmp_path, capsys):
+    path = tmp_path / "dump.txt"
+    path.write_bytes(DUMP)
+    flavour = importlib.import_module("stash_claude_v2")
+    sset    = pipeline.SourceSet(flavour, [{"url": str(path), "priority": 0, "mirrors": None}])
+    lines   = local.iter_vless_lines(str(path))
+    sset.add_lines(str(path), lines)
+    # The one-shot iterator is used up by the parser, and links were
+    # counted on the way
+    assert next(lines, None) is None
+    assert sset.links[str(path)] == 3
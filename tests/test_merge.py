@@ -0,0 +1,67 @@
+import importlib
+import random
+
+import pytest
+
+from stashgen import pipeline
+from stashgen.corpus import vless_line
+
+FLAVOURS = [
+    "stash_claude",
+    "stash_claude_v2",
+    "stash_gemini",
+    "stash_gemini_v2",
+    "stash_gpt",
+    "stash_grok",
+    "stash_grok_v2",
+]
+SOURCES = [
+    {"url": "http://127.0.0.1/a.txt", "priority": 100, "mirrors": None},
+    {"url": "http://127.0.0.1/b.txt", "priority": 50,  "mirrors": None},
+]
+
+
+def lists():
+    # Distinct endpoints that all share one remark, so every flavour renames
+    rng = random.Random(7)
+    return {
+        SOURCES[0]["url"]: "\n".join(vless_line(rng, i, remark="X") for i in range(2)),
+        SOURCES[1]["url"]: "\n".join(vless_line(rng, i, remark="X") for i in range(2, 3)),
+    }
+
+
+@pytest.mark.parametrize("short_names", [False, True])
+@pytest.mark.parametrize("name", FLAVOURS)
+def test_merge_again_matches_cold_merge(name, short_names, capsys):
+    # The watcher keeps a SourceSet and re-merges it as lists change
+    flavour = importlib.import_module(name)
+    texts   = lists()
+
+    cold = pipeline.SourceSet(flavour, SOURCES, short_names)
+    for url, text in texts.items():
+        cold.add(url, text)
+    expected = cold.merge()
+
+    warm = pipeline.SourceSet(flavour, SOURCES, short_names)
+    warm.add(SOURCES[0]["url"], texts[SOURCES[0]["url"]])
+    warm.merge()
+    warm.add(SOURCES[1]["url"], texts[SOURCES[1]["url"]])
+    warm.merge()
+    assert warm.merge() == expected
+    names = [p["name"] for p in expected]
+    assert len(set(names)) == len(names)
+
+
+@pytest.mark.parametrize("name", FLAVOURS)
+def test_endpoint_in_two_lists_is_kept_once(name, capsys):
+    flavour = importlib.import_module(name)
+    high    = vless_line(random.Random(1), 0, remark="high")
+    low     = vless_line(random.Random(1), 0, remark="low")
+    other   = vless_line(random.Random(2), 1, remark="other")
+
+    sset = pipeline.SourceSet(flavour, SOURCES)
+    sset.add(SOURCES[1]["url"], "\n".join([low, other]))
+    sset.add(SOURCES[0]["url"], high)
+    proxies = sset.merge()
+    assert len(proxies) == 2
+    assert "high" in proxies[0]["name"]
@@ -0,0 +1,69 @@
+from stashgen import names
+
+FR = "\U0001F1EB\U0001F1F7"
+
+
+def proxy(server, name="", port=443, uuid="u"):
+    return {"server": server, "port": port, "uuid": uuid, "name": name}
+
+
+def test_flag_of():
+    assert names.flag_of(f"{FR} Paris | @ads") == FR
+    assert names.flag_of(f"@ads {FR}") == FR
+    assert names.flag_of("no flag here") == names.UNKNOWN_FLAG
+    assert names.flag_of("\U0001F1EB only half") == names.UNKNOWN_FLAG
+    assert names.flag_of("") == names.UNKNOWN_FLAG
+    assert names.flag_of(None) == names.UNKNOWN_FLAG
+
+
+def test_names_are_flag_and_short_endpoint_id():
+    raw = [proxy("a", f"{FR} Paris"), proxy("b", "Somewhere")]
+    originals = names.shorten(raw)
+
+    assert raw[0]["name"] == f"{FR} {names.short_id(raw[0])[:names.ID_LENGTH]}"
+    assert raw[1]["name"] == f"{names.UNKNOWN_FLAG} {names.short_id(raw[1])[:names.ID_LENGTH]}"
+    assert originals == {id(raw[0]): f"{FR} Paris", id(raw[1]): "Somewhere"}
+
+
+def test_id_follows_the_endpoint_not_the_remark():
+    assert names.short_id(proxy("A.example", "x")) == names.short_id(proxy("a.example", "y"))
+    assert names.short_id(proxy("a", port=8443)) != names.short_id(proxy("a"))
+
+
+def test_colliding_ids_get_longer_until_unique(monkeypatch):
+    # With one-character ids, 40 endpoints are bound to collide
+    monkeypatch.setattr(names, "ID_LENGTH", 1)
+    raw = [proxy(f"host{i}", FR) for i in range(40)]
+    names.shorten(raw)
+
+    got = [p["name"] for p in raw]
+    assert len(set(got)) == len(got)
+    assert any(len(name) > len(FR) + 2 for name in got)
+    for p in raw:
+        assert names.short_id(p).startswith(p["name"][len(FR) + 1:])
+
+
+def test_collision_lengthens_only_the_later_name(monkeypatch):
+    ids = {"a": "abcde" + "1" * 27, "b": "abcde" + "2" * 27, "c": "abcdf" + "3" * 27}
+    monkeypatch.setattr(names, "short_id", lambda p, length=32: ids[p["server"]][:length])
+    raw = [proxy("a"), proxy("b"), proxy("c")]
+    names.shorten(raw)
+    flag = names.UNKNOWN_FLAG
+    assert [p["name"] for p in raw] == [f"{flag} abcde", f"{flag} abcde2", f"{flag} abcdf"]
+
+
+def test_repeats_of_one_endpoint_keep_one_name():
+    raw = [proxy("a", f"{FR} one"), proxy("a", f"{FR} two"), proxy("b", FR)]
+    names.shorten(raw)
+    assert raw[0]["name"] == raw[1]["name"] != raw[2]["name"]
+
+
+def test_bytes_saved_counts_every_reference():
+    raw = [proxy("a", "x" * 20)]
+    originals = names.shorten(raw)
+    config = {
+        "proxies":      raw,
+        "proxy-groups": [{"proxies": [raw[0]["name"]]}, {"proxies": [raw[0]["name"], "DIRECT"]}],
+    }
+    per_ref = 20 - len(raw[0]["name"].encode("utf-8"))
+    assert names.bytes_saved(config, raw, originals) == 3 * per_ref
@@ -0,0 +1,75 @@
+from collections import Counter
+
+from stashgen import rejects
+
+
+def test_sample_stays_bounded_and_counts_are_exact():
+    log = rejects.RejectLog(sample_size=5, seed=1)
+    for i in range(1000):
+        log.add("bad port", f"port {i}")
+        if i % 4 == 0:
+            log.add("no uuid", f"uuid {i}")
+
+    assert log.counts == {"bad port": 1000, "no uuid": 250}
+    assert log.total() == 1250
+    assert len(log.samples["bad port"]) == 5
+    assert len(log.samples["no uuid"]) == 5
+    assert set(log.samples["bad port"]) <= {f"port {i}" for i in range(1000)}
+    assert len(set(log.samples["bad port"])) == 5
+
+
+def test_sample_is_uniform():
+    # Over many seeds every line lands in the sample about equally often,
+    # the last lines as much as the first
+    seen: Counter = Counter()
+    for seed in range(2000):
+        log = rejects.RejectLog(sample_size=5, seed=seed)
+        for i in range(50):
+            log.add("bad", str(i // 10))
+        seen.update(log.samples["bad"])
+    # 2000 * 5 picks over five blocks of ten lines: 2000 per block
+    assert all(1800 < seen[str(block)] < 2200 for block in range(5))
+
+
+def test_short_sample_keeps_every_line_in_order():
+    log = rejects.RejectLog(sample_size=5)
+    for line in "abc":
+        log.add("bad", line)
+    assert log.samples["bad"] == ["a", "b", "c"]
+
+
+def test_lines_are_truncated():
+    log = rejects.RejectLog(sample_size=2)
+    log.add("long", "x" * 1000)
+    assert log.samples["long"] == ["x" * rejects.LINE_LIMIT]
+
+
+def test_combine_sums_counts_and_caps_samples():
+    a = rejects.RejectLog(sample_size=3)
+    b = rejects.RejectLog(sample_size=3)
+    for i in range(3):
+        a.add("bad port", f"a{i}")
+        b.add("bad port", f"b{i}")
+    b.add("no uuid", "b")
+
+    out = rejects.RejectLog.combine([a, b], sample_size=4)
+    assert out.counts == {"bad port": 6, "no uuid": 1}
+    assert out.samples == {"bad port": ["a0", "a1", "a2", "b0"], "no uuid": ["b"]}
+
+
+def test_report_lists_the_commonest_reason_first():
+    log = rejects.RejectLog()
+    log.add("no uuid", "x")
+    for _ in range(3):
+        log.add("bad port", "y")
+
+    assert list(log.to_dict()) == ["bad port", "no uuid"]
+    assert log.to_dict()["no uuid"] == {"count": 1, "sample": ["x"]}
+    assert log.describe() == "bad port 3, no uuid 1"
+
+
+def test_reject_returns_none_with_or_without_a_log():
+    log = rejects.RejectLog()
+    assert rejects.reject(log, "bad", "line") is None
+    assert rejects.reject(None, "bad", "line") is None
+    assert log.counts == {"bad": 1}
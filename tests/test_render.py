@@ -0,0 +1,87 @@
+import importlib
+import os
+import random
+import time
+
+import pytest
+import yaml
+
+from stashgen import compact, pipeline, render
+from stashgen.corpus import vless_line
+
+FLAVOURS = [
+    "stash_claude",
+    "stash_claude_v2",
+    "stash_gemini",
+    "stash_gemini_v2",
+    "stash_gpt",
+    "stash_grok",
+    "stash_grok_v2",
+]
+STYLES = [("anchors",), ("compact",), ("anchors", "compact")]
+
+
+@pytest.fixture(autouse=True)
+def section_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(render, "SECTION_DIR", str(tmp_path / "sections"))
+    monkeypatch.setattr(render, "_sections", {})
+
+
+def config_of(flavour, count=20):
+    rng   = random.Random(3)
+    lines = [vless_line(rng, i) for i in range(count)]
+    return pipeline.build(flavour, flavour.prepare_proxies(flavour.parse_proxies(lines)))
+
+
+@pytest.mark.parametrize("styles", STYLES, ids="+".join)
+@pytest.mark.parametrize("name", FLAVOURS)
+def test_styled_output_loads_back_to_plain_config(name, styles, capsys):
+    flavour = importlib.import_module(name)
+    config  = config_of(flavour)
+    plain   = yaml.safe_load(pipeline.render(flavour, config))
+    styled  = yaml.safe_load(pipeline.render(flavour, config, styles))
+    assert compact.effective(styled) == plain
+
+
+@pytest.mark.parametrize("count", [1, 20])
+@pytest.mark.parametrize("name", FLAVOURS)
+def test_compact_proxies_resolve_to_their_settings(name, count, capsys):
+    flavour = importlib.import_module(name)
+    config  = config_of(flavour, count)
+    text    = pipeline.render(flavour, config, ("compact",))
+    hoisted = compact.hoist(config)
+    if count > 1:
+        assert hoisted[compact.DEFAULTS_KEY]
+        assert "<<: *" in text
+
+    # Merge keys resolved by hand on the structure that is dumped...
+    for original, entry in zip(config["proxies"], hoisted["proxies"]):
+        resolved = {k: v for k, v in entry.items() if k != compact.MERGE}
+        for k, v in entry.get(compact.MERGE, {}).items():
+            resolved.setdefault(k, v)
+        assert resolved == original
+
+    # ...and by the YAML loader on what is written
+    loaded = yaml.safe_load(text)["proxies"]
+    plain  = yaml.safe_load(pipeline.render(flavour, config))["proxies"]
+    assert len(loaded) == len(plain)
+    for got, want in zip(loaded, plain):
+        assert got == want
+
+
+def test_prune_drops_only_sections_unused_for_max_age(capsys):
+    flavour = importlib.import_module("stash_claude_v2")
+    pipeline.render(flavour, config_of(flavour))
+    paths = sorted(os.path.join(render.SECTION_DIR, n) for n in os.listdir(render.SECTION_DIR))
+    assert len(paths) > 1
+
+    stale = time.time() - render.SECTION_MAX_AGE - 60
+    for path in paths:
+        os.utime(path, (stale, stale))
+    # Loading a section from disk counts as a use
+    render._sections.clear()
+    pipeline.render(flavour, config_of(flavour))
+
+    os.utime(paths[0], (stale, stale))
+    assert render.prune_sections() == 1
+    assert sorted(os.path.join(render.SECTION_DIR, n) for n in os.listdir(render.SECTION_DIR)) == paths[1:]
@@ -0,0 +1,195 @@
+import copy
+from collections import Counter
+
+import pytest
+
+from stashgen import rules
+from stashgen.rules import Rule
+
+
+def parsed(*texts):
+    return [Rule.parse(t) for t in texts]
+
+
+def texts(rule_list):
+    return [str(r) for r in rule_list]
+
+
+@pytest.mark.parametrize("expr, expected", [
+    ("network == 'udp'", [("NETWORK", "UDP")]),
+    ("network == 'udp' and dst_port == 443", [("NETWORK", "UDP"), ("DST-PORT", "443")]),
+    ("host == 'a.example.com' and src_port == 53", [("DOMAIN", "a.example.com"), ("SRC-PORT", "53")]),
+])
+def test_lower_script_conjunctions_of_equalities(expr, expected):
+    assert rules.lower_script(expr) == expected
+
+
+@pytest.mark.parametrize("expr", [
+    "network == 'udp' or dst_port == 443",
+    "not network == 'udp'",
+    "dst_port != 443",
+    "dst_port > 1024",
+    "dst_port in (443, 8443)",
+    "dst_port == 443 == src_port",
+    "443 == dst_port",
+    "network == udp",
+    "geoip(dst_ip) == 'CN'",
+    "dst_ip == '1.1.1.1'",
+    "network == 'udp' and geoip(dst_ip) == 'CN'",
+    "network ==",
+])
+def test_lower_script_leaves_other_expressions_alone(expr):
+    assert rules.lower_script(expr) is None
+
+
+def test_rule_text_round_trips():
+    for text in [
+        "MATCH,DIRECT",
+        "DOMAIN-SUFFIX,example.com,Proxy",
+        "IP-CIDR,10.0.0.0/8,DIRECT,no-resolve",
+        "AND,((NETWORK,UDP),(DST-PORT,443)),REJECT",
+    ]:
+        assert str(Rule.parse(text)) == text
+
+
+def test_no_resolve_rule_does_not_shadow_a_resolving_one():
+    stats = Counter()
+    kept  = rules.drop_shadowed(parsed(
+        "IP-CIDR,10.0.0.0/8,DIRECT,no-resolve",
+        "IP-CIDR,10.1.0.0/16,Proxy",
+    ), stats)
+    assert len(kept) == 2 and stats["shadowed"] == 0
+
+    kept = rules.drop_shadowed(parsed(
+        "IP-CIDR,10.0.0.0/8,DIRECT",
+        "IP-CIDR,10.1.0.0/16,Proxy,no-resolve",
+    ), stats)
+    assert texts(kept) == ["IP-CIDR,10.0.0.0/8,DIRECT"] and stats["shadowed"] == 1
+
+
+def test_domain_suffix_shadows_the_domain_and_deeper_suffixes():
+    stats = Counter()
+    kept  = rules.drop_shadowed(parsed(
+        "DOMAIN-SUFFIX,Example.com,Proxy",
+        "DOMAIN,example.com,DIRECT",
+        "DOMAIN,a.example.com,DIRECT",
+        "DOMAIN-SUFFIX,b.EXAMPLE.com,DIRECT",
+        "DOMAIN,notexample.com,DIRECT",
+        "DOMAIN-SUFFIX,com.example,DIRECT",
+        "DOMAIN-KEYWORD,example,DIRECT",
+    ), stats)
+    assert texts(kept) == [
+        "DOMAIN-SUFFIX,Example.com,Proxy",
+        "DOMAIN,notexample.com,DIRECT",
+        "DOMAIN-SUFFIX,com.example,DIRECT",
+        "DOMAIN-KEYWORD,example,DIRECT",
+    ]
+    assert stats["shadowed"] == 3
+
+
+def test_cidr_containment_shadows_within_one_family():
+    stats = Counter()
+    kept  = rules.drop_shadowed(parsed(
+        "IP-CIDR,10.0.0.0/8,DIRECT",
+        "IP-CIDR,10.20.0.0/16,Proxy",
+        "IP-CIDR,11.0.0.0/16,Proxy",
+        "IP-CIDR6,2001:db8::/32,DIRECT",
+        "IP-CIDR6,2001:db8:1::/48,Proxy",
+        "IP-CIDR6,::ffff:10.0.0.0/104,Proxy",
+    ), stats)
+    assert texts(kept) == [
+        "IP-CIDR,10.0.0.0/8,DIRECT",
+        "IP-CIDR,11.0.0.0/16,Proxy",
+        "IP-CIDR6,2001:db8::/32,DIRECT",
+        "IP-CIDR6,::ffff:10.0.0.0/104,Proxy",
+    ]
+
+
+def test_everything_after_match_and_exact_repeats_are_dropped():
+    stats = Counter()
+    kept  = rules.drop_shadowed(parsed(
+        "GEOIP,CN,DIRECT",
+        "GEOIP,CN,Proxy",
+        "MATCH,Proxy",
+        "DOMAIN,late.example.com,DIRECT",
+        "MATCH,DIRECT",
+    ), stats)
+    assert texts(kept) == ["GEOIP,CN,DIRECT", "MATCH,Proxy"]
+    assert stats["shadowed"] == 3
+
+
+def test_collapse_merges_adjacent_runs_per_family():
+    stats = Counter()
+    out   = rules.collapse_cidrs(parsed(
+        "IP-CIDR,10.0.0.0/25,DIRECT,no-resolve",
+        "IP-CIDR6,2001:db8::/33,DIRECT,no-resolve",
+        "IP-CIDR,10.0.0.128/25,DIRECT,no-resolve",
+        "IP-CIDR6,2001:db8:8000::/33,DIRECT,no-resolve",
+    ), stats)
+    assert texts(out) == [
+        "IP-CIDR,10.0.0.0/24,DIRECT,no-resolve",
+        "IP-CIDR6,2001:db8::/32,DIRECT,no-resolve",
+    ]
+    assert stats["collapsed"] == 2
+
+
+def test_collapse_keeps_runs_with_other_options_or_targets_apart():
+    stats = Counter()
+    given = [
+        "IP-CIDR,10.0.0.0/25,DIRECT,no-resolve",
+        "IP-CIDR,10.0.0.128/25,DIRECT",
+        "IP-CIDR,10.0.1.0/25,Proxy",
+        "IP-CIDR,10.0.1.128/25,DIRECT",
+    ]
+    assert texts(rules.collapse_cidrs(parsed(*given), stats)) == given
+    assert stats["collapsed"] == 0
+
+
+def test_collapse_does_not_reach_across_other_rules():
+    stats = Counter()
+    given = [
+        "IP-CIDR,10.0.0.0/25,DIRECT",
+        "DOMAIN,a.example.com,Proxy",
+        "IP-CIDR,10.0.0.128/25,DIRECT",
+    ]
+    assert texts(rules.collapse_cidrs(parsed(*given), stats)) == given
+
+
+def test_compile_drops_the_script_section_once_every_shortcut_is_lowered():
+    config = {
+        "rules":  ["SCRIPT,quic,REJECT", "MATCH,Proxy"],
+        "script": {"shortcuts": {"quic": "network == 'udp' and dst_port == 443"}},
+    }
+    before = copy.deepcopy(config)
+    out, stats = rules.compile_config(config)
+    assert out["rules"] == ["AND,((NETWORK,UDP),(DST-PORT,443)),REJECT", "MATCH,Proxy"]
+    assert "script" not in out
+    assert (stats["lowered"], stats["before"], stats["after"]) == (1, 2, 2)
+    assert config == before
+
+
+def test_compile_keeps_the_shortcuts_rules_still_use():
+    config = {
+        "rules": ["SCRIPT,quic,REJECT", "SCRIPT,cn,DIRECT", "MATCH,Proxy"],
+        "script": {
+            "engine":    "expr",
+            "shortcuts": {
+                "quic":   "network == 'udp' and dst_port == 443",
+                "cn":     "geoip(dst_ip) == 'CN'",
+                "unused": "dst_port == 22",
+            },
+        },
+    }
+    out, _ = rules.compile_config(config)
+    assert out["rules"][1] == "SCRIPT,cn,DIRECT"
+    assert out["script"] == {"engine": "expr", "shortcuts": {"cn": "geoip(dst_ip) == 'CN'"}}
+
+
+def test_compile_keeps_other_script_settings_without_shortcuts():
+    config = {
+        "rules":  ["SCRIPT,quic,REJECT"],
+        "script": {"engine": "expr", "shortcuts": {"quic": "network == 'udp'"}},
+    }
+    out, _ = rules.compile_config(config)
+    assert out["rules"] == ["NETWORK,UDP,REJECT"]
+    assert out["script"] == {"engine": "expr"}
@@ -0,0 +1,173 @@
+import gzip
+import importlib
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from stashgen import irbin, serve, snapshot
+from stashgen.corpus import vless_lines
+
+
+class Failing:
+    # A service whose body() raises the given error
+    def __init__(self, error):
+        self.error = error
+
+    def body(self, name, params):
+        raise self.error
+
+
+def get(service, path, headers=None):
+    # (status, response headers, raw body) from a server around service
+    server = ThreadingHTTPServer(("127.0.0.1", 0), serve.make_handler(service))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    req = urllib.request.Request(f"http://127.0.0.1:{server.server_port}{path}", headers=headers or {})
+    try:
+        with urllib.request.urlopen(req, timeout=5) as resp:
+            return resp.status, resp.headers, resp.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def status_of(service, path):
+    status, _, body = get(service, path)
+    return status, body
+
+
+def test_unknown_flavour_is_404():
+    service = serve.SubscriptionService(["stash_claude_v2"])
+    assert status_of(service, "/nope") == (404, b"unknown flavour 'nope'\n")
+
+
+@pytest.mark.parametrize("error, status", [
+    (serve.BadQuery("unknown fields: x"), 400),
+    (serve.NotFound("no proxies match"), 404),
+    (KeyError("server"), 500),
+    (ValueError("bad value"), 500),
+])
+def test_errors_map_to_status(error, status, capsys):
+    assert status_of(Failing(error), "/stash_claude_v2")[0] == status
+
+
+FLAVOUR = "stash_claude_v2"
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch, capsys):
+    # One flavour with a binary IR of 20 proxies in a scratch snapshot dir
+    monkeypatch.setattr(snapshot, "SNAPSHOT_DIR", str(tmp_path))
+    monkeypatch.setattr(irbin, "SNAPSHOT_DIR", str(tmp_path))
+    save_ir(20)
+    return serve.SubscriptionService([FLAVOUR])
+
+
+def save_ir(count):
+    flavour = importlib.import_module(FLAVOUR)
+    proxies = flavour.prepare_proxies(flavour.parse_proxies(vless_lines(count)))
+    irbin.save(FLAVOUR, str(count), proxies)
+
+
+@pytest.mark.parametrize("header, gzipped", [
+    ("gzip", True),
+    ("deflate, gzip;q=0.5", True),
+    ("x-gzip", True),
+    ("*", True),
+    ("", False),
+    ("gzip;q=0", False),
+    ("gzip; q=0.0, deflate", False),
+    ("x-gzip-foo", False),
+    ("identity, *;q=0", False),
+    ("*, gzip;q=0", False),
+])
+def test_accepts_gzip(header, gzipped):
+    assert serve.accepts_gzip(header) is gzipped
+
+
+def test_each_encoding_has_its_own_etag(service):
+    path = f"/{FLAVOUR}"
+    status, plain_headers, plain = get(service, path, {"Accept-Encoding": "gzip;q=0"})
+    assert status == 200 and "Content-Encoding" not in plain_headers
+    status, gz_headers, packed = get(service, path, {"Accept-Encoding": "gzip"})
+    assert status == 200 and gz_headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(packed) == plain
+    assert plain_headers["ETag"] != gz_headers["ETag"]
+
+    # A tag of the other encoding does not validate this one
+    assert get(service, path, {"If-None-Match": gz_headers["ETag"]})[0] == 200
+    assert get(service, path, {"If-None-Match": plain_headers["ETag"]})[0] == 304
+    assert get(service, path, {"Accept-Encoding": "gzip", "If-None-Match": f'"x", {gz_headers["ETag"]}'})[0] == 304
+
+
+def test_lru_evicts_least_recently_used():
+    cache = serve.LRUCache(max_entries=2, max_bytes=100)
+    cache.put("a", b"1")
+    cache.put("b", b"2")
+    assert cache.get("a") == b"1"
+    cache.put("c", b"3")
+    assert cache.get("b") is None
+    assert list(cache.entries) == ["a", "c"]
+
+
+def test_lru_stays_within_its_byte_budget():
+    cache = serve.LRUCache(max_entries=10, max_bytes=10)
+    for key in "abcd":
+        cache.put(key, b"x" * 4)
+    assert list(cache.entries) == ["c", "d"] and cache.size == 8
+    cache.put("c", b"x" * 7)
+    assert list(cache.entries) == ["c"] and cache.size == 7
+    # Too big for the cache at all: not stored, and the old value goes
+    cache.put("c", b"x" * 11)
+    assert cache.get("c") is None and cache.size == 0
+    cache.put("a", b"1")
+    assert cache.drop(lambda k: k == "a") == 1 and cache.size == 0
+
+
+def test_concurrent_misses_build_once(service, monkeypatch):
+    render = service.render
+
+    def slow_render(key, index):
+        time.sleep(0.2)
+        return render(key, index)
+    monkeypatch.setattr(service, "render", slow_render)
+
+    barrier = threading.Barrier(8)
+    bodies  = []
+
+    def request():
+        barrier.wait()
+        bodies.append(service.body(FLAVOUR, {"port": ["443"]})[1])
+    threads = [threading.Thread(target=request) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert service.renders == 1
+    assert len(bodies) == 8 and len(set(bodies)) == 1
+
+
+def test_changed_ir_invalidates_cached_bodies(service):
+    key, first = service.body(FLAVOUR, {})
+    service.body(FLAVOUR, {"port": ["443"]})
+    assert service.body(FLAVOUR, {})[1] == first
+    assert service.renders == 2
+
+    # A rewrite with the same proxies keeps its version and the cache
+    path = irbin.bin_path(FLAVOUR)
+    save_ir(20)
+    os.utime(path, ns=(time.time_ns(), time.time_ns() + 10**9))
+    assert service.body(FLAVOUR, {})[0] == key
+    assert service.renders == 2
+
+    save_ir(30)
+    new_key, body = service.body(FLAVOUR, {})
+    assert new_key != key and body != first
+    assert service.renders == 3
+    assert all(k[3] == new_key[3] for k in service.cache.entries)
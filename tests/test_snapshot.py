@@ -0,0 +1,32 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from stashgen import output, snapshot
+
+
+def test_atomic_write_from_many_threads(tmp_path):
+    path = str(tmp_path / "same.txt")
+    data = [f"writer {i}\n".encode("utf-8") * 1000 for i in range(16)]
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        for fut in [pool.submit(snapshot.atomic_write, path, d) for d in data]:
+            fut.result()
+
+    with open(path, "rb") as f:
+        assert f.read() in data
+    assert os.listdir(tmp_path) == ["same.txt"]
+
+
+def test_atomic_write_gives_new_files_the_umask_mode(tmp_path):
+    # Not mkstemp's 0600: what open() gives a new file under the umask
+    path = str(tmp_path / "metrics.prom")
+    snapshot.atomic_write(path, b"x 1\n")
+    assert os.stat(path).st_mode & 0o777 == 0o666 & ~output.UMASK
+
+
+def test_umask_is_read_without_changing_it():
+    umask = os.umask(0o027)
+    try:
+        assert output._read_umask() == 0o027
+        assert os.umask(0o027) == 0o027
+    finally:
+        os.umask(umask)
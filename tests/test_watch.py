@@ -0,0 +1,56 @@
+import importlib
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from stashgen import fetch, pipeline, sources, watch
+from stashgen.corpus import vless_lines
+
+FLAVOURS = ["stash_claude_v2", "stash_gemini", "stash_grok"]
+
+
+@pytest.fixture
+def upstream(tmp_path, monkeypatch):
+    # A list server, and a scratch working directory for every cache and output
+    state = {"body": "\n".join(vless_lines(20)).encode("utf-8")}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(state["body"])))
+            self.end_headers()
+            self.wfile.write(state["body"])
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/list.txt"
+    (tmp_path / "sources.yaml").write_text(f"sources:\n  - url: {url}\n    mirrors: []\n")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sources, "SOURCES_FILE", str(tmp_path / "sources.yaml"))
+    monkeypatch.setattr(fetch, "VALIDATORS", fetch.ValidatorCache())
+    yield state
+    server.shutdown()
+    server.server_close()
+
+
+def test_poll_saves_each_changed_source_once(upstream, monkeypatch, capsys):
+    saved = []
+    save  = pipeline.save_source
+    monkeypatch.setattr(pipeline, "save_source", lambda url, text: saved.append(url) or save(url, text))
+
+    watcher = watch.Watcher([importlib.import_module(n) for n in FLAVOURS])
+    assert watcher.poll() is True
+    assert len(saved) == 1
+    assert watcher.poll() is None
+    assert len(saved) == 1
+
+    upstream["body"] = "\n".join(vless_lines(25)).encode("utf-8")
+    assert watcher.poll() is True
+    assert len(saved) == 2
+    archived = [n for d in os.listdir(".cache/archive") for n in os.listdir(os.path.join(".cache/archive", d))]
+    assert sorted(archived) == ["000000.z", "000001.z", "index.json"]